@@ -1,24 +1,66 @@
+import os
 from functools import lru_cache
+from typing import TYPE_CHECKING, Optional
 
-from app.services.pdf_processor import PDFProcessor
+from app.services.csf_template import SAT_CSF_TEMPLATE
 from app.services.data_extractor import DataExtractor
+from app.services.layout_extractor import LayoutExtractor
+from app.services.extraction_executor import ExtractionExecutor
+from app.services.result_cache import ResultCache
+from app.services.page_preview import PagePreviewCache
+from app.services.validator import DocumentClassifier, FieldValidator
+from app.services.job_store import JobStore, create_job_store
+from app.services.job_queue import JobQueue
 from app.config import settings
+from app.utils.mupdf import PDF_PROCESSOR_VERSION
+
+if TYPE_CHECKING:
+    from app.services.extraction_pipeline import ExtractionPipeline
+    from app.services.pdf_processor import PDFProcessor
+
+# El pipeline (PyMuPDF, OpenCV, Tesseract) solo se importa en el proceso que
+# extrae: en los workers del pool al crearlo, o aquí si la extracción es local.
+# tesserocr instala un manejador de señales y solo se puede importar en el hilo principal
+if settings.EXTRACTION_WORKERS <= 0:
+    from app.services import extraction_pipeline
 
 @lru_cache()
-def get_pdf_processor() -> PDFProcessor:
+def get_pdf_processor() -> "PDFProcessor":
     """
     Crea y devuelve una instancia singleton de PDFProcessor
     
     Returns:
         PDFProcessor: Instancia del procesador de PDF
     """
+    from app.services.image_enhancer import ImageEnhancer
+    from app.services.pdf_processor import PDFProcessor
+
     return PDFProcessor(
         ocr_dpi=settings.OCR_DPI,
         tessdata_lang=settings.TESSERACT_LANG,
         tessdata_path=settings.TESSERACT_PATH,
-        temp_dir=settings.TEMP_DIR
+        temp_dir=settings.TEMP_DIR,
+        ocr_workers=settings.OCR_PAGE_WORKERS,
+        ocr_backend=settings.OCR_BACKEND,
+        min_page_text_chars=settings.PAGE_TEXT_MIN_CHARS,
+        max_pages=settings.MAX_PDF_PAGES,
+        ocr_low_dpi=settings.OCR_LOW_DPI,
+        ocr_min_confidence=settings.OCR_MIN_CONFIDENCE,
+        ocr_template=SAT_CSF_TEMPLATE if settings.OCR_ROI_ENABLED else None,
+        image_enhancer=ImageEnhancer(steps=_enhance_steps()),
+        qr_fast_path=settings.QR_FAST_PATH,
+        reocr_dpi=settings.OCR_REOCR_DPI
     )
 
+def _enhance_steps():
+    """
+    Pasos de mejora de imagen configurados, sin espacios ni vacíos
+    
+    Returns:
+        tuple: Nombres de los pasos en OCR_ENHANCE_STEPS
+    """
+    return tuple(step.strip() for step in settings.OCR_ENHANCE_STEPS.split(",") if step.strip())
+
 @lru_cache()
 def get_data_extractor() -> DataExtractor:
     """
@@ -27,4 +69,145 @@ def get_data_extractor() -> DataExtractor:
     Returns:
         DataExtractor: Instancia del extractor de datos
     """
-    return DataExtractor()
\ No newline at end of file
+    layout_extractor = LayoutExtractor() if settings.LAYOUT_EXTRACTION else None
+    return DataExtractor(layout_extractor=layout_extractor)
+
+@lru_cache()
+def get_extraction_pipeline() -> "ExtractionPipeline":
+    """
+    Crea y devuelve una instancia singleton de ExtractionPipeline
+    
+    Returns:
+        ExtractionPipeline: Pipeline de extracción
+    """
+    from app.services.extraction_pipeline import ExtractionPipeline
+
+    return ExtractionPipeline(
+        get_pdf_processor(),
+        get_data_extractor(),
+        early_exit=settings.EARLY_EXIT,
+        field_validator=FieldValidator() if settings.FIELD_VALIDATION else None,
+        field_template=SAT_CSF_TEMPLATE
+    )
+
+@lru_cache()
+def get_extraction_executor() -> ExtractionExecutor:
+    """
+    Crea y devuelve una instancia singleton de ExtractionExecutor
+    
+    Returns:
+        ExtractionExecutor: Ejecutor del pipeline de extracción
+    """
+    return ExtractionExecutor(
+        max_workers=settings.EXTRACTION_WORKERS,
+        queue_size=settings.EXTRACTION_QUEUE_SIZE,
+        retry_after=settings.EXTRACTION_RETRY_AFTER,
+        pipeline_factory=get_extraction_pipeline,
+        warmup=settings.WARMUP_ENABLED
+    )
+
+@lru_cache()
+def get_result_cache() -> Optional[ResultCache]:
+    """
+    Crea y devuelve la caché de resultados, o None si está deshabilitada
+    
+    Returns:
+        ResultCache: Caché de resultados de extracción
+    """
+    if not settings.CACHE_ENABLED:
+        return None
+    
+    version = ":".join([
+        PDF_PROCESSOR_VERSION,
+        DataExtractor.VERSION,
+        str(settings.OCR_DPI),
+        str(settings.OCR_LOW_DPI),
+        str(settings.OCR_MIN_CONFIDENCE),
+        settings.TESSERACT_LANG,
+        settings.OCR_BACKEND,
+        "roi" if settings.OCR_ROI_ENABLED else "page",
+        "+".join(_enhance_steps()),
+        "qr" if settings.QR_FAST_PATH else "noqr",
+        "layout" if settings.LAYOUT_EXTRACTION else "text",
+        f"valid{FieldValidator.VERSION}:{settings.OCR_REOCR_DPI}" if settings.FIELD_VALIDATION else "novalid"
+    ])
+    return ResultCache(
+        version=version,
+        max_entries=settings.CACHE_MAX_ENTRIES,
+        ttl=settings.CACHE_TTL,
+        disk_dir=os.path.join(settings.TEMP_DIR, "csf-cache") if settings.CACHE_DISK_ENABLED else None,
+        disk_max_bytes=settings.CACHE_DISK_MAX_BYTES
+    )
+
+@lru_cache()
+def get_document_classifier() -> Optional[DocumentClassifier]:
+    """
+    Crea y devuelve el clasificador previo a la extracción, o None si está deshabilitado
+    
+    Los rechazos se recuerdan con el mismo límite de entradas y TTL que la caché de resultados.
+    
+    Returns:
+        DocumentClassifier: Clasificador de documentos
+    """
+    if not settings.CLASSIFIER_ENABLED:
+        return None
+    
+    return DocumentClassifier(
+        max_pages=settings.CLASSIFIER_MAX_PAGES,
+        negative_cache_entries=settings.CACHE_MAX_ENTRIES,
+        negative_cache_ttl=settings.CACHE_TTL
+    )
+
+@lru_cache()
+def get_preview_cache() -> Optional[PagePreviewCache]:
+    """
+    Crea y devuelve la caché de vistas previas de páginas, o None si está deshabilitada
+    
+    Returns:
+        PagePreviewCache: PDF retenidos y miniaturas generadas
+    """
+    if not settings.PREVIEW_ENABLED:
+        return None
+    
+    return PagePreviewCache(
+        max_document_bytes=settings.PREVIEW_DOCUMENT_BYTES,
+        max_entries=settings.PREVIEW_CACHE_ENTRIES,
+        ttl=settings.PREVIEW_TTL,
+        quality=settings.PREVIEW_QUALITY
+    )
+
+@lru_cache()
+def get_job_store() -> JobStore:
+    """
+    Crea y devuelve el almacén de estados de trabajos asíncronos
+    
+    Returns:
+        JobStore: Almacén configurado (memoria o SQLite)
+    """
+    return create_job_store(
+        backend=settings.JOB_STORE,
+        ttl=settings.JOB_TTL,
+        path=settings.JOB_STORE_PATH or os.path.join(settings.TEMP_DIR, "jobs.sqlite3")
+    )
+
+@lru_cache()
+def get_job_queue() -> JobQueue:
+    """
+    Crea y devuelve una instancia singleton de JobQueue
+    
+    Returns:
+        JobQueue: Cola de trabajos asíncronos
+    """
+    allowed_hosts = [host.strip() for host in settings.JOB_WEBHOOK_ALLOWED_HOSTS.split(",") if host.strip()]
+    return JobQueue(
+        store=get_job_store(),
+        executor=get_extraction_executor(),
+        result_cache=get_result_cache(),
+        classifier=get_document_classifier(),
+        preview_cache=get_preview_cache(),
+        concurrency=settings.JOB_CONCURRENCY,
+        max_queued=settings.JOB_QUEUE_SIZE,
+        retry_after=settings.EXTRACTION_RETRY_AFTER,
+        webhook_timeout=settings.JOB_WEBHOOK_TIMEOUT,
+        webhook_allowed_hosts=allowed_hosts
+    )
\ No newline at end of file
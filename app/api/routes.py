@@ -1,16 +1,33 @@
+import asyncio
 import time
 import logging
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, BackgroundTasks, Depends
-from fastapi.responses import JSONResponse
-from typing import Optional
+from fastapi import APIRouter, UploadFile, File, Form, Header, HTTPException, BackgroundTasks, Depends, Path, Query, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import List, Optional
 import uuid
 
-from app.services.pdf_processor import PDFProcessor
-from app.services.data_extractor import DataExtractor
-from app.utils.metrics import increment_counter, observe_histogram
+from app.services.extraction_executor import ExtractionExecutor, ExtractionQueueFullError
+from app.services.result_cache import ResultCache
+from app.services.extraction_service import extract_upload
+from app.services.job_queue import InvalidCallbackError, JobQueue, JobQueueFullError
+from app.services.job_store import JobStore
+from app.services.page_preview import (
+    PREVIEW_MEDIA_TYPES, DocumentNotAvailableError, PagePreviewCache, PageNotFoundError
+)
+from app.services.validator import DocumentClassifier
+from app.utils.metrics import increment_counter
+from app.utils.deadline import Deadline
+from app.utils.logging_config import bind_process_id
+from app.utils.mupdf import mupdf_executor
+from app.utils.tracing import span, start_trace
+from app.utils.upload import UploadRejectedError, is_zip_upload, list_zip_pdfs, read_pdf_upload, read_zip_entry
+from app.config import settings
 from app.models.request_models import ProcessDocumentRequest
-from app.models.response_models import ProcessingResponse
-from app.api.dependencies import get_pdf_processor, get_data_extractor
+from app.models.response_models import BatchItemResponse, JobStatus, ProcessingResponse
+from app.api.dependencies import (
+    get_document_classifier, get_extraction_executor, get_job_queue, get_job_store, get_preview_cache,
+    get_result_cache
+)
 
 # Configuración de logging
 logger = logging.getLogger(__name__)
@@ -18,6 +35,12 @@ logger = logging.getLogger(__name__)
 # Crear router
 router = APIRouter(tags=["scraper"])
 
+def _debug_timings(request_trace, debug_header):
+    """Tiempos por etapa para la respuesta, solo si se pidieron con X-Debug-Timings"""
+    if not debug_header or debug_header.lower() in ("0", "false", "no"):
+        return None
+    return request_trace.as_dict()
+
 @router.post(
     "/extract-csf",
     response_model=ProcessingResponse,
@@ -25,93 +48,377 @@ router = APIRouter(tags=["scraper"])
     description="Extrae datos fiscales de un PDF de Constancia de Situación Fiscal"
 )
 async def extract_csf_data(
+    response: Response,
     file: UploadFile = File(...),
     user_id: Optional[str] = Form(None),
-    pdf_processor: PDFProcessor = Depends(get_pdf_processor),
-    data_extractor: DataExtractor = Depends(get_data_extractor)
+    priority: int = Form(5, ge=0, le=9),
+    callback_url: Optional[str] = Form(None),
+    async_mode: bool = Query(False, alias="async"),
+    executor: ExtractionExecutor = Depends(get_extraction_executor),
+    result_cache: Optional[ResultCache] = Depends(get_result_cache),
+    classifier: Optional[DocumentClassifier] = Depends(get_document_classifier),
+    preview_cache: Optional[PagePreviewCache] = Depends(get_preview_cache),
+    job_queue: JobQueue = Depends(get_job_queue),
+    debug_timings: Optional[str] = Header(None, alias="X-Debug-Timings")
 ):
     """
     Extrae datos fiscales directamente de un PDF de Constancia de Situación Fiscal
     
+    Con `?async=true` responde de inmediato con 202 y el `process_id`; el
+    resultado se consulta en `GET /jobs/{process_id}` o se recibe en
+    `callback_url`.
+    
+    Los documentos que claramente no son una constancia (otro tipo de
+    documento, demasiadas páginas, páginas en blanco) se rechazan con 422
+    antes del OCR.
+    
+    Si se extrajeron datos, `document_hash` permite pedir la vista previa
+    de cada página en `GET /documents/{document_hash}/pages/{page}/preview`.
+    
     - **file**: Archivo PDF de la Constancia de Situación Fiscal
     - **user_id**: ID del usuario (opcional)
+    - **priority**: Prioridad en modo asíncrono, de 0 (más urgente) a 9
+    - **callback_url**: URL que recibe por POST el estado final en modo asíncrono (opcional)
+    - **X-Debug-Timings** (encabezado): incluir los tiempos por etapa en la respuesta
     """
     # Medir tiempo de proceso
     start_time = time.time()
+    deadline = Deadline(settings.PROCESS_TIMEOUT)
+    request_trace = start_trace()
     
     # Generar ID para el procesamiento
     process_id = str(uuid.uuid4())
+    bind_process_id(process_id)
     user_id = user_id or "anonymous"
     
-    # Incrementar contador de solicitudes
-    increment_counter("scraper_requests_total", {"user_id": user_id})
+    # Incrementar contador de solicitudes (el usuario solo va al log: una serie por usuario no escala)
+    increment_counter("scraper_requests_total")
     
     # Validar tipo de archivo
     content_type = file.content_type
     if content_type != "application/pdf":
-        logger.warning(f"Tipo de archivo no soportado: {content_type}")
+        logger.warning("Tipo de archivo no soportado: %s", content_type)
         increment_counter("scraper_errors_total", {"reason": "invalid_file_type"})
         raise HTTPException(
             status_code=400, 
             detail=f"Tipo de archivo no soportado: {content_type}. Solo se admiten archivos PDF."
         )
     
+    upload = None
     try:
-        # Leer contenido del archivo
-        contents = await file.read()
-        file_size = len(contents)
-        logger.info(f"Archivo recibido: {file.filename}, tamaño: {file_size} bytes, ID proceso: {process_id}")
-        
-        # Extraer texto del PDF
-        extracted_text = pdf_processor.extract_text(contents)
-        
-        if not extracted_text:
-            logger.warning(f"No se pudo extraer texto del PDF para proceso: {process_id}")
-            increment_counter("scraper_errors_total", {"reason": "no_text_extracted"})
-            return ProcessingResponse(
-                success=False,
-                message="No se pudo extraer texto del PDF. Es posible que el archivo esté protegido o sea una imagen escaneada.",
-                process_id=process_id
+        # Leer el archivo por bloques aplicando tamaño máximo, encabezado y páginas
+        with span("upload_read"):
+            upload = await read_pdf_upload(
+                file,
+                max_size=settings.MAX_FILE_SIZE,
+                max_pages=settings.MAX_PDF_PAGES,
+                spool_threshold=settings.UPLOAD_SPOOL_THRESHOLD,
+                spool_dir=settings.TEMP_DIR
             )
+        logger.info("Archivo recibido: %s, tamaño: %s bytes, usuario: %s", file.filename, upload.size, user_id)
         
-        # Extraer datos fiscales del texto
-        csf_data = data_extractor.extract_from_text(extracted_text)
-        
-        # Registrar métricas de confianza
-        observe_histogram("scraper_confidence", csf_data.completo, {"field": "overall"})
-        
-        # Verificar si se extrajeron datos mínimos (RFC, nombre)
-        if not csf_data.rfc and not csf_data.nombre:
-            logger.warning(f"No se identificaron datos fiscales para proceso: {process_id}")
-            increment_counter("scraper_errors_total", {"reason": "no_fiscal_data"})
+        if async_mode:
+            # La cola toma posesión del archivo; no limpiarlo al salir
+            await job_queue.submit(process_id, upload, priority=priority, callback_url=callback_url)
+            upload = None
+            response.status_code = 202
             return ProcessingResponse(
-                success=False,
-                message="No se pudieron identificar datos fiscales en el documento. Verifique que sea una Constancia de Situación Fiscal válida.",
+                success=True,
+                message=f"Documento en cola de procesamiento. Consulte el resultado en /jobs/{process_id}.",
                 process_id=process_id
             )
         
-        # Registrar éxito
-        process_time = time.time() - start_time
-        observe_histogram("scraper_process_time", process_time)
-        increment_counter("scraper_success_total")
+        result = await extract_upload(
+            upload, process_id, executor, result_cache, deadline, start_time, classifier, preview_cache
+        )
+        result.timings = _debug_timings(request_trace, debug_timings)
+        return result
         
-        logger.info(f"Datos extraídos exitosamente para proceso: {process_id}, tiempo: {process_time:.2f}s")
+    except UploadRejectedError as e:
+        logger.warning("Archivo rechazado (%s)", e.reason)
+        increment_counter("scraper_errors_total", {"reason": e.reason})
+        raise HTTPException(status_code=e.status_code, detail=e.message)
         
-        # Devolver respuesta con datos extraídos para confirmación por el usuario
-        return ProcessingResponse(
-            success=True,
-            message="Datos extraídos correctamente. Por favor verifique y corrija si es necesario.",
-            process_id=process_id,
-            data=csf_data,
-            processing_time=process_time
+    except InvalidCallbackError as e:
+        logger.warning("URL de callback rechazada")
+        increment_counter("scraper_errors_total", {"reason": "invalid_callback"})
+        raise HTTPException(status_code=400, detail=str(e))
+        
+    except (ExtractionQueueFullError, JobQueueFullError) as e:
+        logger.warning("Cola de extracción llena, rechazando el documento")
+        increment_counter("scraper_errors_total", {"reason": "queue_full"})
+        raise HTTPException(
+            status_code=429,
+            detail="El servicio está procesando demasiados documentos. Intente de nuevo más tarde.",
+            headers={"Retry-After": str(e.retry_after)}
         )
         
     except Exception as e:
         process_time = time.time() - start_time
-        logger.error(f"Error al procesar documento: {str(e)}", exc_info=True)
+        logger.error("Error al procesar documento: %s", e, exc_info=True)
         increment_counter("scraper_errors_total", {"reason": "processing_error"})
         
         raise HTTPException(
             status_code=500, 
             detail=f"Error al procesar el documento: {str(e)}"
-        )
\ No newline at end of file
+        )
+    
+    finally:
+        if upload is not None:
+            upload.cleanup()
+
+@router.get(
+    "/jobs/{process_id}",
+    response_model=JobStatus,
+    summary="Consultar procesamiento asíncrono",
+    description="Devuelve el estado y, al terminar, el resultado de un procesamiento enviado con async=true"
+)
+async def get_job_status(process_id: str, job_store: JobStore = Depends(get_job_store)):
+    """
+    Consulta el estado de un procesamiento asíncrono
+    
+    - **process_id**: Identificador devuelto por POST /extract-csf?async=true
+    """
+    job = await job_store.get_async(process_id)
+    if job is None:
+        raise HTTPException(
+            status_code=404,
+            detail="No existe un procesamiento con ese ID o su resultado ya expiró."
+        )
+    return job
+
+@router.get(
+    "/documents/{document_hash}/pages/{page}/preview",
+    summary="Vista previa de una página",
+    description="Devuelve una miniatura JPEG o WebP de una página de un documento procesado recientemente",
+    response_class=Response,
+    responses={200: {"content": {media_type: {} for media_type in PREVIEW_MEDIA_TYPES.values()}}, 304: {}, 404: {}}
+)
+async def get_page_preview(
+    document_hash: str = Path(..., regex="^[0-9a-f]{64}$"),
+    page: int = Path(..., ge=0),
+    width: int = Query(settings.PREVIEW_WIDTH, ge=32, le=settings.PREVIEW_MAX_WIDTH),
+    image_format: str = Query("jpeg", alias="format", regex=f"^({'|'.join(PREVIEW_MEDIA_TYPES)})$"),
+    if_none_match: Optional[str] = Header(None),
+    preview_cache: Optional[PagePreviewCache] = Depends(get_preview_cache)
+):
+    """
+    Renderiza una página de un documento a tamaño de miniatura
+    
+    Solo se rasteriza la página pedida, al ancho pedido, y la imagen queda
+    en caché. El documento debe haberse extraído hace poco en esta
+    instancia; si ya no está retenido responde 404 y basta con volver a
+    enviarlo a /extract-csf (el resultado sale de la caché). Como el
+    contenido no cambia para un mismo hash, la respuesta lleva ETag y
+    Cache-Control para que el navegador no la vuelva a pedir.
+    
+    - **document_hash**: Valor de `document_hash` en la respuesta de la extracción
+    - **page**: Página desde 0 (como `fuentes[].pagina`)
+    - **width**: Ancho de la imagen en píxeles
+    - **format**: jpeg o webp
+    """
+    if preview_cache is None:
+        raise HTTPException(status_code=404, detail="Las vistas previas están deshabilitadas.")
+    
+    etag = f'"{document_hash}-{page}-{width}-{image_format}"'
+    headers = {"ETag": etag, "Cache-Control": f"private, max-age={settings.PREVIEW_TTL}"}
+    if if_none_match == etag:
+        return Response(status_code=304, headers=headers)
+    
+    try:
+        # Fuera del event loop, en el hilo de MuPDF (PyMuPDF no es seguro entre hilos)
+        loop = asyncio.get_running_loop()
+        image = await loop.run_in_executor(
+            mupdf_executor(), preview_cache.render, document_hash, page, width, image_format
+        )
+    except DocumentNotAvailableError:
+        raise HTTPException(
+            status_code=404,
+            detail="El documento no está disponible para vista previa. Vuelva a enviarlo a /extract-csf."
+        )
+    except PageNotFoundError:
+        raise HTTPException(status_code=404, detail=f"El documento no tiene la página {page}.")
+    
+    return Response(content=image, media_type=PREVIEW_MEDIA_TYPES[image_format], headers=headers)
+
+@router.post(
+    "/extract-csf/batch",
+    summary="Extraer datos de varias CSF",
+    description="Extrae datos fiscales de varios PDF (o de los PDF de un ZIP) y devuelve un resultado NDJSON por archivo",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"application/x-ndjson": {}}, "model": BatchItemResponse}}
+)
+async def extract_csf_batch(
+    files: List[UploadFile] = File(...),
+    user_id: Optional[str] = Form(None),
+    executor: ExtractionExecutor = Depends(get_extraction_executor),
+    result_cache: Optional[ResultCache] = Depends(get_result_cache),
+    classifier: Optional[DocumentClassifier] = Depends(get_document_classifier),
+    preview_cache: Optional[PagePreviewCache] = Depends(get_preview_cache)
+):
+    """
+    Extrae datos fiscales de un lote de Constancias de Situación Fiscal
+    
+    Los archivos se reparten entre los workers de extracción y cada resultado
+    se envía como una línea JSON (BatchItemResponse) en cuanto termina, por lo
+    que el orden de las líneas no es el de subida (ver el campo index). Un
+    archivo con error no detiene el resto del lote.
+    
+    - **files**: Archivos PDF y/o ZIP con archivos PDF
+    - **user_id**: ID del usuario (opcional)
+    """
+    user_id = user_id or "anonymous"
+    increment_counter("scraper_batch_requests_total")
+    
+    # Listar los documentos del lote; los PDF se leen (y descomprimen) al procesarlos
+    items = []
+    archives = []
+    try:
+        for file in files:
+            if not is_zip_upload(file):
+                items.append((file.filename, _upload_loader(file), None))
+                continue
+            try:
+                archive, entries = list_zip_pdfs(file.file, settings.BATCH_MAX_FILES, settings.MAX_FILE_SIZE)
+            except UploadRejectedError as e:
+                items.append((file.filename, None, e))
+                continue
+            archives.append(archive)
+            for info in entries:
+                items.append((f"{file.filename}/{info.filename}", _zip_entry_loader(archive, info), None))
+    except BaseException:
+        for archive in archives:
+            archive.close()
+        raise
+    
+    if len(items) > settings.BATCH_MAX_FILES:
+        for archive in archives:
+            archive.close()
+        increment_counter("scraper_errors_total", {"reason": "too_many_files"})
+        raise HTTPException(
+            status_code=422,
+            detail=f"El lote contiene demasiados archivos ({len(items)}); el máximo es {settings.BATCH_MAX_FILES}."
+        )
+    
+    logger.info("Lote recibido: %s archivos, usuario: %s", len(items), user_id)
+    
+    # Tantos documentos en curso como workers: el lote aprovecha todos los
+    # núcleos sin acaparar la cola que comparten las solicitudes individuales
+    slots = asyncio.Semaphore(max(executor.max_workers, 1))
+    
+    async def run_item(index, filename, loader, rejected):
+        async with slots:
+            return await _process_batch_item(
+                index, filename, loader, rejected, executor, result_cache, classifier, preview_cache
+            )
+    
+    async def stream_results():
+        tasks = [
+            asyncio.ensure_future(run_item(index, filename, loader, rejected))
+            for index, (filename, loader, rejected) in enumerate(items)
+        ]
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                item_response = await next_result
+                yield item_response.json() + "\n"
+        finally:
+            # Si el cliente se desconecta, no seguir procesando el resto del lote
+            for task in tasks:
+                task.cancel()
+            for archive in archives:
+                archive.close()
+    
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+def _upload_loader(file: UploadFile):
+    """Lector diferido de un PDF subido directamente en el lote"""
+    async def load():
+        return await read_pdf_upload(
+            file,
+            max_size=settings.MAX_FILE_SIZE,
+            max_pages=settings.MAX_PDF_PAGES,
+            spool_threshold=settings.UPLOAD_SPOOL_THRESHOLD,
+            spool_dir=settings.TEMP_DIR
+        )
+    return load
+
+def _zip_entry_loader(archive, info):
+    """Lector diferido de un PDF dentro de un ZIP (se descomprime fuera del event loop)"""
+    async def load():
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, read_zip_entry, archive, info, settings.MAX_FILE_SIZE, settings.MAX_PDF_PAGES
+        )
+    return load
+
+async def _process_batch_item(index, filename, loader, rejected, executor, result_cache, classifier,
+                              preview_cache) -> BatchItemResponse:
+    """
+    Procesa un archivo del lote y convierte cualquier error en su resultado
+    
+    Si la cola de extracción está llena por otras solicitudes, reintenta
+    mientras el documento tenga tiempo disponible.
+    
+    Returns:
+        BatchItemResponse: Resultado del archivo
+    """
+    start_time = time.time()
+    deadline = Deadline(settings.PROCESS_TIMEOUT)
+    process_id = str(uuid.uuid4())
+    # Cada archivo corre en su propia tarea: el process_id no se mezcla con los demás
+    bind_process_id(process_id)
+    increment_counter("scraper_batch_files_total")
+    
+    upload = None
+    status_code = 200
+    try:
+        if rejected is not None:
+            raise rejected
+        
+        with span("upload_read"):
+            upload = await loader()
+        logger.info("Archivo de lote recibido: %s, tamaño: %s bytes", filename, upload.size)
+        
+        while True:
+            try:
+                response = await extract_upload(
+                    upload, process_id, executor, result_cache, deadline, start_time, classifier, preview_cache
+                )
+                break
+            except ExtractionQueueFullError as e:
+                remaining = deadline.remaining()
+                if remaining is not None and remaining <= e.retry_after:
+                    raise
+                await asyncio.sleep(min(e.retry_after, 1))
+        
+    except UploadRejectedError as e:
+        logger.warning("Archivo de lote rechazado (%s): %s", e.reason, filename)
+        increment_counter("scraper_errors_total", {"reason": e.reason})
+        status_code = e.status_code
+        response = ProcessingResponse(success=False, message=e.message, process_id=process_id)
+        
+    except ExtractionQueueFullError:
+        logger.warning("Cola de extracción llena, se omite archivo de lote: %s", filename)
+        increment_counter("scraper_errors_total", {"reason": "queue_full"})
+        status_code = 429
+        response = ProcessingResponse(
+            success=False,
+            message="El servicio está procesando demasiados documentos. Intente de nuevo más tarde.",
+            process_id=process_id
+        )
+        
+    except Exception as e:
+        logger.error("Error al procesar archivo de lote %s: %s", filename, e, exc_info=True)
+        increment_counter("scraper_errors_total", {"reason": "processing_error"})
+        status_code = 500
+        response = ProcessingResponse(
+            success=False,
+            message=f"Error al procesar el documento: {str(e)}",
+            process_id=process_id
+        )
+        
+    finally:
+        if upload is not None:
+            upload.cleanup()
+    
+    return BatchItemResponse(index=index, filename=filename or "", status_code=status_code, **response.dict())
\ No newline at end of file
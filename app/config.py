@@ -20,15 +20,71 @@ class Settings(BaseSettings):
     # Límites y timeouts
     MAX_FILE_SIZE: int = Field(default=10 * 1024 * 1024, env="MAX_FILE_SIZE")  # 10 MB
     PROCESS_TIMEOUT: int = Field(default=60, env="PROCESS_TIMEOUT")  # 60 segundos
+    MAX_PDF_PAGES: int = Field(default=50, env="MAX_PDF_PAGES")
+    UPLOAD_SPOOL_THRESHOLD: int = Field(default=0, env="UPLOAD_SPOOL_THRESHOLD")  # bytes; 0 = siempre en memoria
+    BATCH_MAX_FILES: int = Field(default=200, env="BATCH_MAX_FILES")  # PDF por solicitud de lote (incluye los de ZIP)
+    BATCH_MAX_SIZE: int = Field(default=200 * 1024 * 1024, env="BATCH_MAX_SIZE")  # 200 MB por solicitud de lote
+    CLASSIFIER_ENABLED: bool = Field(default=True, env="CLASSIFIER_ENABLED")  # rechazar con 422 lo que no parece una CSF
+    CLASSIFIER_MAX_PAGES: int = Field(default=10, env="CLASSIFIER_MAX_PAGES")  # más páginas => no es una CSF
     
     # Configuración de OCR
     TESSERACT_PATH: str = Field(default="", env="TESSERACT_PATH")
     TESSERACT_LANG: str = Field(default="spa", env="TESSERACT_LANG")
     OCR_DPI: int = Field(default=300, env="OCR_DPI")
+    OCR_LOW_DPI: int = Field(default=150, env="OCR_LOW_DPI")  # primera pasada; 0 = solo OCR_DPI
+    OCR_MIN_CONFIDENCE: int = Field(default=70, env="OCR_MIN_CONFIDENCE")  # por debajo se repite a OCR_DPI
+    OCR_ROI_ENABLED: bool = Field(default=False, env="OCR_ROI_ENABLED")  # OCR solo de las regiones de la plantilla CSF
+    OCR_ENHANCE_STEPS: str = Field(default="crop_margins,contrast", env="OCR_ENHANCE_STEPS")  # crop_margins,deskew,contrast,binarize,despeckle
+    OCR_BACKEND: str = Field(default="auto", env="OCR_BACKEND")  # auto | tesserocr | pytesseract
+    PAGE_TEXT_MIN_CHARS: int = Field(default=50, env="PAGE_TEXT_MIN_CHARS")  # menos caracteres => página a OCR
+    QR_FAST_PATH: bool = Field(default=True, env="QR_FAST_PATH")  # RFC e idCIF desde el QR de la constancia
+    EARLY_EXIT: bool = Field(default=True, env="EARLY_EXIT")  # dejar de procesar páginas con datos completos
+    LAYOUT_EXTRACTION: bool = Field(default=True, env="LAYOUT_EXTRACTION")  # emparejar etiquetas y valores por posición
+    FIELD_VALIDATION: bool = Field(default=True, env="FIELD_VALIDATION")  # validar RFC, régimen, CP e idCIF y corregir errores de OCR
+    OCR_REOCR_DPI: int = Field(default=400, env="OCR_REOCR_DPI")  # último intento al releer la región de un campo inválido
+    OCR_PAGE_WORKERS: int = Field(default=1, env="OCR_PAGE_WORKERS")  # páginas en OCR simultáneo por documento
+    
+    # Motor de extracción (pool de procesos)
+    EXTRACTION_WORKERS: int = Field(default=os.cpu_count() or 1, env="EXTRACTION_WORKERS")  # 0 = hilo local
+    EXTRACTION_QUEUE_SIZE: int = Field(default=16, env="EXTRACTION_QUEUE_SIZE")
+    EXTRACTION_RETRY_AFTER: int = Field(default=5, env="EXTRACTION_RETRY_AFTER")  # segundos
+    WARMUP_ENABLED: bool = Field(default=True, env="WARMUP_ENABLED")  # extraer un PDF de muestra en cada worker al arrancar
+    
+    # Trabajos asíncronos (POST /extract-csf?async=true)
+    JOB_CONCURRENCY: int = Field(default=2, env="JOB_CONCURRENCY")  # trabajos en extracción a la vez
+    JOB_QUEUE_SIZE: int = Field(default=100, env="JOB_QUEUE_SIZE")  # trabajos en espera (PDF retenidos en memoria/disco)
+    JOB_TTL: int = Field(default=3600, env="JOB_TTL")  # segundos que se conserva el resultado
+    JOB_STORE: str = Field(default="memory", env="JOB_STORE")  # memory | sqlite
+    JOB_STORE_PATH: str = Field(default="", env="JOB_STORE_PATH")  # vacío = TEMP_DIR/jobs.sqlite3
+    JOB_WEBHOOK_TIMEOUT: int = Field(default=10, env="JOB_WEBHOOK_TIMEOUT")  # segundos por intento
+    JOB_WEBHOOK_ALLOWED_HOSTS: str = Field(default="", env="JOB_WEBHOOK_ALLOWED_HOSTS")  # hosts separados por coma; vacío = cualquier host con IP pública
+    
+    # Caché de resultados
+    CACHE_ENABLED: bool = Field(default=True, env="CACHE_ENABLED")
+    CACHE_MAX_ENTRIES: int = Field(default=512, env="CACHE_MAX_ENTRIES")
+    CACHE_TTL: int = Field(default=3600, env="CACHE_TTL")  # segundos
+    CACHE_DISK_ENABLED: bool = Field(default=False, env="CACHE_DISK_ENABLED")  # bajo TEMP_DIR
+    CACHE_DISK_MAX_BYTES: int = Field(default=256 * 1024 * 1024, env="CACHE_DISK_MAX_BYTES")  # se borran primero las entradas más antiguas
+    
+    # Vistas previas de páginas
+    PREVIEW_ENABLED: bool = Field(default=True, env="PREVIEW_ENABLED")  # retener los PDF procesados para GET /documents/.../preview
+    PREVIEW_DOCUMENT_BYTES: int = Field(default=64 * 1024 * 1024, env="PREVIEW_DOCUMENT_BYTES")  # total de PDF retenidos; se expulsan los más antiguos
+    PREVIEW_CACHE_ENTRIES: int = Field(default=256, env="PREVIEW_CACHE_ENTRIES")  # imágenes generadas en caché
+    PREVIEW_TTL: int = Field(default=3600, env="PREVIEW_TTL")  # segundos
+    PREVIEW_WIDTH: int = Field(default=320, env="PREVIEW_WIDTH")  # ancho por omisión en píxeles
+    PREVIEW_MAX_WIDTH: int = Field(default=1024, env="PREVIEW_MAX_WIDTH")  # ancho máximo que puede pedirse
+    PREVIEW_QUALITY: int = Field(default=75, env="PREVIEW_QUALITY")  # calidad JPEG/WebP (1-100)
     
     # Métricas y monitoreo
     ENABLE_METRICS: bool = Field(default=True, env="ENABLE_METRICS")
     METRICS_PORT: int = Field(default=8001, env="METRICS_PORT")
+    TRACING_ENABLED: bool = Field(default=True, env="TRACING_ENABLED")  # tiempos por etapa del pipeline
+    
+    # Logging
+    LOG_ASYNC: bool = Field(default=True, env="LOG_ASYNC")  # escribir los logs desde un hilo en segundo plano
+    LOG_QUEUE_SIZE: int = Field(default=10000, env="LOG_QUEUE_SIZE")  # registros en espera; con la cola llena se descartan
+    LOG_RATE_LIMIT: int = Field(default=20, env="LOG_RATE_LIMIT")  # registros DEBUG por línea de código por segundo; 0 = sin límite
+    LOG_RATE_LIMIT_INFO: bool = Field(default=False, env="LOG_RATE_LIMIT_INFO")  # aplicar LOG_RATE_LIMIT también a INFO (descarta registros de auditoría por solicitud)
     
     # Paths para archivos temporales
     TEMP_DIR: str = Field(default="/tmp", env="TEMP_DIR")
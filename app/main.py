@@ -1,10 +1,13 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 import logging
 
 from app.api.routes import router as api_router
 from app.utils.logging_config import setup_logging
 from app.utils.error_handlers import add_exception_handlers
+from app.api.dependencies import get_extraction_executor, get_job_queue, get_job_store
+from app.utils.metrics import mark_process_dead, start_metrics_server
 from app.config import settings
 
 # Configurar logging
@@ -30,6 +33,28 @@ if settings.ENVIRONMENT != "production":
         allow_headers=["*"],
     )
 
+# Rechazar subidas demasiado grandes antes de que se lea el cuerpo multipart
+# (las solicitudes sin Content-Length se limitan al leer el archivo en la ruta)
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    content_length = request.headers.get("content-length")
+    if request.method == "POST" and content_length and content_length.isdigit():
+        # Las solicitudes de lote tienen su propio límite total
+        max_size = settings.MAX_FILE_SIZE
+        if request.url.path.endswith("/extract-csf/batch"):
+            max_size = settings.BATCH_MAX_SIZE
+        
+        # Margen para los encabezados y campos del formulario multipart
+        if int(content_length) > max_size + 64 * 1024:
+            return JSONResponse(
+                status_code=413,
+                content={
+                    "success": False,
+                    "message": f"El archivo excede el tamaño máximo permitido de {max_size} bytes."
+                }
+            )
+    return await call_next(request)
+
 # Registrar rutas API
 app.include_router(api_router, prefix=settings.API_PREFIX)
 
@@ -46,15 +71,67 @@ async def health_check():
         "environment": settings.ENVIRONMENT
     }
 
+# Liveness probe: solo indica que el proceso y su event loop responden
+@app.get("/live", tags=["health"])
+async def liveness_check():
+    """Endpoint para la liveness probe de Kubernetes"""
+    return {"status": "alive"}
+
+# Readiness probe: el pod solo recibe tráfico si puede atenderlo a velocidad completa
+@app.get("/ready", tags=["health"])
+async def readiness_check():
+    """
+    Endpoint para la readiness probe de Kubernetes
+    
+    Responde 503 mientras los workers de extracción arrancan (y se calientan
+    con WARMUP_ENABLED), si el OCR no está disponible o si la cola de
+    extracción o la de trabajos asíncronos están llenas.
+    """
+    executor = get_extraction_executor()
+    job_queue = get_job_queue()
+    warmup, error = executor.warmup_status()
+    
+    status = "ready"
+    if warmup != "ready":
+        status = warmup
+    elif executor.saturated or job_queue.queued >= job_queue.max_queued:
+        status = "saturated"
+    
+    content = {
+        "status": status,
+        "warmup": warmup,
+        "extraction_pending": executor.pending,
+        "extraction_capacity": executor.capacity,
+        "jobs_queued": job_queue.queued,
+        "jobs_capacity": job_queue.max_queued,
+    }
+    if error:
+        content["detail"] = error
+    return JSONResponse(status_code=200 if status == "ready" else 503, content=content)
+
 # Evento de inicio de la aplicación
 @app.on_event("startup")
 async def startup_event():
-    logger.info(f"Starting {settings.APP_NAME} v{settings.APP_VERSION} in {settings.ENVIRONMENT} mode")
+    logger.info("Starting %s v%s in %s mode", settings.APP_NAME, settings.APP_VERSION, settings.ENVIRONMENT)
+    
+    # Exponer métricas de Prometheus en su propio puerto
+    if settings.ENABLE_METRICS:
+        start_metrics_server(settings.METRICS_PORT)
+    
+    # Arrancar el pool de extracción con workers precargados
+    get_extraction_executor().start()
+    
+    # Tareas de la cola de trabajos asíncronos
+    get_job_queue().start()
 
 # Evento de cierre de la aplicación
 @app.on_event("shutdown")
 async def shutdown_event():
-    logger.info(f"Shutting down {settings.APP_NAME}")
+    logger.info("Shutting down %s", settings.APP_NAME)
+    await get_job_queue().stop()
+    get_job_store().close()
+    get_extraction_executor().shutdown()
+    mark_process_dead()
 
 if __name__ == "__main__":
     import uvicorn
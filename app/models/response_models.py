@@ -1,7 +1,23 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 
+class FieldSource(BaseModel):
+    """Origen de un campo extraído del documento"""
+    metodo: str = Field(
+        description="Método con el que se obtuvo el campo (p.ej. layout)"
+    )
+    confianza: float = Field(
+        description="Confianza de la extracción entre 0 y 1"
+    )
+    pagina: int = Field(
+        description="Página de la que se obtuvo el campo (desde 0)"
+    )
+    bbox: Optional[List[float]] = Field(
+        default=None,
+        description="Coordenadas del valor en la página [x0, y0, x1, y1] en puntos"
+    )
+
 class CSFData(BaseModel):
     """Datos extraídos de la Constancia de Situación Fiscal"""
     rfc: str = Field(
@@ -24,6 +40,10 @@ class CSFData(BaseModel):
         default="",
         description="Domicilio fiscal extraído del documento"
     )
+    id_cif: str = Field(
+        default="",
+        description="idCIF de la Cédula de Identificación Fiscal (11 dígitos)"
+    )
     completo: bool = Field(
         default=False,
         description="Indica si se extrajeron todos los datos obligatorios"
@@ -32,6 +52,30 @@ class CSFData(BaseModel):
         default="",
         description="Mensaje informativo sobre la extracción"
     )
+    fuentes: Dict[str, FieldSource] = Field(
+        default_factory=dict,
+        description="Confianza y coordenadas de los campos obtenidos por posición en la página o del QR"
+    )
+    validacion: Dict[str, str] = Field(
+        default_factory=dict,
+        description="Resultado de validar cada campo con valor: valido, corregido, reocr o invalido"
+    )
+
+class StageTiming(BaseModel):
+    """Tiempo acumulado de una etapa del procesamiento"""
+    seconds: float = Field(
+        description="Segundos totales de la etapa"
+    )
+    count: int = Field(
+        description="Veces que se ejecutó la etapa (p.ej. páginas)"
+    )
+
+class ExtractionResult(BaseModel):
+    """Resultado de ejecutar el pipeline de extracción sobre un PDF"""
+    text_found: bool = False
+    data: Optional[CSFData] = None
+    timed_out: bool = False
+    timings: Dict[str, StageTiming] = {}
 
 class ProcessingResponse(BaseModel):
     """Respuesta para el procesamiento de documentos"""
@@ -55,4 +99,53 @@ class ProcessingResponse(BaseModel):
     processing_time: Optional[float] = Field(
         default=None,
         description="Tiempo de procesamiento en segundos"
+    )
+    timed_out: bool = Field(
+        default=False,
+        description="Indica si se alcanzó el tiempo límite y el resultado es parcial"
+    )
+    timings: Optional[Dict[str, StageTiming]] = Field(
+        default=None,
+        description="Tiempos por etapa (solo con el encabezado X-Debug-Timings)"
+    )
+    document_hash: Optional[str] = Field(
+        default=None,
+        description="SHA-256 del PDF; identifica el documento en GET /documents/{document_hash}/pages/{page}/preview"
+    )
+
+class BatchItemResponse(ProcessingResponse):
+    """Resultado de un archivo dentro de una solicitud de lote (una línea NDJSON)"""
+    index: int = Field(
+        description="Posición del archivo en el lote (en orden de subida y dentro de cada ZIP)"
+    )
+    filename: str = Field(
+        description="Nombre del archivo (ruta dentro del ZIP si venía comprimido)"
+    )
+    status_code: int = Field(
+        description="Código HTTP equivalente al resultado del archivo"
+    )
+
+class JobStatus(BaseModel):
+    """Estado de un procesamiento asíncrono (POST /extract-csf?async=true)"""
+    process_id: str = Field(
+        description="Identificador único del proceso"
+    )
+    status: str = Field(
+        description="Estado del trabajo: queued, processing, completed o failed"
+    )
+    priority: int = Field(
+        default=5,
+        description="Prioridad del trabajo (0 = más urgente)"
+    )
+    created_at: datetime = Field(
+        default_factory=datetime.now,
+        description="Fecha y hora en que se recibió el documento"
+    )
+    updated_at: datetime = Field(
+        default_factory=datetime.now,
+        description="Fecha y hora del último cambio de estado"
+    )
+    result: Optional[ProcessingResponse] = Field(
+        default=None,
+        description="Resultado del procesamiento cuando el estado es completed o failed"
     )
\ No newline at end of file
@@ -0,0 +1,182 @@
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# Modos de segmentación de Tesseract usados por las regiones
+PSM_SINGLE_BLOCK = 6
+PSM_SINGLE_LINE = 7
+
+# Caracteres admitidos en las regiones de un solo campo
+RFC_WHITELIST = "ABCDEFGHIJKLMNOPQRSTUVWXYZÑ&0123456789"
+DIGITS_WHITELIST = "0123456789"
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+# Diferencia máxima de proporción (ancho/alto) para considerar que la página usa la plantilla
+MAX_ASPECT_DIFFERENCE = 0.03
+# Escala aceptada al ubicar la plantilla por el QR (fuera de este rango es otro código)
+MIN_QR_SCALE = 0.8
+MAX_QR_SCALE = 1.25
+
+class Region:
+    """
+    Zona de la plantilla que se recorta y se envía a OCR
+
+    La caja se expresa como fracción del ancho y alto de la página, así que
+    no depende del tamaño en puntos ni de la resolución del render.
+    """
+    __slots__ = ("name", "box", "label", "psm", "whitelist", "pattern", "dpi")
+
+    def __init__(self, name, box, label=None, psm=PSM_SINGLE_BLOCK, whitelist=None, pattern=None, dpi=None):
+        self.name = name
+        self.box = box
+        # Etiqueta que antecede al valor en el texto de la página (None = el
+        # recorte ya incluye sus etiquetas)
+        self.label = label
+        self.psm = psm
+        self.whitelist = whitelist
+        self.pattern = re.compile(pattern) if pattern else None
+        # Resolución propia (None = la de OCR): el texto grande se lee peor a 300 DPI
+        self.dpi = dpi
+
+    def read(self, text):
+        """
+        Limpia el texto reconocido y verifica que tenga el formato esperado
+
+        Args:
+            text (str): Texto reconocido en la región
+
+        Returns:
+            str: Texto limpio o None si la región no es válida
+        """
+        text = text.strip()
+        # En los campos con lista de caracteres los espacios son errores de segmentación
+        if self.whitelist:
+            text = WHITESPACE_PATTERN.sub("", text)
+        if not text or (self.pattern and not self.pattern.fullmatch(text)):
+            return None
+        return text
+
+class Anchor:
+    """Texto fijo de la plantilla y la posición (fracción) de su esquina superior izquierda"""
+    __slots__ = ("text", "point")
+
+    def __init__(self, text, point):
+        self.text = text
+        self.point = point
+
+class CSFTemplate:
+    """
+    Distribución fija de una página de la Constancia de Situación Fiscal
+
+    Las regiones se ubican en su posición nominal, o desplazadas según dónde
+    aparezca un ancla de texto o el código QR en la página real (escaneos
+    con márgenes distintos o recortados).
+    """
+    def __init__(self, regions, anchors=(), qr_box=None, page_size=(612, 792), pages=(0,)):
+        self.regions = regions
+        self.anchors = anchors
+        # Caja nominal del QR (fracción de la página) o None si no tiene
+        self.qr_box = qr_box
+        self.aspect = page_size[0] / page_size[1]
+        self.pages = pages
+
+    def applies_to(self, page_num, width, height):
+        """
+        Indica si la plantilla corresponde a una página
+
+        Args:
+            page_num (int): Número de página
+            width (float): Ancho de la página en puntos
+            height (float): Alto de la página en puntos
+
+        Returns:
+            bool: True si es una de las páginas de la plantilla y tiene su proporción
+        """
+        return page_num in self.pages and height > 0 and abs(width / height - self.aspect) <= MAX_ASPECT_DIFFERENCE
+
+    def transform_from_anchor(self, anchor, x, y, width, height):
+        """
+        Calcula el desplazamiento de la plantilla a partir de un ancla encontrada
+
+        Args:
+            anchor (Anchor): Ancla de la plantilla
+            x (float): Posición x del ancla en la página (puntos)
+            y (float): Posición y del ancla en la página (puntos)
+            width (float): Ancho de la página
+            height (float): Alto de la página
+
+        Returns:
+            tuple: (escala, dx, dy) en puntos
+        """
+        return 1.0, x - anchor.point[0] * width, y - anchor.point[1] * height
+
+    def transform_from_qr(self, rect, width, height):
+        """
+        Calcula escala y desplazamiento de la plantilla a partir del QR encontrado
+
+        Args:
+            rect (tuple): Caja (x0, y0, x1, y1) del QR en la página (puntos)
+            width (float): Ancho de la página
+            height (float): Alto de la página
+
+        Returns:
+            tuple: (escala, dx, dy) o None si el QR no es compatible con la plantilla
+        """
+        if self.qr_box is None:
+            return None
+
+        expected_x0, expected_y0 = self.qr_box[0] * width, self.qr_box[1] * height
+        expected_size = (self.qr_box[2] - self.qr_box[0]) * width
+        scale = (rect[2] - rect[0]) / expected_size
+        if not MIN_QR_SCALE <= scale <= MAX_QR_SCALE:
+            return None
+        return scale, rect[0] - expected_x0 * scale, rect[1] - expected_y0 * scale
+
+    def locate(self, width, height, transform=None):
+        """
+        Calcula la caja de cada región en la página
+
+        Args:
+            width (float): Ancho de la página en puntos
+            height (float): Alto de la página en puntos
+            transform (tuple, optional): (escala, dx, dy) de transform_from_*
+
+        Returns:
+            list: Tuplas (Region, (x0, y0, x1, y1)) en puntos, recortadas a la página
+        """
+        scale, dx, dy = transform or (1.0, 0.0, 0.0)
+        located = []
+        for region in self.regions:
+            x0, y0, x1, y1 = region.box
+            box = (
+                max(x0 * width * scale + dx, 0),
+                max(y0 * height * scale + dy, 0),
+                min(x1 * width * scale + dx, width),
+                min(y1 * height * scale + dy, height),
+            )
+            if box[2] > box[0] and box[3] > box[1]:
+                located.append((region, box))
+        return located
+
+# Primera página de la CSF del SAT (tamaño carta). Las regiones de un solo
+# campo van primero: su texto antecede al de los bloques, así que las reglas
+# de DataExtractor encuentran antes el valor leído con lista de caracteres.
+SAT_CSF_TEMPLATE = CSFTemplate(
+    regions=[
+        # RFC bajo el QR de la cédula de identificación fiscal (letra grande)
+        Region("rfc", (0.06, 0.26, 0.42, 0.30), label="RFC:", psm=PSM_SINGLE_LINE,
+               whitelist=RFC_WHITELIST, pattern=r"[A-Z&Ñ]{3,4}\d{6}[A-Z0-9]{3}", dpi=150),
+        # Valor del primer renglón de "Datos del domicilio registrado"
+        Region("codigo_postal", (0.25, 0.605, 0.50, 0.625), label="Código Postal:", psm=PSM_SINGLE_LINE,
+               whitelist=DIGITS_WHITELIST, pattern=r"\d{5}"),
+        Region("identificacion", (0.04, 0.40, 0.96, 0.58)),
+        Region("domicilio", (0.04, 0.60, 0.96, 0.76)),
+    ],
+    anchors=[
+        Anchor("Datos de Identificación del Contribuyente", (0.05, 0.385)),
+        Anchor("Datos del domicilio registrado", (0.05, 0.585)),
+    ],
+    qr_box=(0.07, 0.12, 0.24, 0.251),
+)
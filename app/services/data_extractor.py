@@ -1,31 +1,130 @@
 import logging
 import re
+from collections import defaultdict
 from app.models.response_models import CSFData
+from app.utils.tracing import span
 
 logger = logging.getLogger(__name__)
 
+# Etiquetas de la CSF que sirven de ancla. Se buscan todas en una sola pasada
+# sobre el texto; cada regla de campo se evalúa después solo en las posiciones
+# de su ancla (con match), en lugar de recorrer el texto completo con search.
+# Las alternativas se agrupan por primera letra para que el motor de re pueda
+# saltar rápido los caracteres que no inician ninguna etiqueta, y se evalúan
+# sobre el texto en mayúsculas (sin IGNORECASE, que es bastante más lento).
+ANCHOR_SOURCE = (
+    r'R(?:(?P<rfc>\.?F\.?C)|(?P<registro>EGISTRO)|(?P<regimen>ÉGIMEN)|(?P<regimenes>EGÍMENES))'
+    r'|C(?:(?P<cedula>ÉDULA)|(?P<contribuyente>ONTRIBUYENTE)|(?P<cp>\.?P)|(?P<codigo_postal>ÓDIGO))'
+    r'|N(?P<nombre>OMBRE)'
+    r'|D(?:(?P<denominacion>ENOMINACIÓN)|(?P<domicilio>OMICILIO))'
+    r'|U(?P<ubicacion>BICACIÓN)'
+    r'|I(?P<idcif>DCIF)'
+)
+ANCHOR_PATTERN = re.compile(ANCHOR_SOURCE)
+# Respaldo si pasar a mayúsculas cambia la longitud del texto (p.ej. "ß" -> "SS")
+ANCHOR_PATTERN_IGNORECASE = re.compile(ANCHOR_SOURCE, re.IGNORECASE)
+
+# Reglas por campo, en orden de prioridad: (ancla, patrón evaluado en la posición del ancla)
+RFC_RULES = [
+    ('rfc', re.compile(r'R\.?F\.?C\.?\s*:?\s*([A-Z&Ñ]{3,4}\d{6}[A-Z0-9]{3})', re.IGNORECASE)),
+    ('registro', re.compile(r'REGISTRO\s+FEDERAL\s+DE\s+CONTRIBUYENTES\s*:?\s*([A-Z&Ñ]{3,4}\d{6}[A-Z0-9]{3})', re.IGNORECASE)),
+    ('cedula', re.compile(r'CÉDULA\s+DE\s+IDENTIFICACIÓN\s+FISCAL\s*:?\s*([A-Z&Ñ]{3,4}\d{6}[A-Z0-9]{3})', re.IGNORECASE)),
+]
+NOMBRE_RULES = [
+    ('nombre', re.compile(r'NOMBRE\s*COMERCIAL?\s*:?\s*([^\n]{5,150})', re.IGNORECASE)),
+    ('denominacion', re.compile(r'DENOMINACIÓN/RAZÓN\s*SOCIAL\s*:?\s*([^\n]{5,150})', re.IGNORECASE)),
+    ('contribuyente', re.compile(r'CONTRIBUYENTE\s*:?\s*([^\n]{5,150})', re.IGNORECASE)),
+]
+REGIMEN_RULES = [
+    ('regimen', re.compile(r'RÉGIMEN\s*FISCAL\s*:?\s*(\d{3}[^\n]{0,100})', re.IGNORECASE)),
+    ('regimen', re.compile(r'RÉGIMEN\s*:?\s*(\d{3}[^\n]{0,100})', re.IGNORECASE)),
+    ('regimen', re.compile(r'RÉGIMEN\s*([^\n]*\d{3}[^\n]{0,100})', re.IGNORECASE)),
+]
+CODIGO_POSTAL_RULES = [
+    ('cp', re.compile(r'C\.?P\.?\s*:?\s*(\d{5})', re.IGNORECASE)),
+    ('codigo_postal', re.compile(r'CÓDIGO\s*POSTAL\s*:?\s*(\d{5})', re.IGNORECASE)),
+    ('domicilio', re.compile(r'DOMICILIO\s*FISCAL[\s\S]*?C\.?P\.?\s*:?\s*(\d{5})', re.IGNORECASE)),
+]
+DOMICILIO_RULES = [
+    ('domicilio', re.compile(r'DOMICILIO\s*FISCAL\s*:?\s*([^\n]{10,200})', re.IGNORECASE)),
+    ('ubicacion', re.compile(r'UBICACIÓN\s*:?\s*([^\n]{10,200})', re.IGNORECASE)),
+    ('domicilio', re.compile(r'DOMICILIO\s*:?\s*([^\n]{10,200})', re.IGNORECASE)),
+]
+ID_CIF_RULES = [
+    ('idcif', re.compile(r'IDCIF\s*:?\s*(\d{11})(?!\d)', re.IGNORECASE)),
+]
+# Sección de domicilio acotada a 300 caracteres desde el ancla
+DOMICILIO_SECTION_PATTERN = re.compile(r'DOMICILIO([\s\S]{10,300})(?:ACTIVIDADES|OBLIGACIONES|REGIMEN)', re.IGNORECASE)
+
+# Búsquedas genéricas (solo si ninguna regla con etiqueta encontró el campo)
+GENERIC_RFC_PATTERN = re.compile(r'(?<!\w)([A-Z&Ñ]{3,4}\d{6}[A-Z0-9]{3})(?!\w)')
+GENERIC_CP_PATTERN = re.compile(r'(?<!\d)(\d{5})(?!\d)')
+# Primer código de 3 dígitos seguido de un fin de línea (tabla de regímenes)
+REGIMEN_CODE_LINE_PATTERN = re.compile(r'\d{3}(?=[^\n]*\n)')
+REGIMEN_CODE_PATTERN = re.compile(r'(\d{3})')
+NON_DIGIT_PATTERN = re.compile(r'[^\d]')
+
+# Limpieza de texto
+WHITESPACE_PATTERN = re.compile(r'\s+')
+NON_PRINTABLE_PATTERN = re.compile(r'[^\x20-\x7E\xA0-\xFF]')
+LEFTOVER_LABEL_PATTERN = re.compile(r'RFC\s*:|NOMBRE\s*:|C\.?P\.?\s*:', re.IGNORECASE)
+
+# Método de extracción por patrones de cada campo de CSFData
+FIELD_EXTRACTORS = {
+    'rfc': '_extract_rfc',
+    'nombre': '_extract_nombre',
+    'regimen_fiscal': '_extract_regimen_fiscal',
+    'codigo_postal': '_extract_codigo_postal',
+    'domicilio': '_extract_domicilio',
+    'id_cif': '_extract_id_cif',
+}
+
 class DataExtractor:
     """Clase para extraer datos fiscales a partir del texto del PDF CSF"""
     
-    def extract_from_text(self, text):
+    # Incrementar al cambiar patrones o reglas (invalida la caché de resultados)
+    VERSION = "4"
+    
+    def __init__(self, layout_extractor=None):
+        # Extracción por posición en las páginas con capa de texto (opcional)
+        self.layout_extractor = layout_extractor
+    
+    @span("data_extraction")
+    def extract_from_text(self, text, layout_fields=None):
         """
         Extrae datos fiscales del texto extraído de un PDF de CSF
         
         Args:
             text (str): Texto extraído del PDF
+            layout_fields (dict, optional): Campos ya obtenidos por posición o
+                del QR (campo -> (valor, FieldSource)); tienen prioridad y los
+                patrones solo se evalúan para los campos que falten
             
         Returns:
             CSFData: Objeto con los datos extraídos
         """
         try:
-            logger.info("Extrayendo datos del texto CSF")
+            logger.debug("Extrayendo datos del texto CSF")
+            layout_fields = layout_fields or {}
             
-            # Extraer datos usando expresiones regulares y patrones
-            rfc = self._extract_rfc(text)
-            nombre = self._extract_nombre(text)
-            regimen_fiscal = self._extract_regimen_fiscal(text)
-            codigo_postal = self._extract_codigo_postal(text)
-            domicilio = self._extract_domicilio(text)
+            # Localizar todas las etiquetas en una sola pasada y extraer cada campo desde ellas
+            anchors = None
+            if any(field not in layout_fields for field in FIELD_EXTRACTORS):
+                anchors = self._find_anchors(text)
+            
+            values = {}
+            for field, method in FIELD_EXTRACTORS.items():
+                if field in layout_fields:
+                    values[field] = layout_fields[field][0]
+                else:
+                    values[field] = getattr(self, method)(text, anchors)
+            
+            rfc = values['rfc']
+            nombre = values['nombre']
+            regimen_fiscal = values['regimen_fiscal']
+            codigo_postal = values['codigo_postal']
+            domicilio = values['domicilio']
+            id_cif = values['id_cif']
             
             # Calcular si tenemos los datos mínimos completos
             completo = bool(rfc and nombre and regimen_fiscal and codigo_postal)
@@ -38,13 +137,13 @@ class DataExtractor:
             if regimen_fiscal:
                 regimen_fiscal = self._clean_text(regimen_fiscal)
                 # Si el régimen fiscal contiene un código de 3 dígitos, extraerlo
-                codigo_match = re.search(r'(\d{3})', regimen_fiscal)
+                codigo_match = REGIMEN_CODE_PATTERN.search(regimen_fiscal)
                 if codigo_match:
                     regimen_fiscal = codigo_match.group(1)
             if codigo_postal:
                 codigo_postal = self._clean_text(codigo_postal)
                 # Asegurar que sea solo 5 dígitos
-                codigo_postal = re.sub(r'[^\d]', '', codigo_postal)[:5]
+                codigo_postal = NON_DIGIT_PATTERN.sub('', codigo_postal)[:5]
             
             return CSFData(
                 rfc=rfc or '',
@@ -52,12 +151,14 @@ class DataExtractor:
                 regimen_fiscal=regimen_fiscal or '',
                 codigo_postal=codigo_postal or '',
                 domicilio=domicilio or '',
+                id_cif=id_cif or '',
                 completo=completo,
-                mensaje="Datos extraídos del PDF de la Constancia de Situación Fiscal"
+                mensaje="Datos extraídos del PDF de la Constancia de Situación Fiscal",
+                fuentes={field: source for field, (_, source) in layout_fields.items()}
             )
             
         except Exception as e:
-            logger.error(f"Error al extraer datos de texto: {str(e)}")
+            logger.error("Error al extraer datos de texto: %s", e)
             return CSFData(
                 rfc='',
                 nombre='',
@@ -67,165 +168,253 @@ class DataExtractor:
                 mensaje=f"Error al procesar el documento: {str(e)}"
             )
     
-    def _extract_rfc(self, text):
+    def extract_from_pages(self, pages, stop_when_complete=True):
+        """
+        Extrae datos fiscales conforme llegan las páginas del PDF
+        
+        Con stop_when_complete, después de cada página se vuelve a extraer
+        sobre el texto acumulado y se deja de consumir páginas en cuanto los
+        datos obligatorios están completos, de modo que no se procesan (ni se
+        aplica OCR a) las páginas restantes. Si hay layout_extractor, las páginas con
+        palabras (capa de texto) se analizan además por posición.
+        
+        Args:
+            pages (iterable): PageContent (o texto) de cada página, en orden
+            stop_when_complete (bool): Dejar de consumir páginas al completar
+            
+        Returns:
+            tuple: (CSFData o None si no hubo texto, texto acumulado)
+        """
+        text = ""
+        csf_data = None
+        layout_fields = {}
+        
+        for page_num, page in enumerate(pages):
+            page_text = page if isinstance(page, str) else page.text
+            if not isinstance(page, str):
+                # Campos que la página ya trae resueltos (p.ej. del QR), aunque el OCR falle
+                for field, value in page.fields.items():
+                    layout_fields.setdefault(field, value)
+            
+            if not page_text or not page_text.strip():
+                continue
+            
+            words = None if isinstance(page, str) else page.words
+            if self.layout_extractor is not None and words:
+                with span("layout"):
+                    page_fields = self.layout_extractor.extract_from_words(words, page.page_num)
+                for field, value in page_fields.items():
+                    layout_fields.setdefault(field, value)
+            
+            text = f"{text}\n{page_text}" if text else page_text
+            if not stop_when_complete:
+                continue
+            
+            csf_data = self.extract_from_text(text, layout_fields)
+            if csf_data.completo:
+                logger.info("Datos completos tras la página %s, se omiten las restantes", page_num)
+                break
+        
+        # Sin salida anticipada basta con extraer una vez sobre el documento completo
+        if not stop_when_complete and text:
+            csf_data = self.extract_from_text(text, layout_fields)
+        
+        return csf_data, text
+    
+    def _find_anchors(self, text):
+        """
+        Localiza las etiquetas de la CSF en una sola pasada sobre el texto
+        
+        Args:
+            text (str): Texto completo
+            
+        Returns:
+            dict: Posiciones de inicio de cada tipo de etiqueta, en orden
+        """
+        upper_text = text.upper()
+        if len(upper_text) == len(text):
+            matches = ANCHOR_PATTERN.finditer(upper_text)
+        else:
+            matches = ANCHOR_PATTERN_IGNORECASE.finditer(text)
+        
+        anchors = defaultdict(list)
+        for match in matches:
+            anchors[match.lastgroup].append(match.start())
+        return anchors
+    
+    def _match_rules(self, text, anchors, rules):
+        """
+        Evalúa reglas en orden de prioridad en las posiciones de su etiqueta
+        
+        Args:
+            text (str): Texto completo
+            anchors (dict): Posiciones de etiquetas devueltas por _find_anchors
+            rules (list): Lista de (etiqueta, patrón compilado)
+            
+        Returns:
+            tuple: (valor, patrón) de la primera regla que coincide, o (None, None)
+        """
+        for anchor, pattern in rules:
+            for position in anchors.get(anchor, ()):
+                match = pattern.match(text, position)
+                if match:
+                    return match.group(1), pattern
+        return None, None
+    
+    def _extract_rfc(self, text, anchors=None):
         """
         Extrae el RFC del texto usando múltiples patrones
         
         Args:
             text (str): Texto completo
+            anchors (dict, optional): Posiciones de etiquetas ya calculadas
             
         Returns:
             str: RFC extraído o None si no se encuentra
         """
-        # Patrones comunes para RFC en la CSF
-        patterns = [
-            r'R\.?F\.?C\.?\s*:?\s*([A-Z&Ñ]{3,4}\d{6}[A-Z0-9]{3})',
-            r'REGISTRO\s+FEDERAL\s+DE\s+CONTRIBUYENTES\s*:?\s*([A-Z&Ñ]{3,4}\d{6}[A-Z0-9]{3})',
-            r'CÉDULA\s+DE\s+IDENTIFICACIÓN\s+FISCAL\s*:?\s*([A-Z&Ñ]{3,4}\d{6}[A-Z0-9]{3})'
-        ]
+        anchors = self._find_anchors(text) if anchors is None else anchors
         
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                logger.info(f"RFC encontrado con patrón: {pattern}")
-                return match.group(1)
+        value, pattern = self._match_rules(text, anchors, RFC_RULES)
+        if value:
+            logger.debug("RFC encontrado con patrón: %s", pattern.pattern)
+            return value
         
         # Búsqueda genérica de formato RFC
-        general_rfc = re.search(r'(?<!\w)([A-Z&Ñ]{3,4}\d{6}[A-Z0-9]{3})(?!\w)', text)
+        general_rfc = GENERIC_RFC_PATTERN.search(text)
         if general_rfc:
-            logger.info("RFC encontrado con búsqueda general")
+            logger.debug("RFC encontrado con búsqueda general")
             return general_rfc.group(1)
         
         logger.warning("No se pudo encontrar el RFC en el texto")
         return None
     
-    def _extract_nombre(self, text):
+    def _extract_nombre(self, text, anchors=None):
         """
         Extrae el nombre o razón social del texto
         
         Args:
             text (str): Texto completo
+            anchors (dict, optional): Posiciones de etiquetas ya calculadas
             
         Returns:
             str: Nombre extraído o None si no se encuentra
         """
-        # Patrones para nombre o razón social
-        patterns = [
-            r'NOMBRE\s*COMERCIAL?\s*:?\s*([^\n]{5,150})',
-            r'DENOMINACIÓN/RAZÓN\s*SOCIAL\s*:?\s*([^\n]{5,150})',
-            r'CONTRIBUYENTE\s*:?\s*([^\n]{5,150})'
-        ]
+        anchors = self._find_anchors(text) if anchors is None else anchors
         
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                logger.info(f"Nombre encontrado con patrón: {pattern}")
-                return match.group(1)
+        value, pattern = self._match_rules(text, anchors, NOMBRE_RULES)
+        if value:
+            logger.debug("Nombre encontrado con patrón: %s", pattern.pattern)
+            return value
         
         logger.warning("No se pudo encontrar el nombre en el texto")
         return None
     
-    def _extract_regimen_fiscal(self, text):
+    def _extract_regimen_fiscal(self, text, anchors=None):
         """
         Extrae el régimen fiscal del texto
         
         Args:
             text (str): Texto completo
+            anchors (dict, optional): Posiciones de etiquetas ya calculadas
             
         Returns:
             str: Régimen fiscal extraído o None si no se encuentra
         """
-        # Patrones para régimen fiscal
-        patterns = [
-            r'RÉGIMEN\s*FISCAL\s*:?\s*(\d{3}[^\n]{0,100})',
-            r'RÉGIMEN\s*:?\s*(\d{3}[^\n]{0,100})',
-            r'RÉGIMEN\s*([^\n]*\d{3}[^\n]{0,100})'
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE | re.DOTALL)
-            if match:
-                logger.info(f"Régimen fiscal encontrado con patrón: {pattern}")
-                return match.group(1)
-        
-        # Buscar sección de régimen
-        regime_section = re.search(r'REGÍMENES[\s\S]*?((?:\d{3}[^\n]*\n){1,5})', text, re.IGNORECASE)
-        if regime_section:
-            # Extraer solo el código numérico
-            codigo = re.search(r'(\d{3})', regime_section.group(1))
+        anchors = self._find_anchors(text) if anchors is None else anchors
+        
+        value, pattern = self._match_rules(text, anchors, REGIMEN_RULES)
+        if value:
+            logger.debug("Régimen fiscal encontrado con patrón: %s", pattern.pattern)
+            return value
+        
+        # Buscar sección de régimen: primer código de 3 dígitos tras la etiqueta
+        regimenes = anchors.get('regimenes')
+        if regimenes:
+            codigo = REGIMEN_CODE_LINE_PATTERN.search(text, regimenes[0] + len('REGÍMENES'))
             if codigo:
-                logger.info("Régimen fiscal encontrado en sección de regímenes")
-                return codigo.group(1)
+                logger.debug("Régimen fiscal encontrado en sección de regímenes")
+                return codigo.group(0)
         
         logger.warning("No se pudo encontrar el régimen fiscal en el texto")
         return None
     
-    def _extract_codigo_postal(self, text):
+    def _extract_codigo_postal(self, text, anchors=None):
         """
         Extrae el código postal del texto
         
         Args:
             text (str): Texto completo
+            anchors (dict, optional): Posiciones de etiquetas ya calculadas
             
         Returns:
             str: Código postal extraído o None si no se encuentra
         """
-        # Patrones para código postal
-        patterns = [
-            r'C\.?P\.?\s*:?\s*(\d{5})',
-            r'CÓDIGO\s*POSTAL\s*:?\s*(\d{5})',
-            r'DOMICILIO\s*FISCAL[\s\S]*?C\.?P\.?\s*:?\s*(\d{5})'
-        ]
+        anchors = self._find_anchors(text) if anchors is None else anchors
         
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                logger.info(f"Código postal encontrado con patrón: {pattern}")
-                return match.group(1)
+        value, pattern = self._match_rules(text, anchors, CODIGO_POSTAL_RULES)
+        if value:
+            logger.debug("Código postal encontrado con patrón: %s", pattern.pattern)
+            return value
         
         # Buscar formato de código postal en general
-        cp_match = re.search(r'(?<!\d)(\d{5})(?!\d)', text)
+        cp_match = GENERIC_CP_PATTERN.search(text)
         if cp_match:
-            logger.info("Código postal encontrado con búsqueda general")
+            logger.debug("Código postal encontrado con búsqueda general")
             return cp_match.group(1)
         
         logger.warning("No se pudo encontrar el código postal en el texto")
         return None
     
-    def _extract_domicilio(self, text):
+    def _extract_domicilio(self, text, anchors=None):
         """
         Extrae el domicilio fiscal del texto
         
         Args:
             text (str): Texto completo
+            anchors (dict, optional): Posiciones de etiquetas ya calculadas
             
         Returns:
             str: Domicilio extraído o None si no se encuentra
         """
-        # Patrones para domicilio fiscal
-        patterns = [
-            r'DOMICILIO\s*FISCAL\s*:?\s*([^\n]{10,200})',
-            r'UBICACIÓN\s*:?\s*([^\n]{10,200})',
-            r'DOMICILIO\s*:?\s*([^\n]{10,200})'
-        ]
+        anchors = self._find_anchors(text) if anchors is None else anchors
         
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                logger.info(f"Domicilio encontrado con patrón: {pattern}")
-                return match.group(1)
+        value, pattern = self._match_rules(text, anchors, DOMICILIO_RULES)
+        if value:
+            logger.debug("Domicilio encontrado con patrón: %s", pattern.pattern)
+            return value
         
         # Buscar sección de domicilio
-        domicilio_section = re.search(r'DOMICILIO([\s\S]{10,300})(?:ACTIVIDADES|OBLIGACIONES|REGIMEN)', text, re.IGNORECASE)
-        if domicilio_section:
+        value, _ = self._match_rules(text, anchors, [('domicilio', DOMICILIO_SECTION_PATTERN)])
+        if value:
             # Limpiar y devolver
-            domicilio = domicilio_section.group(1).strip()
-            logger.info("Domicilio encontrado en sección de domicilio")
-            return domicilio
+            logger.debug("Domicilio encontrado en sección de domicilio")
+            return value.strip()
         
         logger.warning("No se pudo encontrar el domicilio en el texto")
         return None
     
+    def _extract_id_cif(self, text, anchors=None):
+        """
+        Extrae el idCIF de la cédula de identificación fiscal
+        
+        Args:
+            text (str): Texto completo
+            anchors (dict, optional): Posiciones de etiquetas ya calculadas
+            
+        Returns:
+            str: idCIF extraído o None si no se encuentra
+        """
+        anchors = self._find_anchors(text) if anchors is None else anchors
+        
+        value, _ = self._match_rules(text, anchors, ID_CIF_RULES)
+        if value:
+            logger.debug("idCIF encontrado en el texto")
+            return value
+        
+        # Es opcional: muchas copias de la constancia no incluyen la cédula
+        logger.info("No se encontró el idCIF en el texto")
+        return None
+    
     def _clean_text(self, text):
         """
         Limpia el texto extraído eliminando caracteres no deseados
@@ -240,12 +429,10 @@ class DataExtractor:
             return ""
         
         # Eliminar espacios múltiples y caracteres extraños
-        text = re.sub(r'\s+', ' ', text)
+        text = WHITESPACE_PATTERN.sub(' ', text)
         # Eliminar caracteres que no son imprimibles
-        text = re.sub(r'[^\x20-\x7E\xA0-\xFF]', '', text)
-        # Eliminar etiquetas como "RFC:" si quedaron en el texto
-        text = re.sub(r'RFC\s*:', '', text, flags=re.IGNORECASE)
-        text = re.sub(r'NOMBRE\s*:', '', text, flags=re.IGNORECASE)
-        text = re.sub(r'C\.?P\.?\s*:', '', text, flags=re.IGNORECASE)
+        text = NON_PRINTABLE_PATTERN.sub('', text)
+        # Eliminar etiquetas como "RFC:", "NOMBRE:" o "C.P.:" si quedaron en el texto
+        text = LEFTOVER_LABEL_PATTERN.sub('', text)
         
         return text.strip()
\ No newline at end of file
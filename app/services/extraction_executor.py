@@ -0,0 +1,228 @@
+import asyncio
+import contextvars
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from app.models.response_models import ExtractionResult
+from app.utils import metrics
+from app.utils.logging_config import current_process_id, log_context
+from app.utils.mupdf import mupdf_executor
+
+logger = logging.getLogger(__name__)
+
+# Pipeline precargado en cada proceso del pool (uno por worker)
+_worker_pipeline = None
+# Motivo por el que el worker no está listo (None = listo)
+_worker_error = None
+# Barrera compartida por las tareas de arranque (una por worker)
+_start_barrier = None
+# Segundos que la tarea de arranque de un worker espera a las de los demás
+WORKER_START_TIMEOUT = 300
+
+def _init_worker(warmup=False, start_barrier=None):
+    """
+    Inicializa un proceso del pool: configura logging, crea instancias
+    de PDFProcessor/DataExtractor que se reutilizan en todas las tareas y
+    verifica el OCR (con warmup, extrayendo además el PDF de muestra)
+    """
+    global _worker_pipeline, _worker_error, _start_barrier
+    _start_barrier = start_barrier
+    from multiprocessing.util import Finalize
+    from app.utils.logging_config import setup_logging, shutdown_logging
+    from app.api.dependencies import get_extraction_pipeline
+    from app.services.warmup import warm_up
+
+    setup_logging()
+    # Los procesos del pool no ejecutan atexit: vaciar la cola de logs al terminar
+    Finalize(None, shutdown_logging, exitpriority=0)
+    # El registro de métricas de este proceso no se expone; las observaciones
+    # viajan con cada resultado y se registran en el proceso principal
+    metrics.start_buffering()
+    _worker_pipeline = get_extraction_pipeline()
+    _worker_error = warm_up(_worker_pipeline, run_sample=warmup)
+    # Las métricas del calentamiento no corresponden a ninguna solicitud
+    metrics.drain_buffer()
+    logger.info("Worker de extracción %s listo", os.getpid())
+
+def _warm_worker():
+    """
+    Tarea usada para forzar el arranque (y calentamiento) de los procesos del pool
+
+    Espera en la barrera a las tareas de arranque de los demás: hasta que
+    cada proceso del pool tenga la suya ninguna termina, así un worker que
+    ya arrancó no puede completarlas todas mientras otros se calientan.
+
+    Returns:
+        str: Motivo por el que el worker no está listo, o None si lo está
+    """
+    if _start_barrier is not None:
+        try:
+            _start_barrier.wait(WORKER_START_TIMEOUT)
+        except threading.BrokenBarrierError:
+            return "Los workers de extracción no arrancaron a tiempo"
+    return _worker_error
+
+def _run_extraction(pdf_content, deadline, process_id=None):
+    """
+    Ejecuta el pipeline de extracción dentro de un proceso del pool
+
+    Args:
+        pdf_content (bytes | str): Contenido del PDF o ruta del archivo
+        deadline (Deadline): Límite de tiempo de la solicitud
+        process_id (str, optional): Identificador del procesamiento para los logs del worker
+
+    Returns:
+        tuple: (ExtractionResult, observaciones de métricas del worker)
+    """
+    try:
+        with log_context(process_id):
+            return _worker_pipeline.run(pdf_content, deadline), metrics.drain_buffer()
+    except BaseException:
+        metrics.drain_buffer()
+        raise
+
+class ExtractionQueueFullError(Exception):
+    """Se lanza cuando la cola de extracción está llena"""
+    def __init__(self, retry_after):
+        super().__init__("La cola de extracción está llena")
+        self.retry_after = retry_after
+
+class ExtractionExecutor:
+    """
+    Ejecuta el pipeline de extracción fuera del event loop
+
+    Con max_workers > 0 usa un pool de procesos con instancias precargadas
+    de PDFProcessor/DataExtractor; con max_workers <= 0 ejecuta en el hilo
+    de MuPDF del proceso principal (útil en desarrollo). El número de tareas admitidas está
+    acotado a max_workers + queue_size; por encima se rechaza la solicitud.
+    """
+    def __init__(self, max_workers, queue_size, retry_after, pipeline_factory=None, warmup=False):
+        self.max_workers = max_workers
+        self.queue_size = queue_size
+        self.retry_after = retry_after
+        self.pipeline_factory = pipeline_factory
+        # Extraer un PDF de muestra en cada worker al arrancar
+        self.warmup = warmup
+        self._pool = None
+        self._local_pipeline = None
+        self._pending = 0
+        self._warm_futures = []
+
+    @property
+    def capacity(self):
+        """Número máximo de tareas en ejecución o en espera"""
+        return max(self.max_workers, 1) + self.queue_size
+
+    @property
+    def pending(self):
+        """Número de tareas en ejecución o en espera"""
+        return self._pending
+
+    @property
+    def saturated(self):
+        """Indica si la cola de extracción está llena"""
+        return self._pending >= self.capacity
+
+    def warmup_status(self):
+        """
+        Estado del arranque de los workers
+
+        Returns:
+            tuple: ("stopped" | "warming" | "ready" | "failed", motivo del fallo o None)
+        """
+        if self._pool is None:
+            return "stopped", None
+        if not all(future.done() for future in self._warm_futures):
+            return "warming", None
+        for future in self._warm_futures:
+            error = str(future.exception()) if future.exception() else future.result()
+            if error:
+                return "failed", error
+        return "ready", None
+
+    def start(self):
+        """Crea el pool y arranca los workers para que estén precargados"""
+        if self._pool is not None:
+            return
+
+        if self.max_workers > 0:
+            context = multiprocessing.get_context("spawn")
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(self.warmup, context.Barrier(self.max_workers))
+            )
+            # Una tarea por worker para que todos arranquen (y se calienten) ya;
+            # la barrera asegura que cada proceso ejecute exactamente una
+            self._warm_futures = [self._pool.submit(_warm_worker) for _ in range(self.max_workers)]
+            logger.info("Pool de extracción iniciado con %s procesos", self.max_workers)
+        else:
+            # El pipeline solo se importa en el proceso que extrae (aquí o en los workers)
+            from app.services.warmup import warm_up
+
+            # Compartido con el clasificador y las vistas previas: PyMuPDF no es seguro entre hilos
+            self._pool = mupdf_executor()
+            self._local_pipeline = self.pipeline_factory()
+            self._warm_futures = [self._pool.submit(warm_up, self._local_pipeline, self.warmup)]
+            logger.info("Extracción en hilo local (EXTRACTION_WORKERS=0)")
+
+    def shutdown(self, wait=True):
+        """Detiene el pool de extracción"""
+        if self._pool is not None:
+            # El hilo de MuPDF es compartido; solo se detiene el pool de procesos
+            if self._local_pipeline is None:
+                self._pool.shutdown(wait=wait, cancel_futures=True)
+            self._pool = None
+            self._local_pipeline = None
+            logger.info("Pool de extracción detenido")
+
+    async def submit(self, pdf_content, deadline=None) -> ExtractionResult:
+        """
+        Envía un PDF al pool y espera el resultado
+
+        Args:
+            pdf_content (bytes): Contenido del archivo PDF
+            deadline (Deadline, optional): Límite de tiempo de la solicitud; el
+                tiempo de espera en la cola también cuenta
+
+        Returns:
+            ExtractionResult: Resultado de la extracción
+
+        Raises:
+            ExtractionQueueFullError: Si la cola de extracción está llena
+        """
+        if self.saturated:
+            raise ExtractionQueueFullError(self.retry_after)
+
+        self.start()
+        pool = self._pool
+        loop = asyncio.get_running_loop()
+        self._pending += 1
+        metrics.set_gauge("scraper_extraction_pending", self._pending)
+        try:
+            if self._local_pipeline is not None:
+                # Copiar el contexto para que los logs del hilo conserven el process_id
+                context = contextvars.copy_context()
+                return await loop.run_in_executor(pool, context.run, self._local_pipeline.run, pdf_content, deadline)
+            result, worker_metrics = await loop.run_in_executor(
+                pool, _run_extraction, pdf_content, deadline, current_process_id()
+            )
+            metrics.replay(worker_metrics)
+            return result
+        except BrokenProcessPool:
+            # Un worker murió (p.ej. por memoria); recrear el pool para las siguientes tareas.
+            # Todas las tareas del pool roto fallan a la vez: solo la primera lo reinicia,
+            # las demás no deben detener (cancelando sus tareas) el pool nuevo
+            if self._pool is pool:
+                logger.error("Pool de extracción roto, reiniciando")
+                self.shutdown(wait=False)
+                self.start()
+            raise
+        finally:
+            self._pending -= 1
+            metrics.set_gauge("scraper_extraction_pending", self._pending)
@@ -0,0 +1,145 @@
+import logging
+from typing import Optional
+
+from app.models.response_models import ExtractionResult
+from app.services.pdf_processor import InvalidPDFError, PDFProcessor
+from app.services.data_extractor import DataExtractor
+from app.services.validator import INVALID, REOCR, FieldValidator
+from app.utils.deadline import Deadline
+from app.utils.metrics import increment_counter
+from app.utils import tracing
+
+logger = logging.getLogger(__name__)
+
+class ExtractionPipeline:
+    """Orquesta la extracción de texto y de datos fiscales de un PDF CSF"""
+    def __init__(self, pdf_processor: PDFProcessor, data_extractor: DataExtractor, early_exit=True,
+                 field_validator: Optional[FieldValidator] = None, field_template=None):
+        self.pdf_processor = pdf_processor
+        self.data_extractor = data_extractor
+        self.early_exit = early_exit
+        # Validación de campos (None = no se valida) y plantilla cuyas regiones
+        # se vuelven a leer cuando un campo de una página con OCR no es válido
+        self.field_validator = field_validator
+        self.field_template = field_template
+
+    def run(self, pdf_content, deadline: Optional[Deadline] = None):
+        """
+        Ejecuta la extracción completa de un PDF
+
+        Args:
+            pdf_content (bytes): Contenido del archivo PDF
+            deadline (Deadline, optional): Límite de tiempo de la solicitud
+
+        Returns:
+            ExtractionResult: Resultado de la extracción (parcial si venció el deadline)
+        """
+        deadline = deadline or Deadline()
+
+        # Tiempos por etapa de esta extracción (se devuelven con el resultado
+        # porque normalmente corre en otro proceso)
+        with tracing.trace() as current:
+            try:
+                csf_data, extracted_text = self._extract(pdf_content, deadline)
+            except InvalidPDFError as e:
+                # Un PDF dañado no es un error del servicio: se responde como "sin texto"
+                logger.warning("No se pudo abrir el PDF: %s", e)
+                csf_data, extracted_text = None, ""
+        timings = current.as_dict() if tracing.is_enabled() else {}
+
+        if not extracted_text or csf_data is None:
+            return ExtractionResult(text_found=False, timed_out=deadline.timed_out, timings=timings)
+
+        return ExtractionResult(text_found=True, data=csf_data, timed_out=deadline.timed_out, timings=timings)
+
+    def _extract(self, pdf_content, deadline):
+        """
+        Extrae texto y datos fiscales de un PDF
+
+        Returns:
+            tuple: (CSFData o None, texto extraído)
+        """
+        # Abrir el PDF una sola vez para todas las etapas
+        with self.pdf_processor.open_document(pdf_content) as pdf_document:
+            # Extraer página a página; con early_exit se detiene al tener los datos obligatorios.
+            # Las palabras con coordenadas solo se piden si hay extracción por posición
+            pages = self.pdf_processor.iter_pages(
+                pdf_document,
+                deadline,
+                with_words=self.data_extractor.layout_extractor is not None
+            )
+            ocr_pages = set()
+            try:
+                csf_data, text = self.data_extractor.extract_from_pages(
+                    self._track_ocr_pages(pages, ocr_pages),
+                    stop_when_complete=self.early_exit
+                )
+            finally:
+                pages.close()
+            
+            if csf_data is not None and self.field_validator is not None:
+                with tracing.span("validate"):
+                    self._validate_fields(pdf_document, csf_data, text, ocr_pages, deadline)
+            return csf_data, text
+    
+    def _track_ocr_pages(self, pages, ocr_pages):
+        """Entrega las páginas tal cual, anotando cuáles se leyeron con OCR"""
+        for page in pages:
+            if page.ocr:
+                ocr_pages.add(page.page_num)
+            yield page
+    
+    def _validate_fields(self, pdf_document, csf_data, text, ocr_pages, deadline):
+        """
+        Valida los campos extraídos y corrige los que leyó mal el OCR
+        
+        Primero se prueban las correcciones baratas de FieldValidator (solo si
+        hubo OCR: la capa de texto no tiene esos errores). Los campos que
+        siguen sin ser válidos y tienen región en la plantilla se vuelven a
+        leer con OCR solo en esa región, sin repetir la página completa.
+        
+        Args:
+            pdf_document (fitz.Document): Documento abierto
+            csf_data (CSFData): Datos extraídos (se actualizan)
+            text (str): Texto extraído
+            ocr_pages (set): Páginas leídas con OCR
+            deadline (Deadline): Límite de tiempo de la extracción
+        """
+        checks = self.field_validator.validate(csf_data, text, correct=bool(ocr_pages))
+        for field, check in checks.items():
+            if check.status == INVALID and self.field_template is not None:
+                reread = self._reocr_field(pdf_document, csf_data, field, ocr_pages, deadline)
+                if reread is not None:
+                    check = reread
+                    checks[field] = check
+            if check.status != INVALID:
+                setattr(csf_data, field, check.value)
+            else:
+                logger.info("Campo %s no válido (%s): %s", field, check.reason, check.value)
+            increment_counter("scraper_field_validation_total", {"field": field, "status": check.status})
+        
+        csf_data.validacion = {field: check.status for field, check in checks.items()}
+    
+    def _reocr_field(self, pdf_document, csf_data, field, ocr_pages, deadline):
+        """
+        Vuelve a leer un campo inválido en su región de la plantilla
+        
+        Returns:
+            FieldCheck: Resultado con estado REOCR, o None si ninguna lectura fue válida
+        """
+        for page_num in self.field_template.pages:
+            if page_num not in ocr_pages:
+                continue
+            readings = self.pdf_processor.ocr_field_region(
+                pdf_document, field, self.field_template, page_num, deadline
+            )
+            try:
+                for value, source in readings:
+                    check = self.field_validator.check(field, value, rfc=csf_data.rfc)
+                    if check.valid:
+                        check.status = REOCR
+                        csf_data.fuentes[field] = source
+                        return check
+            finally:
+                readings.close()
+        return None
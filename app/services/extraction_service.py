@@ -0,0 +1,170 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import time
+from typing import Optional
+
+from app.config import settings
+from app.models.response_models import ProcessingResponse
+from app.services.extraction_executor import ExtractionExecutor
+from app.services.page_preview import PagePreviewCache
+from app.services.result_cache import ResultCache
+from app.services.validator import DocumentClassifier
+from app.utils.deadline import Deadline
+from app.utils.metrics import increment_counter, observe_histogram
+from app.utils.mupdf import mupdf_executor
+from app.utils.tracing import current_trace, span
+from app.utils.upload import PDFUpload, UploadRejectedError
+
+logger = logging.getLogger(__name__)
+
+async def extract_upload(
+    upload: PDFUpload,
+    process_id: str,
+    executor: ExtractionExecutor,
+    result_cache: Optional[ResultCache],
+    deadline: Deadline,
+    start_time: float,
+    classifier: Optional[DocumentClassifier] = None,
+    preview_cache: Optional[PagePreviewCache] = None
+) -> ProcessingResponse:
+    """
+    Extrae los datos fiscales de un PDF ya leído y arma la respuesta
+
+    Consulta la caché de resultados y, si no estaba, clasifica el PDF (los
+    que claramente no son constancias se rechazan sin OCR) y lo envía al
+    pool de extracción; registra las métricas del resultado. Si hay datos
+    para confirmar, retiene el PDF para sus vistas previas. Lo usan la ruta
+    de un archivo, la de lotes y la cola de trabajos.
+
+    Args:
+        upload (PDFUpload): PDF validado
+        process_id (str): Identificador del procesamiento
+        executor (ExtractionExecutor): Pool de extracción
+        result_cache (ResultCache): Caché de resultados (None si está desactivada)
+        deadline (Deadline): Límite de tiempo del documento
+        start_time (float): Inicio del procesamiento (time.time())
+        classifier (DocumentClassifier): Clasificador previo (None si está desactivado)
+        preview_cache (PagePreviewCache): Vistas previas de páginas (None si están desactivadas)
+
+    Returns:
+        ProcessingResponse: Resultado del documento
+
+    Raises:
+        UploadRejectedError: Si el documento está dañado o no parece una Constancia de Situación Fiscal
+        ExtractionQueueFullError: Si la cola de extracción está llena
+    """
+    loop = asyncio.get_running_loop()
+
+    # Reutilizar el resultado si el mismo PDF ya se procesó
+    with span("cache_lookup"):
+        cache_key = result_cache.key_for(upload.sha256) if result_cache else None
+        result = result_cache.get_memory(cache_key) if result_cache else None
+        if result is None and result_cache:
+            if result_cache.disk_dir:
+                # El nivel en disco abre y decodifica un JSON: fuera del event loop
+                result = await loop.run_in_executor(None, result_cache.get_disk, cache_key)
+            else:
+                result = result_cache.get_disk(cache_key)
+
+    if result is None and classifier is not None:
+        # Descartar en milisegundos lo que no es una constancia, antes de ocupar el pool
+        with span("classify"):
+            # Copiar el contexto para que los logs del hilo conserven el process_id
+            classify = functools.partial(contextvars.copy_context().run, classifier.classify)
+            # En el hilo de MuPDF: PyMuPDF no es seguro entre hilos
+            classification = await loop.run_in_executor(mupdf_executor(), classify, upload.source, upload.sha256)
+        if classification.reason == "invalid_pdf":
+            raise UploadRejectedError(422, "El archivo PDF está dañado y no se puede abrir.", "invalid_pdf")
+        if not classification.is_csf:
+            logger.info("Documento rechazado por el clasificador (%s), señales: %s",
+                        classification.reason, classification.signals)
+            raise UploadRejectedError(
+                422,
+                "El documento no parece una Constancia de Situación Fiscal del SAT.",
+                "not_csf"
+            )
+
+    if result is None:
+        # Extraer texto y datos fiscales en el pool de extracción (fuera del event loop).
+        # "extraction" incluye la espera en la cola; el detalle por etapa viene del worker
+        with span("extraction"):
+            result = await executor.submit(upload.source, deadline)
+        request_trace = current_trace()
+        if request_trace is not None:
+            request_trace.merge(result.timings)
+
+        # Los resultados parciales por tiempo límite no se guardan
+        if result_cache and not result.timed_out:
+            result_cache.set_memory(cache_key, result)
+            if result_cache.disk_dir:
+                # Escritura atómica y barrido periódico del directorio: fuera del event loop
+                await loop.run_in_executor(None, result_cache.set_disk, cache_key, result)
+    else:
+        logger.info("Resultado obtenido de caché")
+
+    if result.timed_out:
+        logger.warning("Tiempo límite de %ss alcanzado", settings.PROCESS_TIMEOUT)
+        increment_counter("scraper_timeouts_total")
+
+    if not result.text_found:
+        logger.warning("No se pudo extraer texto del PDF")
+        increment_counter("scraper_errors_total", {"reason": "timeout" if result.timed_out else "no_text_extracted"})
+        message = "No se pudo extraer texto del PDF. Es posible que el archivo esté protegido o sea una imagen escaneada."
+        if result.timed_out:
+            message = "Se alcanzó el tiempo límite de procesamiento antes de extraer texto del PDF."
+        return ProcessingResponse(
+            success=False,
+            message=message,
+            process_id=process_id,
+            timed_out=result.timed_out
+        )
+
+    csf_data = result.data
+
+    # Registrar métricas de confianza
+    observe_histogram("scraper_confidence", csf_data.completo, {"field": "overall"})
+
+    # Verificar si se extrajeron datos mínimos (RFC, nombre)
+    if not csf_data.rfc and not csf_data.nombre:
+        logger.warning("No se identificaron datos fiscales")
+        increment_counter("scraper_errors_total", {"reason": "no_fiscal_data"})
+        return ProcessingResponse(
+            success=False,
+            message="No se pudieron identificar datos fiscales en el documento. Verifique que sea una Constancia de Situación Fiscal válida.",
+            process_id=process_id,
+            timed_out=result.timed_out
+        )
+
+    # Registrar éxito
+    process_time = time.time() - start_time
+    observe_histogram("scraper_process_time", process_time)
+    increment_counter("scraper_success_total")
+
+    logger.info("Datos extraídos exitosamente, tiempo: %.2fs", process_time)
+
+    message = "Datos extraídos correctamente. Por favor verifique y corrija si es necesario."
+    if result.timed_out:
+        message = "Se alcanzó el tiempo límite de procesamiento; los datos pueden estar incompletos. Por favor verifique y complete si es necesario."
+
+    # Retener el PDF para mostrar sus páginas junto a los datos a confirmar
+    document_hash = None
+    if preview_cache is not None:
+        if upload.path:
+            # El archivo temporal se lee fuera del event loop
+            retained = await loop.run_in_executor(None, preview_cache.add_document, upload.sha256, upload.path)
+        else:
+            retained = preview_cache.add_document(upload.sha256, upload.data)
+        document_hash = upload.sha256 if retained else None
+
+    # Devolver respuesta con datos extraídos para confirmación por el usuario
+    return ProcessingResponse(
+        success=True,
+        message=message,
+        process_id=process_id,
+        data=csf_data,
+        processing_time=process_time,
+        timed_out=result.timed_out,
+        document_hash=document_hash
+    )
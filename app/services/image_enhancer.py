@@ -0,0 +1,252 @@
+import logging
+
+import cv2
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Pasos disponibles, en el orden en que se aplican. Recortar primero reduce
+# los píxeles de todos los pasos siguientes; el enderezado interpola mejor
+# en escala de grises que sobre la imagen ya binarizada.
+ENHANCE_STEPS = ("crop_margins", "deskew", "contrast", "binarize", "despeckle")
+DEFAULT_ENHANCE_STEPS = ("crop_margins", "contrast")
+
+# Nivel de gris por debajo del cual un píxel se considera tinta
+INK_THRESHOLD = 160
+# Píxeles de margen que se conservan alrededor del contenido al recortar
+MARGIN_PADDING = 16
+# Fracción mínima de tinta de una fila o columna para considerarla contenido
+# (por debajo son motas de ruido del escaneo)
+MIN_INK_FRACTION = 0.01
+# Ángulos de inclinación (grados) que se corrigen; por debajo no vale la pena
+# rotar y por encima es más probable un error de estimación que un escaneo chueco
+MIN_SKEW_ANGLE = 0.3
+MAX_SKEW_ANGLE = 5.0
+# Lado máximo de la imagen reducida con que se estima la inclinación
+SKEW_ESTIMATE_SIZE = 800
+# Ángulos candidatos (grados) al estimar la inclinación: primero en pasos de
+# un grado y después en décimas alrededor del mejor
+COARSE_SKEW_ANGLES = np.arange(-MAX_SKEW_ANGLE, MAX_SKEW_ANGLE + 0.5, 1.0)
+FINE_SKEW_OFFSETS = np.round(np.arange(-0.5, 0.55, 0.1), 1)
+# Porcentaje de píxeles que se recorta en cada extremo del histograma (como ImageOps.autocontrast)
+CONTRAST_CUTOFF = 0.5
+
+def pixmap_to_array(pix):
+    """
+    Vista de NumPy sobre el buffer de un pixmap en escala de grises, sin copiarlo
+
+    La vista no mantiene vivo el pixmap: solo puede usarse mientras exista.
+
+    Args:
+        pix (fitz.Pixmap): Pixmap de un canal y sin alfa
+
+    Returns:
+        numpy.ndarray: Arreglo (alto, ancho) de uint8
+    """
+    if pix.n != 1:
+        raise ValueError(f"Se esperaba un pixmap en escala de grises, tiene {pix.n} canales")
+    pixels = np.frombuffer(pix.samples_mv, dtype=np.uint8).reshape(pix.height, pix.stride)
+    return pixels[:, :pix.width]
+
+class ImageEnhancer:
+    """
+    Preprocesamiento de imágenes de página para OCR con NumPy/OpenCV
+
+    Cada paso se activa por nombre (ver ENHANCE_STEPS) y trabaja sobre
+    arreglos en escala de grises; solo se crean arreglos nuevos en los pasos
+    que transforman píxeles.
+    """
+    def __init__(self, steps=DEFAULT_ENHANCE_STEPS, block_size=31, threshold_offset=15):
+        unknown = set(steps) - set(ENHANCE_STEPS)
+        if unknown:
+            logger.warning("Pasos de mejora de imagen desconocidos: %s", ", ".join(sorted(unknown)))
+        self.steps = [step for step in ENHANCE_STEPS if step in steps]
+        # Vecindad (impar, en píxeles) y desplazamiento de la binarización adaptativa
+        self.block_size = block_size | 1
+        self.threshold_offset = threshold_offset
+
+    def enhance_pixmap(self, pix):
+        """
+        Mejora un pixmap en escala de grises para OCR
+
+        Args:
+            pix (fitz.Pixmap): Pixmap de un canal y sin alfa
+
+        Returns:
+            PIL.Image: Imagen mejorada (modo "L"), independiente del pixmap
+        """
+        pixels = pixmap_to_array(pix)
+        enhanced = self.enhance_array(pixels)
+        # Si ningún paso creó un arreglo nuevo, copiar: la vista muere con el pixmap
+        if np.shares_memory(enhanced, pixels):
+            enhanced = enhanced.copy()
+        return Image.fromarray(np.ascontiguousarray(enhanced))
+
+    def enhance_array(self, gray):
+        """
+        Aplica los pasos activos a una imagen en escala de grises
+
+        Un paso que falla se omite y se continúa con los demás.
+
+        Args:
+            gray (numpy.ndarray): Arreglo (alto, ancho) de uint8
+
+        Returns:
+            numpy.ndarray: Imagen mejorada (puede ser una vista de gray)
+        """
+        for step in self.steps:
+            try:
+                gray = getattr(self, step)(gray)
+            except Exception as e:
+                logger.warning("Error en el paso %s de mejora de imagen: %s", step, e)
+        return gray
+
+    def crop_margins(self, gray):
+        """
+        Recorta los márgenes en blanco, dejando un pequeño borde
+
+        Args:
+            gray (numpy.ndarray): Imagen en escala de grises
+
+        Returns:
+            numpy.ndarray: Vista recortada (la misma imagen si no hay tinta)
+        """
+        ink = gray < INK_THRESHOLD
+        rows = np.flatnonzero(np.count_nonzero(ink, axis=1) > gray.shape[1] * MIN_INK_FRACTION)
+        if rows.size == 0:
+            return gray
+        band = ink[rows[0]:rows[-1] + 1]
+        columns = np.flatnonzero(np.count_nonzero(band, axis=0) > band.shape[0] * MIN_INK_FRACTION)
+        if columns.size == 0:
+            return gray
+
+        top = max(rows[0] - MARGIN_PADDING, 0)
+        bottom = min(rows[-1] + MARGIN_PADDING + 1, gray.shape[0])
+        left = max(columns[0] - MARGIN_PADDING, 0)
+        right = min(columns[-1] + MARGIN_PADDING + 1, gray.shape[1])
+        return gray[top:bottom, left:right]
+
+    def deskew(self, gray):
+        """
+        Endereza la imagen según la inclinación de las líneas de texto
+
+        Tesseract tolera inclinaciones pequeñas por sí mismo, por eso este
+        paso no está activo por defecto. Se rota con vecino más cercano: la
+        interpolación lineal difumina los bordes del texto y empeora el OCR.
+
+        Args:
+            gray (numpy.ndarray): Imagen en escala de grises
+
+        Returns:
+            numpy.ndarray: Imagen rotada, o la misma si no hace falta
+        """
+        angle = self.estimate_skew(gray)
+        if not MIN_SKEW_ANGLE <= abs(angle) <= MAX_SKEW_ANGLE:
+            return gray
+
+        height, width = gray.shape
+        rotation = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+        return cv2.warpAffine(
+            gray, rotation, (width, height),
+            flags=cv2.INTER_NEAREST, borderMode=cv2.BORDER_CONSTANT, borderValue=255
+        )
+
+    def estimate_skew(self, gray):
+        """
+        Estima la inclinación de las líneas de texto por perfil de proyección
+
+        Para cada ángulo candidato se proyectan los píxeles de tinta sobre el
+        eje vertical girado; con el ángulo correcto las líneas de texto caen
+        en pocas filas y la suma de cuadrados del perfil es máxima. Se
+        proyectan coordenadas (no se rota la imagen) sobre una copia reducida.
+
+        Args:
+            gray (numpy.ndarray): Imagen en escala de grises
+
+        Returns:
+            float: Ángulo en grados para cv2.getRotationMatrix2D, 0.0 si no hay tinta
+        """
+        factor = min(SKEW_ESTIMATE_SIZE / max(gray.shape), 1.0)
+        small = cv2.resize(gray, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA) if factor < 1.0 else gray
+        ys, xs = np.nonzero(small < INK_THRESHOLD)
+        if ys.size < 10:
+            return 0.0
+
+        ys = ys.astype(np.float32)
+        xs = xs.astype(np.float32)
+        angle = self._best_projection(ys, xs, COARSE_SKEW_ANGLES)
+        return self._best_projection(ys, xs, angle + FINE_SKEW_OFFSETS)
+
+    def _best_projection(self, ys, xs, angles):
+        """
+        Devuelve el ángulo cuyo perfil de proyección está más concentrado
+
+        Args:
+            ys (numpy.ndarray): Filas de los píxeles de tinta
+            xs (numpy.ndarray): Columnas de los píxeles de tinta
+            angles (numpy.ndarray): Ángulos candidatos en grados
+
+        Returns:
+            float: Mejor ángulo
+        """
+        best_angle, best_score = 0.0, -1
+        for angle in angles:
+            radians = np.deg2rad(angle)
+            rows = np.rint(ys * np.cos(radians) - xs * np.sin(radians)).astype(np.int64)
+            profile = np.bincount(rows - rows.min())
+            score = int(np.dot(profile, profile))
+            if score > best_score:
+                best_angle, best_score = float(angle), score
+        return round(best_angle, 1)
+
+    def contrast(self, gray):
+        """
+        Estira el histograma descartando CONTRAST_CUTOFF % en cada extremo
+
+        Args:
+            gray (numpy.ndarray): Imagen en escala de grises
+
+        Returns:
+            numpy.ndarray: Imagen con el contraste ajustado
+        """
+        histogram = cv2.calcHist([gray], [0], None, [256], [0, 256]).ravel()
+        cumulative = np.cumsum(histogram)
+        cutoff = cumulative[-1] * CONTRAST_CUTOFF / 100
+        low = int(np.searchsorted(cumulative, cutoff, side="right"))
+        high = int(np.searchsorted(cumulative, cumulative[-1] - cutoff, side="left"))
+        if high <= low:
+            return gray
+
+        levels = np.arange(256, dtype=np.float32)
+        table = np.clip((levels - low) * (255.0 / (high - low)), 0, 255).astype(np.uint8)
+        return cv2.LUT(gray, table)
+
+    def binarize(self, gray):
+        """
+        Binariza con un umbral adaptativo por vecindad
+
+        A diferencia de un umbral global, tolera sombras e iluminación
+        irregular de escaneos y fotos.
+
+        Args:
+            gray (numpy.ndarray): Imagen en escala de grises
+
+        Returns:
+            numpy.ndarray: Imagen en blanco (255) y negro (0)
+        """
+        return cv2.adaptiveThreshold(
+            gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY, self.block_size, self.threshold_offset
+        )
+
+    def despeckle(self, gray):
+        """
+        Elimina puntos aislados (ruido de escaneo) con un filtro de mediana 3x3
+
+        Args:
+            gray (numpy.ndarray): Imagen en escala de grises o binarizada
+
+        Returns:
+            numpy.ndarray: Imagen filtrada
+        """
+        return cv2.medianBlur(gray, 3)
@@ -0,0 +1,299 @@
+import asyncio
+import ipaddress
+import itertools
+import logging
+import socket
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime
+from typing import Optional
+from urllib.parse import urlparse
+
+from app.config import settings
+from app.models.response_models import JobStatus, ProcessingResponse
+from app.services.extraction_executor import ExtractionExecutor, ExtractionQueueFullError
+from app.services.extraction_service import extract_upload
+from app.services.job_store import JobStore
+from app.services.page_preview import PagePreviewCache
+from app.services.result_cache import ResultCache
+from app.services.validator import DocumentClassifier
+from app.utils.deadline import Deadline
+from app.utils.logging_config import log_context
+from app.utils.metrics import increment_counter, set_gauge
+from app.utils.upload import PDFUpload, UploadRejectedError
+
+logger = logging.getLogger(__name__)
+
+class JobQueueFullError(Exception):
+    """Se lanza cuando la cola de trabajos asíncronos está llena"""
+    def __init__(self, retry_after):
+        super().__init__("La cola de trabajos está llena")
+        self.retry_after = retry_after
+
+class InvalidCallbackError(Exception):
+    """Se lanza cuando la URL de callback no está permitida"""
+
+class _NoRedirectHandler(urllib.request.HTTPRedirectHandler):
+    """No sigue redirecciones: el destino final no pasaría por la validación del host"""
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+_webhook_opener = urllib.request.build_opener(_NoRedirectHandler)
+
+def _is_public_address(address):
+    """Indica si una IP es pública (no loopback, privada, link-local, reservada ni multicast)"""
+    ip = ipaddress.ip_address(address)
+    if ip.version == 6 and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+def _check_public_host(hostname):
+    """
+    Resuelve un host y verifica que todas sus direcciones sean públicas
+
+    Raises:
+        InvalidCallbackError: Si el host no resuelve o alguna dirección no es pública
+    """
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(hostname, None)}
+    except socket.gaierror as e:
+        raise InvalidCallbackError(f"No se pudo resolver el host {hostname}: {e}")
+    if not all(_is_public_address(address.split("%")[0]) for address in addresses):
+        raise InvalidCallbackError(f"El host {hostname} resuelve a una dirección no pública.")
+
+class JobQueue:
+    """
+    Cola de trabajos asíncronos con prioridad y concurrencia acotada
+
+    Cada trabajo es un PDF ya leído y validado. Un número fijo de tareas del
+    event loop toma los trabajos en orden de prioridad (menor primero y, a
+    igual prioridad, por orden de llegada) y los envía al pool de extracción.
+    El estado se guarda en un JobStore y, si se indicó, se notifica el
+    resultado por webhook.
+    """
+    def __init__(self, store: JobStore, executor: ExtractionExecutor, result_cache: Optional[ResultCache],
+                 classifier: Optional[DocumentClassifier] = None, preview_cache: Optional[PagePreviewCache] = None, concurrency=2, max_queued=100, retry_after=5, webhook_timeout=10, webhook_allowed_hosts=None):
+        self.store = store
+        self.executor = executor
+        self.result_cache = result_cache
+        self.classifier = classifier
+        self.preview_cache = preview_cache
+        self.concurrency = max(concurrency, 1)
+        self.max_queued = max_queued
+        self.retry_after = retry_after
+        self.webhook_timeout = webhook_timeout
+        self.webhook_allowed_hosts = set(webhook_allowed_hosts or [])
+        self._queue = None
+        self._workers = []
+        self._sequence = itertools.count()
+
+    @property
+    def queued(self):
+        """Número de trabajos en espera"""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def start(self):
+        """Crea las tareas que procesan la cola (requiere un event loop en ejecución)"""
+        if self._workers:
+            return
+        self._queue = asyncio.PriorityQueue()
+        self._workers = [
+            asyncio.get_running_loop().create_task(self._worker())
+            for _ in range(self.concurrency)
+        ]
+        logger.info("Cola de trabajos asíncronos iniciada con %s tareas", self.concurrency)
+
+    async def stop(self):
+        """Detiene las tareas y marca como fallidos los trabajos en curso y los que seguían en espera"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+        while self._queue is not None and not self._queue.empty():
+            _, _, job = self._queue.get_nowait()
+            job["upload"].cleanup()
+            await self._finish(job, status_code=503, response=ProcessingResponse(
+                success=False,
+                message="El servicio se detuvo antes de procesar el documento.",
+                process_id=job["status"].process_id
+            ))
+
+    def validate_callback(self, callback_url, resolve=False):
+        """
+        Verifica que la URL de callback sea http(s) y de un host permitido
+
+        Con JOB_WEBHOOK_ALLOWED_HOSTS solo se admiten esos hosts. Sin lista,
+        se admite cualquier host público: las IP literales se verifican
+        aquí y, con resolve, también las direcciones a las que resuelve el
+        nombre (al enviar, fuera del event loop, para cubrir cambios de DNS).
+
+        Args:
+            callback_url (str): URL del webhook
+            resolve (bool): Resolver el host y verificar sus direcciones
+
+        Raises:
+            InvalidCallbackError: Si la URL no es válida o no está permitida
+        """
+        parsed = urlparse(callback_url)
+        if parsed.scheme not in ("http", "https") or not parsed.hostname:
+            raise InvalidCallbackError("La URL de callback debe ser http o https.")
+        if self.webhook_allowed_hosts:
+            if parsed.hostname not in self.webhook_allowed_hosts:
+                raise InvalidCallbackError(f"El host {parsed.hostname} no está permitido para callbacks.")
+            return
+
+        try:
+            is_public = _is_public_address(parsed.hostname)
+        except ValueError:
+            # Es un nombre, no una IP
+            if resolve:
+                _check_public_host(parsed.hostname)
+            return
+        if not is_public:
+            raise InvalidCallbackError(f"La dirección {parsed.hostname} no está permitida para callbacks.")
+
+    async def submit(self, process_id, upload: PDFUpload, priority=5, callback_url=None) -> JobStatus:
+        """
+        Encola un PDF para procesarlo en segundo plano
+
+        La cola toma posesión de upload y lo limpia al terminar.
+
+        Args:
+            process_id (str): Identificador del proceso
+            upload (PDFUpload): PDF validado
+            priority (int): Prioridad (0 = más urgente)
+            callback_url (str, optional): URL que recibe el JobStatus final por POST
+
+        Returns:
+            JobStatus: Estado inicial del trabajo
+
+        Raises:
+            JobQueueFullError: Si la cola está llena
+            InvalidCallbackError: Si la URL de callback no está permitida
+        """
+        if callback_url:
+            self.validate_callback(callback_url)
+        if self.queued >= self.max_queued:
+            raise JobQueueFullError(self.retry_after)
+
+        self.start()
+        status = JobStatus(process_id=process_id, status="queued", priority=priority)
+        # Guardado antes de encolar: el estado "processing" no puede llegar primero
+        await self.store.put_async(status)
+        job = {"status": status, "upload": upload, "callback_url": callback_url}
+        self._queue.put_nowait((priority, next(self._sequence), job))
+        set_gauge("scraper_jobs_queued", self.queued)
+        return status
+
+    async def _worker(self):
+        """Procesa trabajos de la cola indefinidamente"""
+        while True:
+            _, _, job = await self._queue.get()
+            set_gauge("scraper_jobs_queued", self.queued)
+            try:
+                with log_context(job["status"].process_id):
+                    await self._run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Error inesperado en trabajo %s: %s", job["status"].process_id, e, exc_info=True)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job):
+        """Ejecuta la extracción de un trabajo y guarda su resultado"""
+        status = job["status"]
+        upload = job["upload"]
+        process_id = status.process_id
+        status_code = 200
+
+        start_time = time.time()
+        try:
+            await self.store.put_async(status.copy(update={"status": "processing", "updated_at": datetime.now()}))
+            while True:
+                # El tiempo límite cuenta desde que el documento entra al pool de extracción
+                deadline = Deadline(settings.PROCESS_TIMEOUT)
+                try:
+                    response = await extract_upload(
+                        upload, process_id, self.executor, self.result_cache, deadline, start_time, self.classifier,
+                        self.preview_cache
+                    )
+                    break
+                except ExtractionQueueFullError as e:
+                    # Compartimos el pool con las solicitudes síncronas; esperar a que se libere
+                    await asyncio.sleep(min(e.retry_after, 1))
+        except asyncio.CancelledError:
+            # stop() canceló la tarea a mitad del documento: dejar un estado final para
+            # quien consulta /jobs/{id} (sin webhook, el servicio se está deteniendo)
+            await self._finish(job, status_code=503, response=ProcessingResponse(
+                success=False,
+                message="El servicio se detuvo antes de terminar de procesar el documento.",
+                process_id=process_id
+            ))
+            raise
+        except UploadRejectedError as e:
+            logger.warning("Documento rechazado (%s) en trabajo", e.reason)
+            increment_counter("scraper_errors_total", {"reason": e.reason})
+            status_code = e.status_code
+            response = ProcessingResponse(success=False, message=e.message, process_id=process_id)
+        except Exception as e:
+            logger.error("Error al procesar trabajo: %s", e, exc_info=True)
+            increment_counter("scraper_errors_total", {"reason": "processing_error"})
+            status_code = 500
+            response = ProcessingResponse(
+                success=False,
+                message=f"Error al procesar el documento: {str(e)}",
+                process_id=process_id
+            )
+        finally:
+            upload.cleanup()
+
+        final_status = await self._finish(job, status_code, response)
+        if job["callback_url"]:
+            await self._notify(job["callback_url"], final_status)
+
+    async def _finish(self, job, status_code, response):
+        """Guarda el estado final del trabajo"""
+        final_status = job["status"].copy(update={
+            "status": "completed" if status_code == 200 else "failed",
+            "updated_at": datetime.now(),
+            "result": response
+        })
+        await self.store.put_async(final_status)
+        increment_counter("scraper_jobs_total", {"status": final_status.status})
+        return final_status
+
+    async def _notify(self, callback_url, status: JobStatus):
+        """Envía el estado final al webhook sin bloquear el event loop"""
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, self._post_json, callback_url, status.json())
+            logger.info("Webhook notificado")
+        except Exception as e:
+            increment_counter("scraper_errors_total", {"reason": "webhook_failed"})
+            logger.warning("No se pudo notificar el webhook: %s", e)
+
+    def _post_json(self, url, body):
+        """POST de un JSON con reintentos simples, sin seguir redirecciones"""
+        self.validate_callback(url, resolve=True)
+        request = urllib.request.Request(
+            url,
+            data=body.encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST"
+        )
+        for attempt in range(3):
+            try:
+                with _webhook_opener.open(request, timeout=self.webhook_timeout) as response:
+                    return response.status
+            except urllib.error.HTTPError as e:
+                # Una redirección no se sigue ni se reintenta
+                if 300 <= e.code < 400 or attempt == 2:
+                    raise
+                time.sleep(2 ** attempt)
+            except Exception:
+                if attempt == 2:
+                    raise
+                time.sleep(2 ** attempt)
@@ -0,0 +1,170 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from app.models.response_models import JobStatus
+
+logger = logging.getLogger(__name__)
+
+class JobStore(ABC):
+    """
+    Almacén de estados de trabajos asíncronos
+
+    Las implementaciones guardan cada JobStatus durante ttl segundos desde su
+    última actualización; después deja de estar disponible. Desde el event
+    loop se usan put_async/get_async: las implementaciones que hacen I/O las
+    ejecutan fuera del loop.
+    """
+    @abstractmethod
+    def put(self, job: JobStatus) -> None:
+        """
+        Guarda (o reemplaza) el estado de un trabajo
+
+        Args:
+            job (JobStatus): Estado del trabajo
+        """
+
+    @abstractmethod
+    def get(self, process_id) -> Optional[JobStatus]:
+        """
+        Obtiene el estado de un trabajo
+
+        Args:
+            process_id (str): Identificador del proceso
+
+        Returns:
+            JobStatus: Estado del trabajo o None si no existe o expiró
+        """
+
+    async def put_async(self, job: JobStatus) -> None:
+        """put para el event loop; por defecto en línea (sin I/O)"""
+        self.put(job)
+
+    async def get_async(self, process_id) -> Optional[JobStatus]:
+        """get para el event loop; por defecto en línea (sin I/O)"""
+        return self.get(process_id)
+
+    def close(self) -> None:
+        """Libera los recursos del almacén"""
+        pass
+
+class InMemoryJobStore(JobStore):
+    """
+    Almacén en memoria del proceso con expiración por TTL
+
+    Las entradas se mantienen ordenadas por última actualización, así que
+    las expiradas se eliminan desde el principio en cada escritura. También
+    se limita el número de trabajos guardados.
+    """
+    def __init__(self, ttl=3600, max_jobs=10000):
+        self.ttl = ttl
+        self.max_jobs = max_jobs
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, job: JobStatus) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._jobs[job.process_id] = (now + self.ttl, job)
+            self._jobs.move_to_end(job.process_id)
+            self._evict(now)
+
+    def get(self, process_id) -> Optional[JobStatus]:
+        with self._lock:
+            entry = self._jobs.get(process_id)
+            if entry is None:
+                return None
+            expires_at, job = entry
+            if time.monotonic() >= expires_at:
+                del self._jobs[process_id]
+                return None
+            return job
+
+    def _evict(self, now):
+        """Elimina las entradas expiradas y las más antiguas si se supera max_jobs"""
+        while self._jobs:
+            expires_at, _ = next(iter(self._jobs.values()))
+            if expires_at > now and len(self._jobs) <= self.max_jobs:
+                break
+            self._jobs.popitem(last=False)
+
+class SQLiteJobStore(JobStore):
+    """
+    Almacén en SQLite local, compartido por los procesos de la misma máquina
+
+    Sustituto sencillo de un backend externo (Redis, base de datos): los
+    estados sobreviven a reinicios del servicio. Desde el event loop las
+    consultas se ejecutan en un hilo propio: uno solo, así las escrituras
+    de un trabajo se aplican en el orden en que se pidieron.
+    """
+    def __init__(self, path, ttl=3600):
+        self.path = path
+        self.ttl = ttl
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "process_id TEXT PRIMARY KEY, expires_at REAL NOT NULL, data TEXT NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS jobs_expires_at ON jobs (expires_at)")
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-store")
+
+    def put(self, job: JobStatus) -> None:
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO jobs (process_id, expires_at, data) VALUES (?, ?, ?)",
+                (job.process_id, now + self.ttl, job.json())
+            )
+            self._connection.execute("DELETE FROM jobs WHERE expires_at <= ?", (now,))
+
+    def get(self, process_id) -> Optional[JobStatus]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT data FROM jobs WHERE process_id = ? AND expires_at > ?",
+                (process_id, time.time())
+            ).fetchone()
+        if row is None:
+            return None
+        return JobStatus.parse_obj(json.loads(row[0]))
+
+    async def put_async(self, job: JobStatus) -> None:
+        await asyncio.get_running_loop().run_in_executor(self._executor, self.put, job)
+
+    async def get_async(self, process_id) -> Optional[JobStatus]:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self.get, process_id)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            self._connection.close()
+
+def create_job_store(backend="memory", ttl=3600, path=None) -> JobStore:
+    """
+    Crea el almacén de trabajos configurado
+
+    Args:
+        backend (str): "memory" o "sqlite"
+        ttl (int): Segundos que se conserva cada estado
+        path (str): Archivo de la base de datos (solo sqlite)
+
+    Returns:
+        JobStore: Almacén de trabajos
+    """
+    if backend == "sqlite":
+        return SQLiteJobStore(path, ttl=ttl)
+    if backend != "memory":
+        logger.warning("Almacén de trabajos desconocido: %s, se usará memoria", backend)
+    return InMemoryJobStore(ttl=ttl)
@@ -0,0 +1,275 @@
+import logging
+import re
+import unicodedata
+
+from app.models.response_models import FieldSource
+
+logger = logging.getLogger(__name__)
+
+# Etiquetas de la plantilla del SAT (normalizadas: sin acentos, minúsculas y
+# sin los dos puntos finales) y el campo parcial al que corresponde su valor.
+# Las etiquetas con None no se extraen, pero delimitan el valor anterior.
+CSF_LABELS = {
+    "rfc": "rfc",
+    "curp": None,
+    "nombre (s)": "nombres",
+    "nombre(s)": "nombres",
+    "primer apellido": "primer_apellido",
+    "segundo apellido": "segundo_apellido",
+    "denominacion/razon social": "razon_social",
+    "regimen capital": None,
+    "nombre comercial": "nombre_comercial",
+    "fecha inicio de operaciones": None,
+    "estatus en el padron": None,
+    "fecha de ultimo cambio de estado": None,
+    "codigo postal": "codigo_postal",
+    "tipo de vialidad": "tipo_vialidad",
+    "nombre de vialidad": "vialidad",
+    "numero exterior": "numero_exterior",
+    "numero interior": "numero_interior",
+    "nombre de la colonia": "colonia",
+    "nombre de la localidad": "localidad",
+    "nombre del municipio o demarcacion territorial": "municipio",
+    "nombre de la entidad federativa": "entidad",
+    "entre calle": None,
+    "y calle": None,
+}
+MAX_LABEL_WORDS = max(len(label.split()) for label in CSF_LABELS)
+
+# Formato esperado de los campos que tienen uno
+FIELD_FORMATS = {
+    "rfc": re.compile(r"^[A-Z&Ñ]{3,4}\d{6}[A-Z0-9]{3}$"),
+    "codigo_postal": re.compile(r"^\d{5}$"),
+}
+REGIMEN_CODE_PATTERN = re.compile(r"\b(\d{3})\b")
+
+# Confianza según dónde estaba el valor respecto a su etiqueta
+SAME_ROW_CONFIDENCE = 0.95
+ROW_BELOW_CONFIDENCE = 0.75
+TABLE_CONFIDENCE = 0.85
+
+def normalize_label(text):
+    """
+    Normaliza una etiqueta para compararla con CSF_LABELS
+
+    Args:
+        text (str): Texto de la etiqueta
+
+    Returns:
+        str: Texto sin acentos, en minúsculas y con espacios simples
+    """
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(text.lower().split()).rstrip(":").strip()
+
+class Word:
+    """Palabra de la página con su caja en puntos"""
+    __slots__ = ("x0", "y0", "x1", "y1", "text")
+
+    def __init__(self, x0, y0, x1, y1, text):
+        self.x0 = x0
+        self.y0 = y0
+        self.x1 = x1
+        self.y1 = y1
+        self.text = text
+
+class LayoutExtractor:
+    """
+    Extrae campos de la CSF emparejando etiquetas y valores por su posición
+
+    Trabaja sobre las palabras de page.get_text("words") de las páginas con
+    capa de texto: agrupa las palabras en renglones por su coordenada
+    vertical, localiza las etiquetas conocidas de la plantilla del SAT y toma
+    como valor las palabras a su derecha hasta la siguiente etiqueta (o el
+    renglón inferior si a la derecha no hay nada). Devuelve cada campo con su
+    confianza y la caja que ocupa en la página.
+    """
+
+    def extract_from_words(self, words, page_num):
+        """
+        Extrae los campos de una página
+
+        Args:
+            words (list): Tuplas (x0, y0, x1, y1, texto, bloque, línea, palabra)
+            page_num (int): Número de página (desde 0)
+
+        Returns:
+            dict: Campo de CSFData -> (valor, FieldSource)
+        """
+        rows = self._build_rows(words)
+        parts = {}
+
+        for row_index, row in enumerate(rows):
+            labels = self._find_labels(row)
+            for label_index, (start, end, key) in enumerate(labels):
+                if key is None or key in parts:
+                    continue
+
+                value_end = labels[label_index + 1][0] if label_index + 1 < len(labels) else len(row)
+                value_words = row[end:value_end]
+                confidence = SAME_ROW_CONFIDENCE
+
+                if not value_words:
+                    value_words = self._value_below(rows, row_index, row[start], row, labels, label_index)
+                    confidence = ROW_BELOW_CONFIDENCE
+
+                value = " ".join(word.text for word in value_words).strip()
+                if not value:
+                    continue
+
+                value_format = FIELD_FORMATS.get(key)
+                if value_format and not value_format.match(value.replace(" ", "")):
+                    continue
+
+                parts[key] = (value, confidence, value_words)
+
+        regimen = self._find_regimen(rows)
+        if regimen:
+            parts["regimen_fiscal"] = regimen
+
+        fields = self._assemble_fields(parts, page_num)
+        if fields and logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Campos encontrados por posición en la página %s: %s", page_num, ", ".join(fields))
+        return fields
+
+    def _build_rows(self, words):
+        """
+        Agrupa las palabras en renglones visuales ordenados de arriba abajo
+
+        Separa además las palabras pegadas a su etiqueta (p.ej. "Postal:06600"),
+        repartiendo la caja en proporción a los caracteres.
+        """
+        split_words = []
+        for x0, y0, x1, y1, text, *_ in words:
+            colon = text.find(":")
+            if 0 < colon < len(text) - 1:
+                cut = x0 + (x1 - x0) * (colon + 1) / len(text)
+                split_words.append(Word(x0, y0, cut, y1, text[:colon + 1]))
+                split_words.append(Word(cut, y0, x1, y1, text[colon + 1:]))
+            else:
+                split_words.append(Word(x0, y0, x1, y1, text))
+
+        split_words.sort(key=lambda word: ((word.y0 + word.y1) / 2, word.x0))
+
+        rows = []
+        row_center = None
+        for word in split_words:
+            center = (word.y0 + word.y1) / 2
+            tolerance = (word.y1 - word.y0) / 2
+            if row_center is None or center - row_center > tolerance:
+                rows.append([])
+                row_center = center
+            rows[-1].append(word)
+
+        for row in rows:
+            row.sort(key=lambda word: word.x0)
+        return rows
+
+    def _find_labels(self, row):
+        """
+        Localiza las etiquetas conocidas de un renglón
+
+        Returns:
+            list: (índice inicial, índice final exclusivo, campo) por etiqueta
+        """
+        labels = []
+        index = 0
+        while index < len(row):
+            found = None
+            for size in range(min(MAX_LABEL_WORDS, len(row) - index), 0, -1):
+                last = row[index + size - 1].text
+                if not last.endswith(":"):
+                    continue
+                label = normalize_label(" ".join(word.text for word in row[index:index + size]))
+                if label in CSF_LABELS:
+                    found = (index, index + size, CSF_LABELS[label])
+                    break
+
+            if found:
+                labels.append(found)
+                index = found[1]
+            else:
+                index += 1
+        return labels
+
+    def _value_below(self, rows, row_index, label_word, row, labels, label_index):
+        """
+        Toma el valor del renglón inferior, en la columna de la etiqueta
+
+        Solo se usa si el renglón inferior no empieza con otra etiqueta en esa
+        columna (en cuyo caso el valor de la etiqueta está vacío).
+        """
+        if row_index + 1 >= len(rows):
+            return []
+
+        below = rows[row_index + 1]
+        right_limit = row[labels[label_index + 1][0]].x0 if label_index + 1 < len(labels) else float("inf")
+        column = [word for word in below if word.x0 >= label_word.x0 - 2 and word.x1 <= right_limit]
+
+        if not column or self._find_labels(column):
+            return []
+        return column
+
+    def _find_regimen(self, rows):
+        """
+        Busca el primer régimen en la tabla "Regímenes" (columnas Régimen / Fecha Inicio)
+
+        Returns:
+            tuple: (código, confianza, palabras) o None
+        """
+        for row_index, row in enumerate(rows[:-1]):
+            texts = [normalize_label(word.text) for word in row]
+            if "regimen" not in texts or "fecha" not in texts:
+                continue
+
+            fecha_x0 = row[texts.index("fecha")].x0
+            regimen_words = [word for word in rows[row_index + 1] if word.x1 <= fecha_x0]
+            match = REGIMEN_CODE_PATTERN.search(" ".join(word.text for word in regimen_words))
+            if match:
+                return match.group(1), TABLE_CONFIDENCE, regimen_words
+        return None
+
+    def _assemble_fields(self, parts, page_num):
+        """
+        Combina los valores parciales en los campos de CSFData
+
+        Los campos compuestos (nombre de persona física, domicilio) toman la
+        menor confianza de sus partes y la caja que las contiene a todas.
+        """
+        fields = {}
+
+        def add(field, keys, separator=" "):
+            present = [parts[key] for key in keys if key in parts]
+            if not present:
+                return
+            value = separator.join(part[0] for part in present)
+            confidence = min(part[1] for part in present)
+            words = [word for part in present for word in part[2]]
+            fields[field] = (value, FieldSource(
+                metodo="layout",
+                confianza=confidence,
+                pagina=page_num,
+                bbox=[
+                    round(min(word.x0 for word in words), 2),
+                    round(min(word.y0 for word in words), 2),
+                    round(max(word.x1 for word in words), 2),
+                    round(max(word.y1 for word in words), 2),
+                ]
+            ))
+
+        add("rfc", ["rfc"])
+        add("codigo_postal", ["codigo_postal"])
+        add("regimen_fiscal", ["regimen_fiscal"])
+
+        if "razon_social" in parts:
+            add("nombre", ["razon_social"])
+        elif "nombres" in parts:
+            add("nombre", ["nombres", "primer_apellido", "segundo_apellido"])
+        else:
+            add("nombre", ["nombre_comercial"])
+
+        calle = [key for key in ("tipo_vialidad", "vialidad", "numero_exterior", "numero_interior") if key in parts]
+        if calle:
+            add("domicilio", calle + [key for key in ("colonia", "localidad", "municipio", "entidad") if key in parts])
+
+        return fields
@@ -0,0 +1,140 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from app.utils.metrics import increment_counter
+from app.utils.mupdf import render_page_image
+
+logger = logging.getLogger(__name__)
+
+# Formatos de vista previa admitidos y su tipo MIME
+PREVIEW_MEDIA_TYPES = {
+    "jpeg": "image/jpeg",
+    "webp": "image/webp",
+}
+
+class DocumentNotAvailableError(Exception):
+    """Se lanza cuando el PDF ya no está retenido (expiró, fue expulsado o se procesó en otra instancia)"""
+
+class PageNotFoundError(Exception):
+    """Se lanza cuando el documento no tiene la página pedida"""
+
+class PagePreviewCache:
+    """
+    Vistas previas de páginas de los documentos procesados recientemente
+
+    Conserva los PDF de las últimas extracciones (LRU con límite de bytes y
+    TTL, direccionados por su SHA-256) y renderiza una página solo cuando se
+    pide, al ancho de miniatura. Las imágenes generadas se guardan en un LRU
+    por (documento, página, ancho, formato) con el mismo TTL, así que volver
+    a mostrar la misma página no vuelve a pasar por MuPDF.
+    """
+    def __init__(self, max_document_bytes=64 * 1024 * 1024, max_entries=256, ttl=3600, quality=75):
+        self.max_document_bytes = max_document_bytes
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.quality = quality
+        self._documents = OrderedDict()
+        self._document_bytes = 0
+        self._renders = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add_document(self, content_sha256, pdf_content) -> bool:
+        """
+        Retiene un PDF para generar sus vistas previas después
+
+        Los documentos más grandes que el límite total no se retienen.
+
+        Args:
+            content_sha256 (str): SHA-256 hexadecimal de los bytes del PDF
+            pdf_content (bytes | bytearray | str): Contenido del PDF, o ruta
+                de un archivo temporal (se lee aquí: el archivo se borra al
+                terminar la solicitud)
+
+        Returns:
+            bool: True si el PDF quedó retenido
+        """
+        if isinstance(pdf_content, str):
+            with open(pdf_content, "rb") as f:
+                pdf_content = f.read()
+
+        size = len(pdf_content)
+        if size > self.max_document_bytes:
+            logger.debug("PDF de %s bytes demasiado grande para retener su vista previa", size)
+            return False
+
+        with self._lock:
+            previous = self._documents.pop(content_sha256, None)
+            if previous is not None:
+                self._document_bytes -= len(previous[1])
+            self._documents[content_sha256] = (time.monotonic() + self.ttl, pdf_content)
+            self._document_bytes += size
+            while self._document_bytes > self.max_document_bytes:
+                _, (_, evicted) = self._documents.popitem(last=False)
+                self._document_bytes -= len(evicted)
+        return True
+
+    def render(self, content_sha256, page_num, width, image_format="jpeg") -> bytes:
+        """
+        Devuelve la vista previa de una página, renderizándola si no está en caché
+
+        Args:
+            content_sha256 (str): SHA-256 del PDF
+            page_num (int): Página desde 0
+            width (int): Ancho de la imagen en píxeles
+            image_format (str): jpeg o webp
+
+        Returns:
+            bytes: Imagen codificada
+
+        Raises:
+            DocumentNotAvailableError: Si el PDF ya no está retenido
+            PageNotFoundError: Si el documento no tiene esa página
+        """
+        key = (content_sha256, page_num, width, image_format)
+        with self._lock:
+            entry = self._renders.get(key)
+            if entry is not None:
+                expires_at, image = entry
+                if time.monotonic() < expires_at:
+                    self._renders.move_to_end(key)
+                    increment_counter("scraper_preview_total", {"result": "hit"})
+                    return image
+                del self._renders[key]
+
+        pdf_content = self._get_document(content_sha256)
+        if pdf_content is None:
+            increment_counter("scraper_preview_total", {"result": "not_available"})
+            raise DocumentNotAvailableError(content_sha256)
+
+        # PyMuPDF se carga con la primera vista previa, no al arrancar la API
+        import fitz  # PyMuPDF
+
+        # Solo se abre y rasteriza la página pedida
+        with fitz.open(stream=pdf_content, filetype="pdf") as pdf_document:
+            if not 0 <= page_num < len(pdf_document):
+                raise PageNotFoundError(page_num)
+            image = render_page_image(pdf_document[page_num], width, image_format, self.quality)
+
+        increment_counter("scraper_preview_total", {"result": "miss"})
+        with self._lock:
+            self._renders[key] = (time.monotonic() + self.ttl, image)
+            self._renders.move_to_end(key)
+            while len(self._renders) > self.max_entries:
+                self._renders.popitem(last=False)
+        return image
+
+    def _get_document(self, content_sha256):
+        """Devuelve el PDF retenido, o None si no existe o expiró"""
+        with self._lock:
+            entry = self._documents.get(content_sha256)
+            if entry is None:
+                return None
+            expires_at, pdf_content = entry
+            if time.monotonic() >= expires_at:
+                del self._documents[content_sha256]
+                self._document_bytes -= len(pdf_content)
+                return None
+            self._documents.move_to_end(content_sha256)
+            return pdf_content
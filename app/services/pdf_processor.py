@@ -1,187 +1,866 @@
-import io
 import logging
 import fitz  # PyMuPDF
 import numpy as np
-from PIL import Image
-import pytesseract
 import tempfile
 import os
+import threading
+from abc import ABC, abstractmethod
+from collections import deque
+from contextvars import copy_context
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from app.models.response_models import FieldSource
+from app.services.csf_template import WHITESPACE_PATTERN
+from app.services.image_enhancer import ImageEnhancer
+from app.services.qr_decoder import QRDecoder, parse_sat_qr, sat_qr_fields
+from app.utils.metrics import increment_counter
+from app.utils.mupdf import PDF_PROCESSOR_VERSION, render_page_image
+from app.utils.tracing import span
+
+try:
+    # Se importa aquí y no al crear el motor: la importación instala un
+    # manejador de señales y solo funciona en el hilo principal
+    import tesserocr
+except ImportError:  # libtesseract en proceso es opcional
+    tesserocr = None
 
 logger = logging.getLogger(__name__)
 
+class InvalidPDFError(Exception):
+    """Se lanza cuando MuPDF no puede abrir el PDF (archivo dañado o truncado)"""
+
+class OCRBackend(ABC):
+    """Interfaz común de los motores de OCR usados por PDFProcessor"""
+    name = "base"
+    
+    @abstractmethod
+    def image_to_string(self, image, timeout=None):
+        """
+        Reconoce el texto de una imagen con la segmentación automática
+        
+        Args:
+            image (PIL.Image): Imagen en escala de grises o RGB
+            timeout (float, optional): Segundos máximos para el reconocimiento
+            
+        Returns:
+            str: Texto reconocido
+        """
+    
+    def recognize(self, image, timeout=None, psm=None, whitelist=None):
+        """
+        Reconoce el texto de una imagen junto con la confianza de Tesseract
+        
+        Args:
+            image (PIL.Image): Imagen en escala de grises o RGB
+            timeout (float, optional): Segundos máximos para el reconocimiento
+            psm (int, optional): Modo de segmentación de página de Tesseract
+            whitelist (str, optional): Únicos caracteres que puede reconocer
+            
+        Returns:
+            tuple: (texto, confianza media de las palabras entre 0 y 100, o None)
+        """
+        return self.image_to_string(image, timeout=timeout), None
+    
+    def check(self):
+        """
+        Verifica que el motor pueda reconocer (binario o modelo disponibles)
+        
+        Raises:
+            Exception: Si el motor no está disponible
+        """
+        pass
+    
+    def close(self):
+        """Libera los recursos del motor"""
+        pass
+
+class PytesseractBackend(OCRBackend):
+    """
+    Motor basado en pytesseract: lanza un proceso de tesseract por imagen
+    
+    Es el motor de respaldo; admite timeout porque puede matar el subproceso.
+    """
+    name = "pytesseract"
+    
+    def __init__(self, lang="spa"):
+        # Importación diferida: el proceso principal (y las herramientas) no la necesitan
+        import pytesseract
+        
+        self.pytesseract = pytesseract
+        self.lang = lang
+    
+    def image_to_string(self, image, timeout=None):
+        return self.pytesseract.image_to_string(image, lang=self.lang, timeout=timeout or 0)
+    
+    def recognize(self, image, timeout=None, psm=None, whitelist=None):
+        config = []
+        if psm is not None:
+            config.append(f"--psm {psm}")
+        if whitelist:
+            config.append(f"-c tessedit_char_whitelist={whitelist}")
+        
+        # Una sola ejecución de tesseract: el texto se rearma por líneas a partir de las palabras
+        data = self.pytesseract.image_to_data(
+            image, lang=self.lang, config=" ".join(config), timeout=timeout or 0,
+            output_type=self.pytesseract.Output.DICT
+        )
+        lines = {}
+        confidences = []
+        for index, word in enumerate(data["text"]):
+            if not word.strip():
+                continue
+            key = (data["block_num"][index], data["par_num"][index], data["line_num"][index])
+            lines.setdefault(key, []).append(word)
+            confidence = float(data["conf"][index])
+            if confidence >= 0:
+                confidences.append(confidence)
+        
+        text = "\n".join(" ".join(words) for words in lines.values())
+        confidence = sum(confidences) / len(confidences) if confidences else None
+        return text, confidence
+    
+    def check(self):
+        self.pytesseract.get_tesseract_version()
+        missing = set(self.lang.split("+")) - set(self.pytesseract.get_languages())
+        if missing:
+            raise RuntimeError(f"Idioma de Tesseract no instalado: {', '.join(sorted(missing))}")
+
+class TesserocrBackend(OCRBackend):
+    """
+    Motor libtesseract en proceso mediante tesserocr
+    
+    Mantiene una instancia de PyTessBaseAPI por hilo con el modelo ya cargado
+    y le entrega el buffer de píxeles directamente, sin archivo temporal ni
+    proceso nuevo por página. El timeout se pasa a Tesseract, que cancela el
+    reconocimiento al vencer (el análisis de diseño previo no se interrumpe).
+    """
+    name = "tesserocr"
+    
+    def __init__(self, lang="spa", tessdata_path=""):
+        if tesserocr is None:
+            raise ImportError("tesserocr no está instalado")
+        self.lang = lang
+        self.tessdata_path = tessdata_path
+        self._local = threading.local()
+        self._apis = []
+        self._lock = threading.Lock()
+    
+    def _get_api(self):
+        """Devuelve la instancia de PyTessBaseAPI del hilo actual"""
+        api = getattr(self._local, "api", None)
+        if api is None:
+            kwargs = {"lang": self.lang}
+            if self.tessdata_path:
+                kwargs["path"] = self.tessdata_path
+            api = tesserocr.PyTessBaseAPI(**kwargs)
+            self._local.api = api
+            with self._lock:
+                self._apis.append(api)
+        return api
+    
+    def image_to_string(self, image, timeout=None):
+        return self.recognize(image, timeout=timeout)[0]
+    
+    def recognize(self, image, timeout=None, psm=None, whitelist=None):
+        api = self._get_api()
+        previous_psm = api.GetPageSegMode()
+        if psm is not None:
+            api.SetPageSegMode(psm)
+        if whitelist:
+            api.SetVariable("tessedit_char_whitelist", whitelist)
+        try:
+            bytes_per_pixel = len(image.getbands())
+            api.SetImageBytes(image.tobytes(), image.width, image.height, bytes_per_pixel, image.width * bytes_per_pixel)
+            recognized = api.Recognize(timeout=max(int(timeout * 1000), 1)) if timeout else api.Recognize()
+            if not recognized:
+                # Mismo tipo de error que el timeout de pytesseract
+                raise RuntimeError("Tesseract process timeout" if timeout else "Tesseract no pudo reconocer la imagen")
+            # GetUTF8Text reutiliza el reconocimiento anterior
+            text = api.GetUTF8Text()
+            return text, float(api.MeanTextConf())
+        finally:
+            # La instancia se reutiliza en el hilo: dejarla con la configuración por defecto
+            api.SetPageSegMode(previous_psm)
+            if whitelist:
+                api.SetVariable("tessedit_char_whitelist", "")
+    
+    def check(self):
+        # Carga el modelo del idioma en la instancia del hilo (falla si no existe)
+        self._get_api()
+    
+    def close(self):
+        with self._lock:
+            for api in self._apis:
+                api.End()
+            self._apis = []
+
+def create_ocr_backend(name="auto", lang="spa", tessdata_path=""):
+    """
+    Crea el motor de OCR configurado
+    
+    Args:
+        name (str): "auto", "tesserocr" o "pytesseract". "auto" usa tesserocr
+            si está instalado y puede cargar el idioma
+        lang (str): Idioma de Tesseract
+        tessdata_path (str): Ruta de los traineddata (opcional)
+        
+    Returns:
+        OCRBackend: Motor de OCR
+    """
+    if name in ("auto", "tesserocr"):
+        try:
+            backend = TesserocrBackend(lang=lang, tessdata_path=tessdata_path)
+            # Cargar el modelo ahora: sin el traineddata fallaría cada página
+            backend.check()
+            return backend
+        except Exception as e:
+            logger.warning("No se pudo iniciar tesserocr (%s), se usará pytesseract: %s", name, e)
+    elif name != "pytesseract":
+        logger.warning("Motor de OCR desconocido: %s, se usará pytesseract", name)
+    
+    return PytesseractBackend(lang=lang)
+
+class PageContent:
+    """Contenido obtenido de una página del PDF"""
+    __slots__ = ("page_num", "text", "words", "ocr", "confidence", "fields")
+    
+    def __init__(self, page_num, text, words=None, ocr=False, confidence=None, fields=None):
+        self.page_num = page_num
+        self.text = text
+        # Tuplas (x0, y0, x1, y1, palabra, bloque, línea, n) de la capa de texto
+        self.words = words
+        self.ocr = ocr
+        # Confianza media del OCR (0-100); None para la capa de texto
+        self.confidence = confidence
+        # Campos obtenidos sin texto (p.ej. del QR): campo -> (valor, FieldSource)
+        self.fields = fields or {}
+
 class PDFProcessor:
     """Clase para procesar archivos PDF y extraer texto"""
-    def __init__(self, ocr_dpi=300, tessdata_lang="spa", tessdata_path="", temp_dir="/tmp"):
+    
+    # Invalida la caché de resultados; se incrementa en app/utils/mupdf.py
+    VERSION = PDF_PROCESSOR_VERSION
+    
+    # Páginas en que se busca el QR de la constancia (la cédula está en la primera)
+    QR_PAGES = (0,)
+    
+    def __init__(self, ocr_dpi=300, tessdata_lang="spa", tessdata_path="", temp_dir="/tmp", ocr_workers=1,
+                 ocr_backend="auto", min_page_text_chars=50, max_pages=50, ocr_low_dpi=0, ocr_min_confidence=70,
+                 ocr_template=None, image_enhancer=None, qr_fast_path=True, reocr_dpi=400):
         self.ocr_dpi = ocr_dpi
+        # Resolución del último intento al volver a leer la región de un campo inválido
+        self.reocr_dpi = reocr_dpi
+        # Primera pasada de OCR a baja resolución; solo se repite a ocr_dpi si
+        # la confianza o el texto obtenido no alcanzan (0 = una sola pasada)
+        self.ocr_low_dpi = ocr_low_dpi if 0 < ocr_low_dpi < ocr_dpi else 0
+        self.ocr_min_confidence = ocr_min_confidence
+        # Plantilla de la CSF (CSFTemplate): en sus páginas solo se aplica OCR a
+        # las regiones de interés y la página completa queda como respaldo
+        self.ocr_template = ocr_template
+        self.image_enhancer = image_enhancer or ImageEnhancer()
+        self.qr_decoder = QRDecoder()
+        # En las páginas sin capa de texto, leer RFC e idCIF del QR antes del OCR
+        self.qr_fast_path = qr_fast_path
         self.tessdata_lang = tessdata_lang
         self.tessdata_path = tessdata_path
         self.temp_dir = temp_dir
+        self.ocr_workers = max(ocr_workers, 1)
+        self.min_page_text_chars = min_page_text_chars
+        self.max_pages = max_pages
+        self._ocr_pool = None
         
         # Configurar Tesseract
         if self.tessdata_path:
-            import os
             os.environ["TESSDATA_PREFIX"] = self.tessdata_path
+        
+        # Motor de OCR de larga duración (uno por proceso worker)
+        self.ocr_backend = create_ocr_backend(ocr_backend, self.tessdata_lang, self.tessdata_path)
+        logger.info("Motor de OCR: %s", self.ocr_backend.name)
+        
+        # Con OCR paralelo por página, evitar que cada tesseract abra además
+        # sus propios hilos OpenMP y sobresuscriba los núcleos
+        if self.ocr_workers > 1:
+            os.environ.setdefault("OMP_THREAD_LIMIT", "1")
             
-    def extract_text(self, pdf_content):
+    @contextmanager
+    def open_document(self, pdf_content):
         """
-        Extrae todo el texto de un archivo PDF usando múltiples métodos
+        Abre un PDF una sola vez para todas las etapas de extracción
+        
+        El documento se cierra al salir del bloque, aunque ocurra un error,
+        para no acumular memoria de MuPDF entre solicitudes.
+        
+        Args:
+            pdf_content (bytes | bytearray | str): Contenido del archivo PDF, o
+                ruta de un archivo temporal (MuPDF lo lee desde disco)
+            
+        Yields:
+            fitz.Document: Documento abierto
+            
+        Raises:
+            InvalidPDFError: Si el archivo tiene encabezado PDF pero está dañado
+        """
+        with span("open_document"):
+            try:
+                if isinstance(pdf_content, str):
+                    pdf_document = fitz.open(pdf_content, filetype="pdf")
+                else:
+                    pdf_document = fitz.open(stream=pdf_content, filetype="pdf")
+            except RuntimeError as e:
+                # fitz.FileDataError ("cannot open broken document") y similares
+                raise InvalidPDFError(str(e)) from e
+        try:
+            yield pdf_document
+        finally:
+            pdf_document.close()
+    
+    def extract_text(self, pdf_content, deadline=None):
+        """
+        Extrae todo el texto de un archivo PDF
         
         Args:
             pdf_content (bytes): Contenido del archivo PDF en formato de bytes
+            deadline (Deadline, optional): Límite de tiempo; si vence, se detiene
+                el procesamiento de páginas y se devuelve el texto parcial
             
         Returns:
             str: Texto extraído del PDF
         """
         try:
-            # Método 1: Usar PyMuPDF para extraer texto directamente
-            text_from_pdf = self._extract_text_with_pymupdf(pdf_content)
+            with self.open_document(pdf_content) as pdf_document:
+                return self.extract_document_text(pdf_document, deadline)
+                
+        except Exception as e:
+            logger.error("Error al extraer texto del PDF: %s", e)
+            raise
+    
+    def extract_document_text(self, pdf_document, deadline=None):
+        """
+        Extrae el texto de un documento ya abierto, decidiendo por página
+        
+        Las páginas con capa de texto la usan directamente; solo las páginas
+        que son imagen (menos de min_page_text_chars caracteres) pasan por OCR.
+        
+        Args:
+            pdf_document (fitz.Document): Documento abierto con open_document
+            deadline (Deadline, optional): Límite de tiempo de la extracción
             
-            # Si PyMuPDF extrajo suficiente texto, usarlo
-            if text_from_pdf and len(text_from_pdf) > 100:
-                logger.info(f"Texto extraído con PyMuPDF: {len(text_from_pdf)} caracteres")
-                return text_from_pdf
+        Returns:
+            str: Texto extraído del PDF
+        """
+        page_texts = list(self.iter_page_texts(pdf_document, deadline))
+        text = "\n".join(page_text for page_text in page_texts if page_text)
+        
+        if not text.strip():
+            logger.warning("No se pudo extraer texto del PDF")
+            return ""
+        
+        logger.info("Texto extraído: %s caracteres de %s páginas", len(text), len(page_texts))
+        return text
+    
+    def iter_page_texts(self, pdf_document, deadline=None):
+        """
+        Genera el texto de cada página, en orden, conforme se obtiene
+        
+        Args:
+            pdf_document (fitz.Document): Documento abierto con open_document
+            deadline (Deadline, optional): Límite de tiempo de la extracción
             
-            # Método 2: Renderizar páginas como imágenes y usar OCR
-            text_from_ocr = self._extract_text_with_ocr(pdf_content)
+        Yields:
+            str: Texto de la página (cadena vacía si no se obtuvo texto)
+        """
+        for page_content in self.iter_pages(pdf_document, deadline):
+            yield page_content.text
+    
+    def iter_pages(self, pdf_document, deadline=None, with_words=False):
+        """
+        Genera el contenido de cada página, en orden, conforme se obtiene
+        
+        Cada página usa su capa de texto o, si es imagen, OCR. Las páginas se
+        procesan de forma perezosa: si quien consume deja de iterar (p.ej.
+        porque ya tiene todos los campos), las páginas restantes no se
+        renderizan ni se envían a OCR. Con más de un worker de OCR se
+        adelantan hasta ocr_workers páginas: se renderizan en este hilo
+        (PyMuPDF no es seguro entre hilos) y el OCR corre en el pool. Al
+        cerrar el generador se cancelan los OCR adelantados que no iniciaron.
+        
+        Args:
+            pdf_document (fitz.Document): Documento abierto con open_document
+            deadline (Deadline, optional): Límite de tiempo de la extracción
+            with_words (bool): Incluir las palabras con coordenadas de las
+                páginas con capa de texto (para la extracción por posición)
             
-            # Si el OCR extrajo texto, usarlo
-            if text_from_ocr:
-                logger.info(f"Texto extraído con OCR: {len(text_from_ocr)} caracteres")
-                return text_from_ocr
+        Yields:
+            PageContent: Contenido de la página
+        """
+        lookahead = self.ocr_workers if self.ocr_workers > 1 else 0
+        # (contenido, Future del OCR o None) de las páginas aún no entregadas
+        pending = deque()
+        
+        page_count = len(pdf_document)
+        if page_count > self.max_pages:
+            logger.warning("El documento tiene %s páginas, solo se procesan %s", page_count, self.max_pages)
+            page_count = self.max_pages
+        
+        try:
+            for page_num in range(page_count):
+                if self._deadline_reached(deadline, page_num):
+                    break
+                
+                pending.append(self._process_page(pdf_document[page_num], page_num, deadline, lookahead > 0, with_words))
+                
+                # Entregar las páginas listas; las de OCR paralelo esperan a llenar la ventana
+                while pending and (pending[0][1] is None or len(pending) > lookahead):
+                    yield self._resolve_page(pending.popleft(), deadline)
+                
+                if deadline and deadline.timed_out:
+                    break
             
-            # Si PyMuPDF extrajo algo, aunque sea poco, es mejor que nada
-            if text_from_pdf:
-                return text_from_pdf
+            while pending:
+                yield self._resolve_page(pending.popleft(), deadline)
+                
+        finally:
+            for _, pending_ocr in pending:
+                if pending_ocr is not None:
+                    pending_ocr[0].cancel()
+    
+    def _process_page(self, page, page_num, deadline, parallel, with_words=False):
+        """
+        Obtiene el texto de una página o lanza su OCR en el pool
+        
+        Args:
+            page (fitz.Page): Página del documento
+            page_num (int): Número de página
+            deadline (Deadline): Límite de tiempo de la extracción
+            parallel (bool): Si el OCR se envía al pool de hilos
+            with_words (bool): Incluir las palabras de la capa de texto
             
-            logger.warning("No se pudo extraer texto del PDF")
-            return ""
+        Returns:
+            tuple: (PageContent, (Future del OCR, página, si es OCR por regiones) o None)
+        """
+        layer_text, words = self._get_page_text_layer(page, page_num, with_words)
+        if len(layer_text.strip()) >= self.min_page_text_chars:
+            increment_counter("scraper_pages_total", {"source": "text"})
+            return PageContent(page_num, layer_text, words), None
+        
+        increment_counter("scraper_pages_total", {"source": "ocr"})
+        page_content = PageContent(page_num, layer_text, ocr=True)
+        
+        # Antes del OCR, RFC e idCIF del QR de la constancia (sin OCR ni red)
+        qr = self._read_qr(page, page_num)
+        page_content.fields = sat_qr_fields(qr)
+        
+        # Con plantilla, solo las regiones de interés que falten; si no aplica, la página completa
+        crops = self._render_template_regions(page, page_num, qr, page_content.fields)
+        from_roi = crops is not None
+        if from_roi:
+            ocr_function, ocr_input = self._ocr_regions, crops
+        else:
+            try:
+                ocr_function, ocr_input = self._ocr_image, self._render_page_for_ocr(page, self.ocr_low_dpi or self.ocr_dpi)
+            except Exception as e:
+                logger.warning("Error al procesar página %s para OCR: %s", page_num, e)
+                return page_content, None
+        
+        if parallel:
+            # Copiar el contexto para que el OCR del hilo cuente en la traza de la solicitud
+            future = self._get_ocr_pool().submit(copy_context().run, ocr_function, ocr_input, page_num, deadline)
+            return page_content, (future, page, from_roi)
+        
+        self._apply_ocr(page_content, page, ocr_function(ocr_input, page_num, deadline), deadline, from_roi)
+        return page_content, None
+    
+    def _resolve_page(self, item, deadline):
+        """
+        Espera el OCR pendiente de una página, si lo hay
+        
+        Args:
+            item (tuple): (PageContent, (Future del OCR, página, si es OCR por regiones) o None)
+            deadline (Deadline): Límite de tiempo de la extracción
             
-        except Exception as e:
-            logger.error(f"Error al extraer texto del PDF: {str(e)}")
-            raise
+        Returns:
+            PageContent: Contenido de la página
+        """
+        page_content, pending_ocr = item
+        if pending_ocr is None:
+            return page_content
+        
+        future, page, from_roi = pending_ocr
+        if deadline and deadline.timed_out:
+            future.cancel()
+        result = None if future.cancelled() else future.result()
+        # El respaldo o la segunda pasada, si hacen falta, renderizan en este
+        # hilo (PyMuPDF no es seguro entre hilos)
+        self._apply_ocr(page_content, page, result, deadline, from_roi)
+        return page_content
     
-    def _extract_text_with_pymupdf(self, pdf_content):
+    def _apply_ocr(self, page_content, page, result, deadline, from_roi=False):
         """
-        Extrae texto usando PyMuPDF directamente
+        Guarda el OCR de una página, repitiéndolo a ocr_dpi si no es suficiente
+        
+        La primera pasada a ocr_low_dpi basta para escaneos limpios. Si su
+        confianza media es menor que ocr_min_confidence o el texto es muy
+        corto, se vuelve a renderizar la página a ocr_dpi y se conserva el
+        resultado con mayor confianza. Si el OCR por regiones de la plantilla
+        no fue válido, antes se aplica OCR a la página completa.
         
         Args:
-            pdf_content (bytes): Contenido del PDF
+            page_content (PageContent): Contenido de la página (con la capa de texto)
+            page (fitz.Page): Página del documento
+            result (tuple): (texto, confianza) de la primera pasada o None
+            deadline (Deadline): Límite de tiempo de la extracción
+            from_roi (bool): Si result viene del OCR por regiones
+        """
+        if from_roi:
+            increment_counter("scraper_roi_pages_total", {"result": "ok" if result else "fallback"})
+            if result:
+                page_content.text, page_content.confidence = result
+                return
+            if deadline and deadline.timed_out:
+                return
+            try:
+                img = self._render_page_for_ocr(page, self.ocr_low_dpi or self.ocr_dpi)
+                result = self._ocr_image(img, page_content.page_num, deadline)
+            except Exception as e:
+                logger.warning("Error al procesar página %s para OCR: %s", page_content.page_num, e)
+        
+        if self._needs_second_pass(result) and not (deadline and deadline.timed_out):
+            logger.info(
+                "OCR de página %s insuficiente a %s DPI (confianza %s), repitiendo a %s DPI",
+                page_content.page_num, self.ocr_low_dpi, result[1] if result else None, self.ocr_dpi
+            )
+            increment_counter("scraper_ocr_second_pass_total")
+            try:
+                img = self._render_page_for_ocr(page, self.ocr_dpi)
+                second = self._ocr_image(img, page_content.page_num, deadline)
+                if second and (not result or not result[0].strip() or (second[1] or 0) >= (result[1] or 0)):
+                    result = second
+            except Exception as e:
+                logger.warning("Error al procesar página %s para OCR: %s", page_content.page_num, e)
+        
+        # Si el OCR no devuelve nada, la poca capa de texto es mejor que nada
+        if result and result[0]:
+            page_content.text, page_content.confidence = result
+    
+    def _needs_second_pass(self, result):
+        """
+        Indica si el OCR de la primera pasada debe repetirse a ocr_dpi
+        
+        Args:
+            result (tuple): (texto, confianza) de la primera pasada o None
             
         Returns:
-            str: Texto extraído
+            bool: True si hubo primera pasada a baja resolución y no alcanzó
         """
-        try:
-            # Crear documento PDF desde bytes
-            pdf_document = fitz.open(stream=pdf_content, filetype="pdf")
-            text = ""
+        if not self.ocr_low_dpi:
+            return False
+        if not result or len(result[0].strip()) < self.min_page_text_chars:
+            return True
+        confidence = result[1]
+        return confidence is not None and confidence < self.ocr_min_confidence
+    
+    def _get_page_text_layer(self, page, page_num, with_words=False):
+        """
+        Obtiene la capa de texto de una página
+        
+        Con with_words, el texto y las palabras salen del mismo TextPage para
+        no analizar la página dos veces.
+        
+        Args:
+            page (fitz.Page): Página del documento
+            page_num (int): Número de página (para logs)
+            with_words (bool): Incluir las palabras con coordenadas
             
-            # Extraer texto de cada página
-            for page_num in range(len(pdf_document)):
-                page = pdf_document[page_num]
-                text += page.get_text("text")
+        Returns:
+            tuple: (texto o cadena vacía si no tiene, lista de palabras o None)
+        """
+        try:
+            with span("text_layer"):
+                if not with_words:
+                    return page.get_text("text"), None
+                
+                textpage = page.get_textpage()
+                return page.get_text("text", textpage=textpage), page.get_text("words", textpage=textpage)
+        except Exception as e:
+            logger.warning("Error al extraer texto con PyMuPDF de la página %s: %s", page_num, e)
+            return "", None
+    
+    def _get_ocr_pool(self):
+        """
+        Devuelve el pool de hilos para OCR paralelo, creándolo la primera vez
+        
+        Returns:
+            ThreadPoolExecutor: Pool con ocr_workers hilos
+        """
+        if self._ocr_pool is None:
+            self._ocr_pool = ThreadPoolExecutor(max_workers=self.ocr_workers, thread_name_prefix="ocr")
+        return self._ocr_pool
+    
+    def _read_qr(self, page, page_num):
+        """
+        Busca el QR de la constancia en una página que irá a OCR
+        
+        Args:
+            page (fitz.Page): Página del documento
+            page_num (int): Número de página
             
-            return text
+        Returns:
+            QRCode: QR encontrado o None (también si no aplica el atajo)
+        """
+        if not self.qr_fast_path or page_num not in self.QR_PAGES:
+            return None
+        
+        qr = self.qr_decoder.find(page, page_num)
+        if qr is None:
+            increment_counter("scraper_qr_total", {"result": "not_found"})
+        elif parse_sat_qr(qr.text) is None:
+            increment_counter("scraper_qr_total", {"result": "unreadable"})
+        else:
+            increment_counter("scraper_qr_total", {"result": "decoded"})
+        return qr
+    
+    def _render_template_regions(self, page, page_num, qr=None, skip_regions=()):
+        """
+        Renderiza las regiones de interés de la plantilla en una página
+        
+        Args:
+            page (fitz.Page): Página del documento
+            page_num (int): Número de página
+            qr (QRCode, optional): QR de la página, si ya se buscó
+            skip_regions (iterable): Regiones que no hace falta leer
             
+        Returns:
+            list: Tuplas (Region, PIL.Image) o None si la plantilla no aplica
+        """
+        template = self.ocr_template
+        width, height = page.rect.width, page.rect.height
+        if template is None or not template.applies_to(page_num, width, height):
+            return None
+        
+        try:
+            with span("roi_locate"):
+                transform = self._locate_template(page, template, qr)
+            return [
+                (region, self._render_page_for_ocr(page, region.dpi or self.ocr_dpi, clip=fitz.Rect(box)))
+                for region, box in template.locate(width, height, transform)
+                if region.name not in skip_regions
+            ]
         except Exception as e:
-            logger.warning(f"Error al extraer texto con PyMuPDF: {str(e)}")
-            return ""
+            logger.warning("Error al ubicar la plantilla en la página %s: %s", page_num, e)
+            return None
     
-    def _extract_text_with_ocr(self, pdf_content):
+    def _locate_template(self, page, template, qr=None):
         """
-        Extrae texto usando OCR después de renderizar páginas como imágenes
+        Ubica la plantilla en la página por un ancla de texto o por el QR
+        
+        Las anclas solo existen si la página conserva algo de capa de texto;
+        en un escaneo puro se usa la posición del QR.
         
         Args:
-            pdf_content (bytes): Contenido del PDF
+            page (fitz.Page): Página del documento
+            template (CSFTemplate): Plantilla a ubicar
+            qr (QRCode, optional): QR de la página; si no se da, se busca
             
         Returns:
-            str: Texto extraído con OCR
+            tuple: (escala, dx, dy) o None para usar la posición nominal
         """
-        try:
-            # Crear documento PDF desde bytes
-            pdf_document = fitz.open(stream=pdf_content, filetype="pdf")
-            all_text = ""
-            
-            # Procesar cada página
-            for page_num in range(len(pdf_document)):
-                try:
-                    page = pdf_document[page_num]
-                    
-                    # Renderizar página como imagen con alta resolución para OCR
-                    # 300 DPI es bueno para OCR
-                    pix = page.get_pixmap(matrix=fitz.Matrix(300/72, 300/72))
-                    
-                    # Convertir a imagen PIL
-                    img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-                    
-                    # Aplicar mejoras para OCR
-                    img = self._enhance_image_for_ocr(img)
-                    
-                    # Usar Tesseract para OCR (con configuración para español)
-                    text = pytesseract.image_to_string(img, lang='spa')
-                    all_text += text + "\n\n"
-                    
-                except Exception as e:
-                    logger.warning(f"Error al procesar página {page_num} para OCR: {str(e)}")
-                    continue
-            
-            return all_text
+        width, height = page.rect.width, page.rect.height
+        for anchor in template.anchors:
+            hits = page.search_for(anchor.text)
+            if hits:
+                return template.transform_from_anchor(anchor, hits[0].x0, hits[0].y0, width, height)
+        
+        if template.qr_box is not None:
+            qr = qr or self.qr_decoder.find(page)
+            if qr is not None:
+                return template.transform_from_qr(qr.rect, width, height)
+        return None
+    
+    def _render_page_for_ocr(self, page, dpi=None, clip=None):
+        """
+        Renderiza una página (o parte de ella) como imagen preparada para OCR
+        
+        Args:
+            page (fitz.Page): Página a renderizar
+            dpi (int, optional): Resolución del render (por defecto ocr_dpi)
+            clip (fitz.Rect, optional): Zona de la página a renderizar
             
-        except Exception as e:
-            logger.warning(f"Error al extraer texto con OCR: {str(e)}")
-            return ""
+        Returns:
+            PIL.Image: Imagen mejorada para OCR
+        """
+        dpi = dpi or self.ocr_dpi
+        with span("render"):
+            # Renderizar directamente en escala de grises: un tercio de los bytes
+            # que en RGB y sin conversión posterior en PIL
+            pix = page.get_pixmap(matrix=fitz.Matrix(dpi / 72, dpi / 72), clip=clip, colorspace=fitz.csGRAY, alpha=False)
+        
+        # Aplicar mejoras para OCR sobre el buffer del pixmap, sin copiarlo a PIL antes
+        with span("enhance"):
+            return self.image_enhancer.enhance_pixmap(pix)
     
-    def _enhance_image_for_ocr(self, image):
+    def _ocr_regions(self, crops, page_num, deadline=None):
         """
-        Mejora la imagen para OCR
+        Aplica OCR a las regiones de la plantilla con la configuración de cada una
         
         Args:
-            image (PIL.Image): Imagen a mejorar
+            crops (list): Tuplas (Region, PIL.Image) de _render_template_regions
+            page_num (int): Número de página (para logs)
+            deadline (Deadline, optional): Límite de tiempo de la extracción
             
         Returns:
-            PIL.Image: Imagen mejorada
+            tuple: (texto con una región por línea, confianza media) o None si
+                alguna región no se leyó o no tiene el formato esperado
+        """
+        lines = []
+        confidences = []
+        for region, img in crops:
+            result = self._ocr_image(img, page_num, deadline, psm=region.psm, whitelist=region.whitelist)
+            value = region.read(result[0]) if result else None
+            if value is None:
+                logger.info("Región %s de la página %s no válida, se aplicará OCR a la página completa", region.name, page_num)
+                return None
+            
+            lines.append(f"{region.label} {value}" if region.label else value)
+            if result[1] is not None:
+                confidences.append(result[1])
+        
+        return "\n".join(lines), sum(confidences) / len(confidences) if confidences else None
+    
+    def ocr_field_region(self, pdf_document, field, template, page_num=0, deadline=None):
         """
+        Vuelve a aplicar OCR solo a la región de un campo de la plantilla
+        
+        Se intenta con la configuración estricta de la región (modo de
+        segmentación y lista de caracteres) a su resolución, a ocr_dpi y a
+        reocr_dpi, de menor a mayor costo. El llamador valida cada lectura y
+        deja de consumir el generador con la primera válida.
+        
+        Args:
+            pdf_document (fitz.Document): Documento abierto con open_document
+            field (str): Nombre de la región (campo de CSFData)
+            template (CSFTemplate): Plantilla con la región
+            page_num (int): Página en que se busca la región
+            deadline (Deadline, optional): Límite de tiempo de la extracción
+            
+        Yields:
+            tuple: (texto sin espacios, FieldSource) de cada lectura no vacía
+        """
+        if page_num >= pdf_document.page_count:
+            return
+        page = pdf_document[page_num]
+        width, height = page.rect.width, page.rect.height
+        if not template.applies_to(page_num, width, height):
+            return
+        
         try:
-            # Convertir a escala de grises para mejor OCR
-            img_gray = image.convert('L')
+            transform = self._locate_template(page, template)
+        except Exception as e:
+            logger.warning("Error al ubicar la plantilla en la página %s: %s", page_num, e)
+            transform = None
+        located = [(region, box) for region, box in template.locate(width, height, transform) if region.name == field]
+        if not located:
+            return
+        region, box = located[0]
+        
+        dpis = []
+        for dpi in (region.dpi or self.ocr_dpi, self.ocr_dpi, self.reocr_dpi):
+            if dpi and dpi not in dpis:
+                dpis.append(dpi)
+        
+        for dpi in dpis:
+            if deadline and deadline.timed_out:
+                return
+            try:
+                img = self._render_page_for_ocr(page, dpi, clip=fitz.Rect(box))
+            except Exception as e:
+                logger.warning("Error al renderizar la región %s de la página %s: %s", field, page_num, e)
+                return
+            result = self._ocr_image(img, page_num, deadline, psm=region.psm, whitelist=region.whitelist)
+            text = WHITESPACE_PATTERN.sub("", result[0]) if result else ""
+            if text:
+                confidence = result[1] / 100 if result[1] is not None else 0.0
+                yield text, FieldSource(metodo="reocr", confianza=round(confidence, 2), pagina=page_num, bbox=[round(v, 2) for v in box])
+    
+    def _ocr_image(self, img, page_num, deadline=None, psm=None, whitelist=None):
+        """
+        Aplica OCR a la imagen de una página
+        
+        Args:
+            img (PIL.Image): Imagen de la página
+            page_num (int): Número de página (para logs)
+            deadline (Deadline, optional): Límite de tiempo de la extracción
+            psm (int, optional): Modo de segmentación de Tesseract
+            whitelist (str, optional): Únicos caracteres que puede reconocer
             
-            # Aplicar un poco de contraste automático para mejorar la legibilidad
-            # Este método simple usa PIL para autoajustar el contraste
-            from PIL import ImageOps
-            img_contrast = ImageOps.autocontrast(img_gray, cutoff=0.5)
+        Returns:
+            tuple: (texto, confianza) o None si falló o se agotó el tiempo
+        """
+        if deadline and deadline.timed_out:
+            return None
+        
+        try:
+            # Usar Tesseract para OCR (con configuración para español).
+            # Con deadline, el motor interrumpe el reconocimiento al vencer
+            remaining = deadline.remaining() if deadline else None
+            timeout = max(remaining, 0.01) if remaining is not None else None
+            with span("ocr"):
+                return self.ocr_backend.recognize(img, timeout=timeout, psm=psm, whitelist=whitelist)
             
-            return img_contrast
+        except RuntimeError as e:
+            if deadline and deadline.expired:
+                deadline.expire()
+                logger.warning("OCR de página %s interrumpido por tiempo límite", page_num)
+                return None
+            logger.warning("Error al procesar página %s para OCR: %s", page_num, e)
+            return None
             
         except Exception as e:
-            logger.warning(f"Error al mejorar imagen para OCR: {str(e)}")
-            return image
+            logger.warning("Error al procesar página %s para OCR: %s", page_num, e)
+            return None
+    
+    def _deadline_reached(self, deadline, page_num):
+        """
+        Verifica el límite de tiempo antes de procesar una página
+        
+        Args:
+            deadline (Deadline): Límite de tiempo de la extracción (puede ser None)
+            page_num (int): Número de la página que se va a procesar
+            
+        Returns:
+            bool: True si se debe detener el procesamiento
+        """
+        if deadline is None or not deadline.expired:
+            return False
+        
+        deadline.expire()
+        logger.warning("Tiempo límite alcanzado, se omiten páginas desde la %s", page_num)
+        return True
     
-    def extract_pages_as_images(self, pdf_content):
+    def extract_pages_as_images(self, pdf_content, width=None, image_format="png", quality=80):
         """
         Extrae páginas del PDF como imágenes
         Útil para depuración o para mostrar vista previa
         
+        Las páginas se renderizan y codifican una por una al iterar, de modo
+        que quien solo necesita algunas no paga el resto.
+        
         Args:
             pdf_content (bytes): Contenido del PDF
+            width (int, optional): Ancho en píxeles de cada imagen (None = 72 dpi)
+            image_format (str): Formato de salida (png, jpeg o webp)
+            quality (int): Calidad de JPEG/WebP entre 1 y 100
             
-        Returns:
-            list: Lista de imágenes en formato bytes
+        Yields:
+            bytes: Imagen de cada página, en orden
         """
         try:
-            pdf_document = fitz.open(stream=pdf_content, filetype="pdf")
-            images = []
-            
-            for page_num in range(len(pdf_document)):
-                page = pdf_document[page_num]
-                pix = page.get_pixmap()
-                
-                img_bytes = io.BytesIO()
-                pix.save(img_bytes, format="png")
-                img_bytes.seek(0)
-                
-                images.append(img_bytes.getvalue())
-            
-            return images
+            with self.open_document(pdf_content) as pdf_document:
+                for page in pdf_document:
+                    yield self.render_page_image(page, width, image_format, quality)
             
         except Exception as e:
-            logger.error(f"Error al extraer páginas como imágenes: {str(e)}")
-            return []
\ No newline at end of file
+            logger.error("Error al extraer páginas como imágenes: %s", e)
+    
+    # Compartido con las vistas previas del proceso de la API
+    render_page_image = staticmethod(render_page_image)
@@ -0,0 +1,229 @@
+import logging
+import re
+from urllib.parse import parse_qs, urlparse
+
+import cv2
+import fitz  # PyMuPDF
+import numpy as np
+
+from app.models.response_models import FieldSource
+from app.services.image_enhancer import pixmap_to_array
+from app.utils.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# El QR de la constancia apunta al validador del SAT con D3 = "<idCIF>_<RFC>"
+SAT_QR_HOST = "siat.sat.gob.mx"
+SAT_QR_PATTERN = re.compile(r"^(\d{11})_([A-Z&Ñ]{3,4}\d{6}[A-Z0-9]{3})$")
+
+# El QR tiene corrección de errores: lo que decodifica es exacto
+QR_CONFIDENCE = 1.0
+
+# Imágenes incrustadas que pueden ser el QR: casi cuadradas y de tamaño razonable
+QR_IMAGE_MIN_SIDE = 40
+QR_IMAGE_MAX_SIDE = 2000
+QR_IMAGE_MAX_ASPECT = 1.2
+# Lado mínimo (px) con que se entrega una imagen al detector; las más chicas se amplían
+QR_DECODE_MIN_SIDE = 300
+# Borde blanco que se agrega alrededor de las imágenes incrustadas (zona de silencio)
+QR_QUIET_ZONE = 0.1
+# Resolución con que se localiza el QR en la página; el detector de OpenCV
+# escala mal con el tamaño de la imagen, así que solo se decodifica el recorte
+QR_DETECT_DPI = 100
+# Zona de la página (fracción x0, y0, x1, y1) donde se busca el QR en el render:
+# en la constancia está en la cédula, arriba a la izquierda
+QR_SEARCH_AREA = (0.0, 0.0, 0.5, 0.5)
+
+class QRCode:
+    """Código QR encontrado en una página"""
+    __slots__ = ("text", "rect", "page_num")
+
+    def __init__(self, text, rect, page_num):
+        # Contenido decodificado (cadena vacía si se detectó pero no se pudo leer)
+        self.text = text
+        # Caja (x0, y0, x1, y1) del símbolo en la página, en puntos
+        self.rect = rect
+        self.page_num = page_num
+
+def parse_sat_qr(text):
+    """
+    Obtiene el idCIF y el RFC de la URL del QR de una constancia
+
+    Args:
+        text (str): Contenido del QR
+
+    Returns:
+        dict: {"id_cif": ..., "rfc": ...} o None si no es un QR del SAT
+    """
+    try:
+        url = urlparse(text.strip())
+    except ValueError:
+        return None
+    if url.hostname != SAT_QR_HOST:
+        return None
+
+    for value in parse_qs(url.query).get("D3", []):
+        match = SAT_QR_PATTERN.match(value.strip().upper())
+        if match:
+            return {"id_cif": match.group(1), "rfc": match.group(2)}
+    return None
+
+def sat_qr_fields(qr):
+    """
+    Convierte el QR de una constancia en campos de la extracción
+
+    Args:
+        qr (QRCode): QR encontrado (puede ser None)
+
+    Returns:
+        dict: campo -> (valor, FieldSource); vacío si no es un QR del SAT legible
+    """
+    data = parse_sat_qr(qr.text) if qr is not None and qr.text else None
+    if data is None:
+        return {}
+
+    source = FieldSource(metodo="qr", confianza=QR_CONFIDENCE, pagina=qr.page_num, bbox=[round(v, 2) for v in qr.rect])
+    return {field: (value, source) for field, value in data.items()}
+
+class QRDecoder:
+    """
+    Busca y decodifica el QR de una página sin OCR ni acceso a red
+
+    Primero revisa las imágenes incrustadas (así lo genera el SAT y es lo
+    más barato: no se renderiza nada) y, si no está ahí, busca en un render
+    de baja resolución de la zona search_area de la página (escaneos).
+    """
+    def __init__(self, decode_dpi=150, search_area=QR_SEARCH_AREA):
+        # Resolución del recorte que se decodifica
+        self.decode_dpi = decode_dpi
+        self.search_area = search_area
+
+    @span("qr")
+    def find(self, page, page_num=0):
+        """
+        Busca el QR de una página
+
+        Args:
+            page (fitz.Page): Página del documento
+            page_num (int): Número de página
+
+        Returns:
+            QRCode: QR encontrado (con texto vacío si no se pudo leer) o None
+        """
+        try:
+            found = self.find_in_images(page, page_num)
+            if found is not None and found.text:
+                return found
+            return self._find_in_render(page, page_num) or found
+        except Exception as e:
+            logger.warning("Error al buscar el QR en la página %s: %s", page_num, e)
+            return None
+
+    def find_in_images(self, page, page_num=0):
+        """
+        Busca el QR solo entre las imágenes incrustadas de la página (sin renderizar)
+
+        Args:
+            page (fitz.Page): Página del documento
+            page_num (int): Número de página
+
+        Returns:
+            QRCode: QR encontrado (con texto vacío si no se pudo leer) o None
+        """
+        found = None
+        for image in page.get_images(full=True):
+            xref, width, height = image[0], image[2], image[3]
+            if min(width, height) < QR_IMAGE_MIN_SIDE or max(width, height) > QR_IMAGE_MAX_SIDE:
+                continue
+            if max(width, height) / min(width, height) > QR_IMAGE_MAX_ASPECT:
+                continue
+            rects = page.get_image_rects(xref)
+            if not rects:
+                continue
+
+            pix = fitz.Pixmap(page.parent, xref)
+            if pix.alpha:
+                pix = fitz.Pixmap(pix, 0)
+            if pix.n != 1:
+                pix = fitz.Pixmap(fitz.csGRAY, pix)
+            text, points = self._decode(pixmap_to_array(pix), pad=True)
+            if points is None:
+                continue
+
+            # Caja del símbolo dentro de la caja de la imagen en la página
+            rect = rects[0]
+            scale = np.array([rect.width / pix.width, rect.height / pix.height])
+            found = QRCode(text, self._points_to_rect(points * scale, rect.x0, rect.y0), page_num)
+            if text:
+                return found
+        return found
+
+    def _find_in_render(self, page, page_num):
+        """
+        Busca el QR en la zona search_area de la página renderizada
+
+        Se localiza en un render a QR_DETECT_DPI y solo la zona del QR se
+        vuelve a renderizar a decode_dpi para decodificarlo.
+        """
+        page_rect = page.rect
+        x0, y0, x1, y1 = self.search_area
+        search_clip = fitz.Rect(x0 * page_rect.width, y0 * page_rect.height, x1 * page_rect.width, y1 * page_rect.height)
+        rect = self._detect_in_clip(page, search_clip, QR_DETECT_DPI)
+        if rect is None:
+            return None
+
+        margin = (rect[2] - rect[0]) * QR_QUIET_ZONE
+        clip = fitz.Rect(rect[0] - margin, rect[1] - margin, rect[2] + margin, rect[3] + margin) & page_rect
+        zoom = self.decode_dpi / 72
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=clip, colorspace=fitz.csGRAY, alpha=False)
+        text, points = self._decode(pixmap_to_array(pix), pad=True)
+        if points is not None:
+            rect = self._points_to_rect(points / zoom, clip.x0, clip.y0)
+        return QRCode(text, rect, page_num)
+
+    def _detect_in_clip(self, page, clip, dpi):
+        """
+        Localiza (sin decodificar) un QR en una zona de la página
+
+        Returns:
+            tuple: Caja (x0, y0, x1, y1) del QR en puntos o None
+        """
+        zoom = dpi / 72
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=clip, colorspace=fitz.csGRAY, alpha=False)
+        found, points = cv2.QRCodeDetector().detect(np.ascontiguousarray(pixmap_to_array(pix)))
+        if not found or points is None:
+            return None
+        return self._points_to_rect(points.reshape(-1, 2) / zoom, clip.x0, clip.y0)
+
+    def _points_to_rect(self, points, x_offset=0.0, y_offset=0.0):
+        """Caja que contiene las esquinas del QR, desplazada al origen de la página"""
+        x0, y0 = points.min(axis=0)
+        x1, y1 = points.max(axis=0)
+        return float(x0 + x_offset), float(y0 + y_offset), float(x1 + x_offset), float(y1 + y_offset)
+
+    def _decode(self, gray, pad=False):
+        """
+        Detecta y decodifica un QR en una imagen en escala de grises
+
+        Args:
+            gray (numpy.ndarray): Imagen (alto, ancho) de uint8
+            pad (bool): Agregar zona de silencio (imágenes recortadas al símbolo)
+
+        Returns:
+            tuple: (texto o "", esquinas (4, 2) en px de gray o None si no se detectó)
+        """
+        offset = 0
+        if pad:
+            offset = int(max(gray.shape) * QR_QUIET_ZONE) + 1
+            gray = cv2.copyMakeBorder(gray, offset, offset, offset, offset, cv2.BORDER_CONSTANT, value=255)
+
+        factor = 1.0
+        if max(gray.shape) < QR_DECODE_MIN_SIDE:
+            factor = QR_DECODE_MIN_SIDE / max(gray.shape)
+            gray = cv2.resize(gray, None, fx=factor, fy=factor, interpolation=cv2.INTER_NEAREST)
+
+        # Un detector por llamada: las instancias de OpenCV no son seguras entre hilos
+        text, points, _ = cv2.QRCodeDetector().detectAndDecode(np.ascontiguousarray(gray))
+        if points is None:
+            return "", None
+        return text or "", points.reshape(-1, 2) / factor - offset
@@ -0,0 +1,250 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from app.models.response_models import ExtractionResult
+from app.utils.metrics import increment_counter
+
+logger = logging.getLogger(__name__)
+
+# Segundos entre barridos del nivel en disco (expirados y exceso de tamaño)
+DISK_SWEEP_INTERVAL = 60
+
+class ResultCache:
+    """
+    Caché de resultados de extracción direccionada por contenido
+
+    La clave es el SHA-256 de los bytes del PDF junto con la versión del
+    extractor y la configuración de OCR, de modo que un cambio de versión
+    invalida las entradas anteriores. Tiene un nivel en memoria (LRU con
+    límite de entradas y TTL) y un nivel opcional en disco que sobrevive
+    a reinicios. El nivel en disco se barre al arrancar y, al escribir,
+    cada DISK_SWEEP_INTERVAL segundos o al superar disk_max_bytes: se
+    borran las entradas expiradas y, si aún excede el límite, las más
+    antiguas.
+
+    get y set consultan ambos niveles; desde el event loop se usan
+    get_memory/set_memory y se llevan get_disk/set_disk a un executor,
+    porque el nivel en disco lee, escribe y barre archivos.
+    """
+    def __init__(self, version, max_entries=512, ttl=3600, disk_dir=None, disk_max_bytes=256 * 1024 * 1024):
+        self.version = version
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Tamaño estimado del nivel en disco (exacto tras cada barrido)
+        self._disk_bytes = 0
+        self._last_sweep = 0.0
+        self._sweep_lock = threading.Lock()
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self._sweep_disk()
+
+    def key_for(self, content_sha256) -> str:
+        """
+        Calcula la clave de caché de un PDF
+
+        Args:
+            content_sha256 (str): SHA-256 hexadecimal de los bytes del PDF,
+                calculado durante la lectura de la subida
+
+        Returns:
+            str: Clave hexadecimal
+        """
+        return hashlib.sha256(f"{self.version}:{content_sha256}".encode("utf-8")).hexdigest()
+
+    def get(self, key) -> Optional[ExtractionResult]:
+        """
+        Busca un resultado en memoria y después en disco
+
+        Args:
+            key (str): Clave calculada con key_for
+
+        Returns:
+            ExtractionResult: Resultado almacenado o None si no existe o expiró
+        """
+        result = self.get_memory(key)
+        if result is None:
+            result = self.get_disk(key)
+        return result
+
+    def get_memory(self, key) -> Optional[ExtractionResult]:
+        """
+        Busca un resultado solo en el nivel en memoria (no bloquea)
+
+        Un fallo aquí no se cuenta: lo cuenta get_disk, que se consulta después.
+
+        Args:
+            key (str): Clave calculada con key_for
+
+        Returns:
+            ExtractionResult: Resultado almacenado o None si no está en memoria
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, result = entry
+                if time.monotonic() < expires_at:
+                    self._entries.move_to_end(key)
+                    increment_counter("scraper_cache_hits_total", {"tier": "memory"})
+                    return result
+                del self._entries[key]
+        return None
+
+    def get_disk(self, key) -> Optional[ExtractionResult]:
+        """
+        Busca un resultado en el nivel en disco y lo sube a memoria
+
+        Args:
+            key (str): Clave calculada con key_for
+
+        Returns:
+            ExtractionResult: Resultado almacenado o None si no existe o expiró
+        """
+        result = self._read_disk(key)
+        if result is not None:
+            self.set_memory(key, result)
+            increment_counter("scraper_cache_hits_total", {"tier": "disk"})
+            return result
+
+        increment_counter("scraper_cache_misses_total")
+        return None
+
+    def set(self, key, result: ExtractionResult) -> None:
+        """
+        Guarda un resultado en la caché
+
+        Args:
+            key (str): Clave calculada con key_for
+            result (ExtractionResult): Resultado de la extracción
+        """
+        self.set_memory(key, result)
+        self.set_disk(key, result)
+
+    def set_memory(self, key, result: ExtractionResult) -> None:
+        """Guarda en el nivel en memoria expulsando las entradas más antiguas"""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def set_disk(self, key, result: ExtractionResult) -> None:
+        """Escribe en el nivel en disco (y lo barre si toca); no hace nada sin disk_dir"""
+        self._write_disk(key, result)
+
+    def clear(self) -> None:
+        """Vacía el nivel en memoria"""
+        with self._lock:
+            self._entries.clear()
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _read_disk(self, key):
+        """Lee una entrada del nivel en disco, borrándola si expiró"""
+        if not self.disk_dir:
+            return None
+
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning("Entrada de caché ilegible %s: %s", path, e)
+            return None
+
+        if time.time() >= entry.get("expires_at", 0):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+
+        return ExtractionResult.parse_obj(entry["result"])
+
+    def _write_disk(self, key, result):
+        """Escribe una entrada en disco de forma atómica"""
+        if not self.disk_dir:
+            return
+
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            content = json.dumps({
+                "expires_at": time.time() + self.ttl,
+                "result": json.loads(result.json())
+            })
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning("No se pudo escribir la caché en disco: %s", e)
+            return
+
+        self._disk_bytes += len(content)
+        if self._disk_bytes > self.disk_max_bytes or time.monotonic() - self._last_sweep >= DISK_SWEEP_INTERVAL:
+            self._sweep_disk()
+
+    def _sweep_disk(self):
+        """
+        Borra del nivel en disco las entradas expiradas y, si el total aún
+        excede disk_max_bytes, las más antiguas primero
+
+        La antigüedad se toma de la fecha de modificación (la de escritura),
+        así no hace falta leer cada archivo.
+        """
+        # Un solo barrido a la vez; si otro hilo ya barre, no esperar
+        if not self._sweep_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_sweep = time.monotonic()
+            now = time.time()
+            entries = []
+            removed = 0
+            with os.scandir(self.disk_dir) as listing:
+                for item in listing:
+                    try:
+                        stat = item.stat()
+                    except OSError:
+                        continue
+                    # Entradas expiradas y temporales de escrituras interrumpidas
+                    if now - stat.st_mtime >= self.ttl:
+                        removed += self._remove_disk_file(item.path)
+                    elif item.name.endswith(".json"):
+                        entries.append((stat.st_mtime, stat.st_size, item.path))
+
+            total = sum(size for _, size, _ in entries)
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.disk_max_bytes:
+                    break
+                removed += self._remove_disk_file(path)
+                total -= size
+            self._disk_bytes = total
+            if removed:
+                logger.info("Caché en disco: %s entradas borradas, %s bytes en uso", removed, total)
+        except OSError as e:
+            logger.warning("No se pudo barrer la caché en disco: %s", e)
+        finally:
+            self._sweep_lock.release()
+
+    @staticmethod
+    def _remove_disk_file(path):
+        """Borra un archivo del nivel en disco; devuelve 1 si lo borró"""
+        try:
+            os.remove(path)
+            return 1
+        except OSError:
+            return 0
@@ -0,0 +1,477 @@
+import calendar
+import itertools
+import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from app.services.csf_template import SAT_CSF_TEMPLATE
+from app.utils.metrics import increment_counter
+
+logger = logging.getLogger(__name__)
+
+# Textos de la constancia (normalizados: mayúsculas y sin acentos); el
+# encabezado del SAT cuenta como uno más
+CSF_KEYWORDS = (
+    "CONSTANCIA DE SITUACION FISCAL",
+    "CEDULA DE IDENTIFICACION FISCAL",
+    "SERVICIO DE ADMINISTRACION TRIBUTARIA",
+    "DATOS DE IDENTIFICACION DEL CONTRIBUYENTE",
+    "DATOS DEL DOMICILIO REGISTRADO",
+    "IDCIF",
+    "REGIMEN",
+)
+# Textos de otros documentos que suelen subirse por error (solo se reportan)
+OTHER_DOCUMENT_KEYWORDS = (
+    "COMPROBANTE FISCAL DIGITAL",
+    "FACTURA",
+    "ESTADO DE CUENTA",
+    "CONTRATO",
+    "OPINION DEL CUMPLIMIENTO",
+)
+# Palabras clave de la constancia que bastan para aceptarla sin más señales
+MIN_CSF_KEYWORDS = 2
+
+# Páginas cuyo texto se revisa (el encabezado está en la primera)
+CLASSIFY_TEXT_PAGES = 2
+# Caracteres de capa de texto a partir de los cuales su contenido es concluyente
+MIN_TEXT_CHARS = 200
+# Fracción mínima de letras y dígitos del texto: por debajo la capa de texto
+# puede tener una codificación de fuentes rota y no se usa para rechazar
+MIN_READABLE_FRACTION = 0.6
+
+# Resolución de la miniatura de la primera página
+THUMBNAIL_DPI = 18
+# Fracción de tinta por debajo de la cual la página está en blanco
+BLANK_INK_FRACTION = 0.001
+# Fracción de tinta de la zona del QR en la plantilla a partir de la cual hay un bloque oscuro
+QR_ZONE_INK_FRACTION = 0.2
+
+class ClassificationResult:
+    """Resultado de clasificar un documento"""
+    __slots__ = ("is_csf", "reason", "signals")
+
+    def __init__(self, is_csf, reason, signals=None):
+        self.is_csf = is_csf
+        # Motivo de la decisión (csf, uncertain, too_many_pages, not_csf, blank, invalid_pdf)
+        self.reason = reason
+        # Señales medidas, para el log
+        self.signals = signals or {}
+
+def normalize_text(text):
+    """Pasa el texto a mayúsculas sin acentos y con espacios simples"""
+    decomposed = unicodedata.normalize("NFKD", text.upper())
+    return " ".join("".join(char for char in decomposed if not unicodedata.combining(char)).split())
+
+class DocumentClassifier:
+    """
+    Decide en milisegundos si un PDF parece una Constancia de Situación Fiscal
+
+    Usa solo señales baratas (número de páginas, metadatos, palabras clave de
+    la capa de texto, una miniatura de la primera página y el QR del SAT entre
+    las imágenes incrustadas) para rechazar antes del OCR los documentos que
+    claramente no son constancias. Ante la duda acepta: la extracción
+    completa decide. Los rechazos se recuerdan por SHA-256 del contenido.
+
+    PyMuPDF, NumPy y OpenCV se importan al clasificar el primer documento y
+    no al cargar el módulo, que también importa el proceso de la API.
+    """
+    def __init__(self, max_pages=10, negative_cache_entries=1024, negative_cache_ttl=3600):
+        self.max_pages = max_pages
+        self.negative_cache_entries = negative_cache_entries
+        self.negative_cache_ttl = negative_cache_ttl
+        # Se crea al buscar el primer QR
+        self.qr_decoder = None
+        self._rejected = OrderedDict()
+        self._lock = threading.Lock()
+
+    def classify(self, pdf_content, content_sha256=None):
+        """
+        Clasifica un PDF
+
+        Args:
+            pdf_content (bytes | bytearray | str): Contenido del PDF o ruta del archivo
+            content_sha256 (str, optional): SHA-256 del contenido para la caché de rechazos
+
+        Returns:
+            ClassificationResult: Decisión y señales
+        """
+        if content_sha256:
+            cached = self._get_rejected(content_sha256)
+            if cached is not None:
+                increment_counter("scraper_classification_total", {"result": "cached"})
+                return cached
+
+        import fitz  # PyMuPDF
+
+        try:
+            if isinstance(pdf_content, str):
+                document = fitz.open(pdf_content, filetype="pdf")
+            else:
+                document = fitz.open(stream=pdf_content, filetype="pdf")
+        except RuntimeError as e:
+            # fitz.FileDataError: el PDF está dañado y tampoco abrirá en la extracción
+            logger.warning("PDF dañado, no se pudo abrir para clasificarlo: %s", e)
+            result = ClassificationResult(False, "invalid_pdf")
+            increment_counter("scraper_classification_total", {"result": result.reason})
+            if content_sha256:
+                self._store_rejected(content_sha256, result)
+            return result
+        except Exception as e:
+            logger.warning("No se pudo abrir el PDF para clasificarlo: %s", e)
+            return ClassificationResult(True, "uncertain")
+
+        try:
+            result = self._classify_document(document)
+        except Exception as e:
+            logger.warning("Error al clasificar el documento: %s", e)
+            result = ClassificationResult(True, "uncertain")
+        finally:
+            document.close()
+
+        increment_counter("scraper_classification_total", {"result": result.reason})
+        if not result.is_csf and content_sha256:
+            self._store_rejected(content_sha256, result)
+        return result
+
+    def _classify_document(self, document):
+        """Aplica las señales de la más barata a la más cara"""
+        signals = {"pages": document.page_count}
+        if document.needs_pass:
+            return ClassificationResult(True, "uncertain", signals)
+        if document.page_count == 0:
+            return ClassificationResult(False, "blank", signals)
+        if document.page_count > self.max_pages:
+            return ClassificationResult(False, "too_many_pages", signals)
+
+        metadata = normalize_text(" ".join(
+            value for key, value in (document.metadata or {}).items() if key in ("title", "subject", "keywords") and value
+        ))
+        if "CONSTANCIA DE SITUACION FISCAL" in metadata:
+            signals["metadata"] = True
+            return ClassificationResult(True, "csf", signals)
+
+        text = normalize_text(" ".join(
+            document[page_num].get_text("text") for page_num in range(min(CLASSIFY_TEXT_PAGES, document.page_count))
+        ))
+        signals["text_chars"] = len(text)
+        keywords = [keyword for keyword in CSF_KEYWORDS if keyword in text]
+        signals["keywords"] = keywords
+        if len(keywords) >= MIN_CSF_KEYWORDS:
+            return ClassificationResult(True, "csf", signals)
+
+        page = document[0]
+        if len(text) >= MIN_TEXT_CHARS and self._readable_fraction(text) >= MIN_READABLE_FRACTION:
+            # Texto legible sin la constancia: solo el QR del SAT la salva (p.ej. el
+            # texto es de una hoja agregada antes de la constancia)
+            from app.services.qr_decoder import QRDecoder, parse_sat_qr
+
+            if self.qr_decoder is None:
+                self.qr_decoder = QRDecoder()
+            qr = self.qr_decoder.find_in_images(page)
+            if qr is not None and parse_sat_qr(qr.text):
+                signals["qr"] = True
+                return ClassificationResult(True, "csf", signals)
+            signals["other_document"] = [keyword for keyword in OTHER_DOCUMENT_KEYWORDS if keyword in text]
+            if not keywords:
+                return ClassificationResult(False, "not_csf", signals)
+            return ClassificationResult(True, "uncertain", signals)
+
+        # Sin capa de texto útil (escaneo): la miniatura descarta páginas en blanco
+        ink, qr_zone_ink = self._thumbnail_fingerprint(page)
+        signals["ink"] = round(ink, 4)
+        signals["qr_zone_ink"] = round(qr_zone_ink, 3)
+        if ink < BLANK_INK_FRACTION and not keywords:
+            return ClassificationResult(False, "blank", signals)
+        if qr_zone_ink >= QR_ZONE_INK_FRACTION:
+            return ClassificationResult(True, "csf", signals)
+        return ClassificationResult(True, "uncertain", signals)
+
+    def _readable_fraction(self, text):
+        """Fracción de letras y dígitos entre los caracteres que no son espacio"""
+        characters = text.replace(" ", "")
+        if not characters:
+            return 0.0
+        return sum(char.isalnum() for char in characters) / len(characters)
+
+    def _thumbnail_fingerprint(self, page):
+        """
+        Huella de la primera página en una miniatura en escala de grises
+
+        Returns:
+            tuple: (fracción de tinta de la página, fracción de tinta en la zona del QR de la plantilla)
+        """
+        import fitz  # PyMuPDF
+        import numpy as np
+        from app.services.image_enhancer import INK_THRESHOLD, pixmap_to_array
+
+        zoom = THUMBNAIL_DPI / 72
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY, alpha=False)
+        ink = pixmap_to_array(pix) < INK_THRESHOLD
+        x0, y0, x1, y1 = SAT_CSF_TEMPLATE.qr_box
+        height, width = ink.shape
+        qr_zone = ink[int(y0 * height):int(y1 * height) + 1, int(x0 * width):int(x1 * width) + 1]
+        return float(np.count_nonzero(ink)) / ink.size, float(np.count_nonzero(qr_zone)) / max(qr_zone.size, 1)
+
+    def _get_rejected(self, content_sha256):
+        """Rechazo previo vigente del mismo contenido, o None"""
+        with self._lock:
+            entry = self._rejected.get(content_sha256)
+            if entry is None:
+                return None
+            expires_at, result = entry
+            if time.monotonic() >= expires_at:
+                del self._rejected[content_sha256]
+                return None
+            self._rejected.move_to_end(content_sha256)
+            return result
+
+    def _store_rejected(self, content_sha256, result):
+        """Recuerda un rechazo expulsando los más antiguos"""
+        with self._lock:
+            self._rejected[content_sha256] = (time.monotonic() + self.negative_cache_ttl, result)
+            self._rejected.move_to_end(content_sha256)
+            while len(self._rejected) > self.negative_cache_entries:
+                self._rejected.popitem(last=False)
+
+# Valor de cada carácter en el cálculo del dígito verificador del RFC
+RFC_CHECK_CHARS = "0123456789ABCDEFGHIJKLMN&OPQRSTUVWXYZ Ñ"
+RFC_PATTERN = re.compile(r"^([A-Z&Ñ]{3,4})(\d{2})(\d{2})(\d{2})([A-Z0-9]{2})([0-9A])$")
+ID_CIF_PATTERN = re.compile(r"^\d{11}$")
+CP_PATTERN = re.compile(r"^\d{5}$")
+# Los códigos postales de México van de 01000 a 99999 (los dos primeros dígitos son la entidad)
+MIN_CODIGO_POSTAL = 1000
+# RFC genéricos del SAT (público en general y extranjeros): su homoclave es
+# fija y no cumple el dígito verificador
+GENERIC_RFCS = frozenset({"XAXX010101000", "XEXX010101000"})
+
+# Catálogo c_RegimenFiscal del SAT: código -> (descripción, aplica a persona física, aplica a persona moral)
+REGIMEN_CATALOG = {
+    "601": ("General de Ley Personas Morales", False, True),
+    "603": ("Personas Morales con Fines no Lucrativos", False, True),
+    "605": ("Sueldos y Salarios e Ingresos Asimilados a Salarios", True, False),
+    "606": ("Arrendamiento", True, False),
+    "607": ("Régimen de Enajenación o Adquisición de Bienes", True, False),
+    "608": ("Demás ingresos", True, False),
+    "610": ("Residentes en el Extranjero sin Establecimiento Permanente en México", True, True),
+    "611": ("Ingresos por Dividendos (socios y accionistas)", True, False),
+    "612": ("Personas Físicas con Actividades Empresariales y Profesionales", True, False),
+    "614": ("Ingresos por intereses", True, False),
+    "615": ("Régimen de los ingresos por obtención de premios", True, False),
+    "616": ("Sin obligaciones fiscales", True, False),
+    "620": ("Sociedades Cooperativas de Producción que optan por diferir sus ingresos", False, True),
+    "621": ("Incorporación Fiscal", True, False),
+    "622": ("Actividades Agrícolas, Ganaderas, Silvícolas y Pesqueras", False, True),
+    "623": ("Opcional para Grupos de Sociedades", False, True),
+    "624": ("Coordinados", False, True),
+    "625": ("Régimen de las Actividades Empresariales con ingresos a través de Plataformas Tecnológicas", True, False),
+    "626": ("Régimen Simplificado de Confianza", True, True),
+    "628": ("Hidrocarburos", False, True),
+    "629": ("De los Regímenes Fiscales Preferentes y de las Empresas Multinacionales", True, False),
+    "630": ("Enajenación de acciones en bolsa de valores", True, False),
+}
+
+# Confusiones típicas del OCR, según lo que se espera en la posición
+LETTER_FOR_DIGIT = {"0": "O", "1": "I", "2": "Z", "4": "A", "5": "S", "6": "G", "8": "B"}
+DIGIT_FOR_LETTER = {"O": "0", "Q": "0", "D": "0", "I": "1", "L": "1", "Z": "2", "A": "4", "S": "5", "G": "6", "T": "7", "B": "8"}
+# Pares intercambiables en la homoclave, donde se admiten letras y dígitos
+AMBIGUOUS_CHARACTERS = {"O": "0", "0": "O", "I": "1", "1": "I", "S": "5", "5": "S", "B": "8", "8": "B", "Z": "2", "2": "Z", "G": "6", "6": "G"}
+
+# Valores alternativos en el texto (etiquetas tolerantes a errores de OCR)
+CP_CANDIDATE_PATTERN = re.compile(r"(?:C[OÓ0]DIGO\s*P[O0]STAL|C\.?\s?P\.?)\s*:?\s*([0-9OIlSB]{5})(?![0-9])", re.IGNORECASE)
+REGIMEN_CANDIDATE_PATTERN = re.compile(r"R[EÉ]G[IÍ]MEN(?:ES)?[^0-9]{0,80}?(\d{3})(?!\d)", re.IGNORECASE)
+SEPARATOR_PATTERN = re.compile(r"[\s\-_.]")
+
+# Estados de validación de un campo
+VALID = "valido"
+CORRECTED = "corregido"
+REOCR = "reocr"
+INVALID = "invalido"
+
+def rfc_check_digit(rfc_base):
+    """
+    Calcula el dígito verificador (último carácter de la homoclave) de un RFC
+
+    Args:
+        rfc_base (str): Primeros 11 (persona moral) o 12 (persona física) caracteres
+
+    Returns:
+        str: Dígito verificador ("0"-"9" o "A")
+    """
+    base = rfc_base.rjust(12)
+    total = sum(RFC_CHECK_CHARS.index(char) * (13 - index) for index, char in enumerate(base))
+    remainder = total % 11
+    if remainder == 0:
+        return "0"
+    digit = 11 - remainder
+    return "A" if digit == 10 else str(digit)
+
+class FieldCheck:
+    """Resultado de validar un campo"""
+    __slots__ = ("value", "status", "reason")
+
+    def __init__(self, value, status, reason=None):
+        # Valor final (corregido si status es CORRECTED)
+        self.value = value
+        self.status = status
+        # Motivo del rechazo si status es INVALID
+        self.reason = reason
+
+    @property
+    def valid(self):
+        return self.status != INVALID
+
+class FieldValidator:
+    """
+    Valida los campos extraídos y corrige errores típicos de OCR
+
+    Comprueba la estructura, fecha y dígito verificador del RFC, el régimen
+    contra el catálogo del SAT (y contra el tipo de persona del RFC), el
+    rango del código postal y el formato del idCIF. Antes de declarar un
+    campo inválido prueba correcciones baratas: sustituir caracteres que el
+    OCR confunde (O/0, I/1, S/5...) según lo que se espera en cada posición
+    y, para régimen y código postal, otros valores etiquetados en el texto.
+    """
+    # Incrementar al cambiar las reglas (invalida la caché de resultados)
+    VERSION = "2"
+
+    FIELDS = ("rfc", "regimen_fiscal", "codigo_postal", "id_cif")
+
+    def validate(self, csf_data, text="", correct=True):
+        """
+        Valida los campos de una extracción
+
+        Args:
+            csf_data (CSFData): Datos extraídos
+            text (str): Texto del documento, para buscar valores alternativos
+            correct (bool): Probar correcciones (solo tiene sentido con texto de OCR)
+
+        Returns:
+            dict: Campo -> FieldCheck de los campos con valor
+        """
+        checks = {}
+        rfc = csf_data.rfc
+        for field in self.FIELDS:
+            value = getattr(csf_data, field)
+            if value:
+                checks[field] = self.check(field, value, text if correct else "", correct, rfc)
+                if field == "rfc":
+                    rfc = checks[field].value
+        return checks
+
+    def check(self, field, value, text="", correct=True, rfc=""):
+        """
+        Valida un campo, probando correcciones si no es válido
+
+        Args:
+            field (str): Campo de CSFData
+            value (str): Valor extraído
+            text (str): Texto del documento (valores alternativos de régimen y código postal)
+            correct (bool): Probar correcciones
+            rfc (str): RFC del documento (define el tipo de persona para el régimen)
+
+        Returns:
+            FieldCheck: Resultado
+        """
+        validate = getattr(self, f"_invalid_{field}")
+        reason = validate(value, rfc)
+        if reason is None:
+            return FieldCheck(value, VALID)
+        if not correct:
+            return FieldCheck(value, INVALID, reason)
+
+        for candidate in self._candidates(field, value, text):
+            if candidate != value and validate(candidate, rfc) is None:
+                return FieldCheck(candidate, CORRECTED)
+        return FieldCheck(value, INVALID, reason)
+
+    def _invalid_rfc(self, value, rfc=""):
+        """Motivo por el que un RFC no es válido, o None"""
+        if value in GENERIC_RFCS:
+            return None
+        match = RFC_PATTERN.match(value)
+        if not match:
+            return "formato"
+        _, year, month, day, _, check = match.groups()
+        month, day = int(month), int(day)
+        # El siglo no está en el RFC: 29 de febrero se admite en años múltiplos de 4
+        days = calendar.monthrange(2000 + int(year) if int(year) % 4 == 0 else 2001, month)[1] if 1 <= month <= 12 else 0
+        if not 1 <= day <= days:
+            return "fecha"
+        if rfc_check_digit(value[:-1]) != check:
+            return "digito_verificador"
+        return None
+
+    def _invalid_regimen_fiscal(self, value, rfc=""):
+        """Motivo por el que un régimen no es válido, o None"""
+        entry = REGIMEN_CATALOG.get(value)
+        if entry is None:
+            return "catalogo"
+        _, fisica, moral = entry
+        if RFC_PATTERN.match(rfc or "") and not (fisica if len(rfc) == 13 else moral):
+            return "tipo_persona"
+        return None
+
+    def _invalid_codigo_postal(self, value, rfc=""):
+        """Motivo por el que un código postal no es válido, o None"""
+        if not CP_PATTERN.match(value):
+            return "formato"
+        if int(value) < MIN_CODIGO_POSTAL:
+            return "rango"
+        return None
+
+    def _invalid_id_cif(self, value, rfc=""):
+        """Motivo por el que un idCIF no es válido, o None"""
+        return None if ID_CIF_PATTERN.match(value) else "formato"
+
+    def _candidates(self, field, value, text):
+        """
+        Correcciones a probar para un campo, de la más a la menos probable
+
+        Returns:
+            iterable: Valores candidatos
+        """
+        cleaned = SEPARATOR_PATTERN.sub("", value.upper())
+        if field == "rfc":
+            return self._rfc_candidates(cleaned)
+        if field == "codigo_postal":
+            return itertools.chain(
+                [self._as_digits(cleaned)],
+                (self._as_digits(match.group(1).upper()) for match in CP_CANDIDATE_PATTERN.finditer(text))
+            )
+        if field == "regimen_fiscal":
+            return (match.group(1) for match in REGIMEN_CANDIDATE_PATTERN.finditer(text))
+        return [self._as_digits(cleaned)]
+
+    def _as_digits(self, value):
+        """Sustituye letras que el OCR confunde con dígitos"""
+        return "".join(DIGIT_FOR_LETTER.get(char, char) for char in value)
+
+    def _rfc_candidates(self, value):
+        """
+        Correcciones de un RFC de 12 o 13 caracteres
+
+        Las letras iniciales y la fecha tienen un único tipo de carácter, así
+        que se corrigen directamente; en la homoclave se admiten ambos y se
+        prueban las combinaciones de caracteres ambiguos (el dígito
+        verificador decide), primero las de menos cambios.
+        """
+        if len(value) not in (12, 13):
+            return
+        prefix_length = len(value) - 9
+        prefix = "".join(LETTER_FOR_DIGIT.get(char, char) for char in value[:prefix_length])
+        date = self._as_digits(value[prefix_length:prefix_length + 6])
+        homoclave = value[-3:]
+        # El dígito verificador solo puede ser dígito o "A"
+        if homoclave[2] not in "0123456789A":
+            homoclave = homoclave[:2] + DIGIT_FOR_LETTER.get(homoclave[2], homoclave[2])
+
+        options = [(char,) + ((AMBIGUOUS_CHARACTERS[char],) if char in AMBIGUOUS_CHARACTERS else ()) for char in homoclave]
+        candidates = sorted(
+            ("".join(combination) for combination in itertools.product(*options)),
+            key=lambda candidate: sum(a != b for a, b in zip(candidate, homoclave))
+        )
+        for candidate in candidates:
+            yield prefix + date + candidate
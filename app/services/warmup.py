@@ -0,0 +1,78 @@
+import logging
+import time
+from functools import lru_cache
+
+import fitz  # PyMuPDF
+
+from app.utils.deadline import Deadline
+
+logger = logging.getLogger(__name__)
+
+# Texto de la página de muestra: suficiente para que el OCR devuelva algo
+# y las reglas de DataExtractor se ejecuten, en cualquier idioma de Tesseract
+WARMUP_LINES = (
+    "CONSTANCIA DE SITUACION FISCAL",
+    "RFC: XAXX010101000",
+    "Codigo Postal: 06600",
+)
+# Resolución de la imagen de la muestra (baja: basta para cargar el modelo)
+WARMUP_DPI = 100
+# Tiempo máximo del calentamiento de un pipeline
+WARMUP_TIMEOUT = 30
+
+@lru_cache(maxsize=1)
+def warmup_pdf():
+    """
+    PDF de una página escaneada (solo imagen) para calentar el pipeline
+
+    Se genera en memoria una sola vez; al no tener capa de texto recorre
+    render, mejora de imagen, búsqueda del QR, OCR y extracción de datos.
+
+    Returns:
+        bytes: Contenido del PDF (unos pocos KB)
+    """
+    with fitz.open() as source:
+        page = source.new_page(width=612, height=792)
+        for index, line in enumerate(WARMUP_LINES):
+            page.insert_text((72, 120 + index * 28), line, fontsize=16)
+        pix = page.get_pixmap(dpi=WARMUP_DPI, colorspace=fitz.csGRAY)
+
+    with fitz.open() as document:
+        page = document.new_page(width=612, height=792)
+        page.insert_image(page.rect, pixmap=pix)
+        return document.tobytes(garbage=3, deflate=True)
+
+def warm_up(pipeline, run_sample=True):
+    """
+    Verifica el motor de OCR y, con run_sample, extrae el PDF de muestra
+
+    La primera extracción de un proceso paga la carga del modelo de
+    Tesseract, los primeros renders de MuPDF y la compilación de patrones;
+    hacerla aquí evita que la pague la primera solicitud real.
+
+    Args:
+        pipeline (ExtractionPipeline): Pipeline a calentar
+        run_sample (bool): Extraer el PDF de muestra además de verificar el OCR
+
+    Returns:
+        str: Motivo por el que el pipeline no está listo, o None si lo está
+    """
+    start = time.perf_counter()
+    try:
+        pipeline.pdf_processor.ocr_backend.check()
+    except Exception as e:
+        logger.error("Motor de OCR no disponible: %s", e)
+        return f"Motor de OCR no disponible: {e}"
+
+    if run_sample:
+        try:
+            result = pipeline.run(warmup_pdf(), Deadline(WARMUP_TIMEOUT))
+        except Exception as e:
+            logger.error("Error al calentar el pipeline de extracción: %s", e, exc_info=True)
+            return f"Error al calentar el pipeline de extracción: {e}"
+        if not result.text_found:
+            logger.error("El OCR del documento de muestra no devolvió texto")
+            return "El OCR del documento de muestra no devolvió texto"
+
+    logger.info("Pipeline de extracción listo en %.0f ms", (time.perf_counter() - start) * 1000)
+    return None
@@ -0,0 +1,36 @@
+import time
+from typing import Optional
+
+class Deadline:
+    """
+    Límite de tiempo de una solicitud de extracción
+
+    Usa time.monotonic(), que en Linux es común a todos los procesos, por lo
+    que el mismo objeto puede enviarse a un worker del pool y seguir siendo
+    válido. Quien detecta el vencimiento llama a expire() para que el
+    resultado se marque como parcial.
+    """
+    def __init__(self, timeout: Optional[float] = None):
+        self.timeout = timeout
+        self.expires_at = time.monotonic() + timeout if timeout else None
+        self.timed_out = False
+
+    def remaining(self) -> Optional[float]:
+        """
+        Segundos restantes antes del vencimiento
+
+        Returns:
+            float: Segundos restantes (0 si ya venció) o None si no hay límite
+        """
+        if self.expires_at is None:
+            return None
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    @property
+    def expired(self) -> bool:
+        """Indica si el límite de tiempo ya se alcanzó"""
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    def expire(self) -> None:
+        """Marca la extracción como interrumpida por tiempo"""
+        self.timed_out = True
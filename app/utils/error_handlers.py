@@ -19,7 +19,7 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
             "type": error["type"]
         })
     
-    logger.warning(f"Error de validación: {error_detail}")
+    logger.warning("Error de validación: %s", error_detail)
     
     return JSONResponse(
         status_code=422,
@@ -34,21 +34,22 @@ async def http_exception_handler(request: Request, exc: StarletteHTTPException):
     """
     Manejador personalizado para excepciones HTTP
     """
-    logger.warning(f"HTTP error {exc.status_code}: {exc.detail}")
+    logger.warning("HTTP error %s: %s", exc.status_code, exc.detail)
     
     return JSONResponse(
         status_code=exc.status_code,
         content={
             "success": False,
             "message": exc.detail
-        }
+        },
+        headers=getattr(exc, "headers", None)
     )
 
 async def unhandled_exception_handler(request: Request, exc: Exception):
     """
     Manejador para excepciones no controladas
     """
-    logger.error(f"Error no controlado: {str(exc)}", exc_info=True)
+    logger.error("Error no controlado: %s", exc, exc_info=True)
     
     # En producción no mostramos el stacktrace al usuario
     error_detail = None
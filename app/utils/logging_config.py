@@ -1,14 +1,130 @@
+import atexit
 import logging
+import queue
 import sys
 import json
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
 from app.config import settings
+from app.utils.metrics import increment_counter
+
+# Proceso (solicitud, archivo de lote o trabajo) al que pertenece cada log
+_process_id: ContextVar = ContextVar("log_process_id", default=None)
+
+# Listener que escribe los logs en segundo plano (uno por proceso)
+_listener = None
+
+def bind_process_id(process_id):
+    """
+    Asocia un process_id a los logs del contexto actual (la tarea de la solicitud)
+
+    Args:
+        process_id (str): Identificador del procesamiento
+
+    Returns:
+        Token: Token para restaurar el valor anterior
+    """
+    return _process_id.set(process_id)
+
+def current_process_id():
+    """Devuelve el process_id asociado al contexto actual, o None"""
+    return _process_id.get()
+
+@contextmanager
+def log_context(process_id):
+    """Asocia un process_id a los logs emitidos dentro del bloque"""
+    token = _process_id.set(process_id)
+    try:
+        yield
+    finally:
+        _process_id.reset(token)
+
+class ContextFilter(logging.Filter):
+    """Agrega a cada registro el process_id del contexto en que se emitió"""
+    def filter(self, record):
+        # Se ejecuta en el hilo que emite el log: el listener no ve sus contextvars
+        record.process_id = _process_id.get() or "-"
+        return True
+
+class RateLimitFilter(logging.Filter):
+    """
+    Limita los registros de nivel bajo que emite cada línea de código por ventana
+
+    Los mensajes de cada patrón o página pueden repetirse cientos de veces
+    por segundo con carga. Los que exceden el límite se descartan antes de
+    llegar a la cola y el siguiente registro admitido de la misma línea
+    informa cuántos se omitieron (campo suppressed). Por defecto solo se
+    limita DEBUG: los INFO por solicitud son registros de auditoría.
+    """
+    def __init__(self, max_per_window, window=1.0, max_level=logging.DEBUG):
+        super().__init__()
+        self.max_per_window = max_per_window
+        self.window = window
+        self.max_level = max_level
+        self._window_start = time.monotonic()
+        self._counts = {}
+        self._suppressed = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if self.max_per_window <= 0 or record.levelno > self.max_level:
+            return True
+
+        # La línea de código, no el mensaje: el número de claves está acotado
+        key = (record.pathname, record.lineno)
+        with self._lock:
+            now = time.monotonic()
+            if now - self._window_start >= self.window:
+                self._window_start = now
+                self._counts.clear()
+            count = self._counts.get(key, 0) + 1
+            self._counts[key] = count
+            if count > self.max_per_window:
+                self._suppressed[key] = self._suppressed.get(key, 0) + 1
+                return False
+            suppressed = self._suppressed.pop(key, 0)
+
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Encola los registros sin formatearlos y sin bloquear a quien loguea
+
+    El mensaje se arma (getMessage, JSON) en el hilo del listener. Si la
+    cola está llena porque la salida es lenta, el registro se descarta y se
+    cuenta en lugar de frenar la solicitud.
+    """
+    def prepare(self, record):
+        # La cola no sale del proceso: los argumentos y la excepción viajan
+        # tal cual y el formato ocurre en el listener
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            increment_counter("scraper_log_dropped_total")
 
 class JSONFormatter(logging.Formatter):
     """
     Formateador personalizado para logs en formato JSON, útil para integración con
     sistemas como ELK, Loki, etc.
     """
+    def __init__(self):
+        super().__init__()
+        # Campos fijos del servicio, leídos una sola vez
+        self.service_fields = {
+            "service": settings.APP_NAME,
+            "version": settings.APP_VERSION,
+            "environment": settings.ENVIRONMENT,
+        }
+
     def format(self, record):
         log_record = {
             "timestamp": datetime.fromtimestamp(record.created).isoformat(),
@@ -17,39 +133,49 @@ class JSONFormatter(logging.Formatter):
             "module": record.module,
             "function": record.funcName,
             "line": record.lineno,
-            "service": settings.APP_NAME,
-            "version": settings.APP_VERSION,
-            "environment": settings.ENVIRONMENT,
+            "process_id": getattr(record, "process_id", "-"),
         }
-        
+        log_record.update(self.service_fields)
+
+        # Registros omitidos de la misma línea por el límite de frecuencia
+        if getattr(record, "suppressed", 0):
+            log_record["suppressed"] = record.suppressed
+
         # Agregar excepción si existe
         if record.exc_info:
             log_record["exception"] = self.formatException(record.exc_info)
-        
+
         # Agregar campos extra si existen
         if hasattr(record, "props"):
             log_record.update(record.props)
-        
+
         return json.dumps(log_record)
 
 def setup_logging():
     """
     Configura el sistema de logging para la aplicación
+
+    Con LOG_ASYNC, los handlers del logger raíz solo encolan el registro y
+    un hilo en segundo plano lo formatea y escribe, así una salida lenta no
+    agrega latencia a las solicitudes.
     """
+    global _listener
+
     # Configurar el nivel de logging según el entorno
     root_level = logging.DEBUG if settings.DEBUG else logging.INFO
-    
+
     # Obtener el logger raíz
     root_logger = logging.getLogger()
     root_logger.setLevel(root_level)
-    
-    # Limpiar handlers existentes
+
+    # Limpiar handlers existentes (y el listener de una configuración anterior)
     if root_logger.handlers:
         root_logger.handlers.clear()
-    
+    shutdown_logging()
+
     # Crear handler para salida a consola
     console_handler = logging.StreamHandler(sys.stdout)
-    
+
     # Aplicar formato según el entorno
     if settings.ENVIRONMENT == "production":
         # Formato JSON para producción (mejor para procesamiento automatizado)
@@ -57,17 +183,40 @@ def setup_logging():
     else:
         # Formato legible para desarrollo
         formatter = logging.Formatter(
-            "[%(asctime)s] %(levelname)s [%(name)s.%(funcName)s:%(lineno)d] %(message)s"
+            "[%(asctime)s] %(levelname)s [%(name)s.%(funcName)s:%(lineno)d] [%(process_id)s] %(message)s"
         )
-    
+
     console_handler.setFormatter(formatter)
-    root_logger.addHandler(console_handler)
-    
+
+    if settings.LOG_ASYNC:
+        handler = NonBlockingQueueHandler(queue.Queue(maxsize=settings.LOG_QUEUE_SIZE))
+        _listener = QueueListener(handler.queue, console_handler, respect_handler_level=True)
+        _listener.start()
+    else:
+        handler = console_handler
+
+    # Los filtros corren en el hilo que emite el log (contextvars y descarte antes de encolar)
+    handler.addFilter(ContextFilter())
+    handler.addFilter(RateLimitFilter(
+        settings.LOG_RATE_LIMIT,
+        max_level=logging.INFO if settings.LOG_RATE_LIMIT_INFO else logging.DEBUG
+    ))
+    root_logger.addHandler(handler)
+
     # Establecer niveles específicos para bibliotecas ruidosas
     logging.getLogger("uvicorn.access").setLevel(logging.WARNING)
     logging.getLogger("uvicorn.error").setLevel(logging.ERROR)
     logging.getLogger("matplotlib").setLevel(logging.WARNING)
-    
+
     # Log de inicio de configuración
     logger = logging.getLogger(__name__)
-    logger.debug(f"Logging configurado para entorno: {settings.ENVIRONMENT}")
\ No newline at end of file
+    logger.debug("Logging configurado para entorno: %s", settings.ENVIRONMENT)
+
+def shutdown_logging():
+    """Detiene el listener en segundo plano escribiendo los registros pendientes"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+atexit.register(shutdown_logging)
@@ -1,92 +1,273 @@
 import logging
-from typing import Dict, Optional
+import os
+import threading
+from typing import Dict, List, Optional
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess, start_http_server
 
 logger = logging.getLogger(__name__)
 
-# Variables para almacenar métricas
-# En producción, esto se reemplazaría por una integración real con Prometheus o similar
-counters = {}
-histograms = {}
-gauges = {}
+# Buckets fijos: cada serie de histograma ocupa memoria constante
+PROCESS_TIME_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+CONFIDENCE_BUCKETS = (0.25, 0.5, 0.75, 0.9, 1.0)
+STAGE_TIME_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Métricas conocidas: nombre -> (tipo, descripción, etiquetas permitidas, buckets).
+# Las etiquetas que no estén en la lista se descartan para que ningún
+# llamador pueda crear series sin límite (p.ej. una por usuario).
+METRIC_DEFINITIONS = {
+    "scraper_requests_total": ("counter", "Solicitudes de extracción recibidas", (), None),
+    "scraper_batch_requests_total": ("counter", "Solicitudes de extracción por lotes recibidas", (), None),
+    "scraper_batch_files_total": ("counter", "Archivos recibidos en solicitudes de lote", (), None),
+    "scraper_success_total": ("counter", "Solicitudes de extracción exitosas", (), None),
+    "scraper_errors_total": ("counter", "Solicitudes de extracción fallidas por motivo", ("reason",), None),
+    "scraper_timeouts_total": ("counter", "Extracciones que alcanzaron el tiempo límite", (), None),
+    "scraper_cache_hits_total": ("counter", "Resultados servidos desde la caché por nivel", ("tier",), None),
+    "scraper_cache_misses_total": ("counter", "Consultas a la caché sin resultado", (), None),
+    "scraper_process_time": ("histogram", "Tiempo de procesamiento de una solicitud en segundos", (), PROCESS_TIME_BUCKETS),
+    "scraper_confidence": ("histogram", "Confianza de los datos extraídos", ("field",), CONFIDENCE_BUCKETS),
+    "scraper_extraction_pending": ("gauge", "Extracciones en ejecución o en espera", (), None),
+    "scraper_jobs_queued": ("gauge", "Trabajos asíncronos en espera", (), None),
+    "scraper_jobs_total": ("counter", "Trabajos asíncronos terminados por estado", ("status",), None),
+    "scraper_stage_seconds": ("histogram", "Duración de cada etapa del pipeline en segundos", ("stage",), STAGE_TIME_BUCKETS),
+    "scraper_pages_total": ("counter", "Páginas procesadas por origen del texto (capa de texto u OCR)", ("source",), None),
+    "scraper_ocr_second_pass_total": ("counter", "Páginas que repitieron el OCR a resolución completa", (), None),
+    "scraper_qr_total": ("counter", "Búsquedas del QR de la constancia por resultado", ("result",), None),
+    "scraper_roi_pages_total": ("counter", "Páginas con OCR por regiones de la plantilla, por resultado", ("result",), None),
+    "scraper_classification_total": ("counter", "Documentos clasificados antes de la extracción, por resultado", ("result",), None),
+    "scraper_field_validation_total": ("counter", "Campos validados por campo y resultado", ("field", "status"), None),
+    "scraper_preview_total": ("counter", "Vistas previas de páginas solicitadas por resultado", ("result",), None),
+    "scraper_log_dropped_total": ("counter", "Registros de log descartados por la cola de logging llena", (), None),
+}
+
+# Valores distintos admitidos por etiqueta; los siguientes se agrupan en "other"
+MAX_LABEL_VALUES = 20
+OVERFLOW_LABEL_VALUE = "other"
+
+_METRIC_CLASSES = {"counter": Counter, "histogram": Histogram, "gauge": Gauge}
+
+# Con varios workers de uvicorn (--workers N) cada proceso tiene su propio
+# registro. Si PROMETHEUS_MULTIPROC_DIR está definido (directorio vacío al
+# arrancar), prometheus_client guarda los valores de cada proceso en ese
+# directorio y el exportador los suma
+MULTIPROCESS_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+_lock = threading.Lock()
+registry = CollectorRegistry()
+_metrics = {}
+_label_values = {}
+# Series ya resueltas por (métrica, valores de etiquetas) para evitar el lock en cada observación
+_series = {}
+_unknown_metrics = set()
+_server_started = False
+
+# En los procesos del pool las observaciones se acumulan aquí y se envían al
+# proceso principal junto con el resultado (ver drain_buffer/replay)
+_buffer = None
+
+def _create_metrics():
+    """Registra (o vuelve a registrar, vacías) todas las métricas conocidas"""
+    global _metrics, _label_values, _series
+    for metric in _metrics.values():
+        registry.unregister(metric)
+    _metrics = {}
+    _label_values = {}
+    _series = {}
+
+    for name, (kind, description, labelnames, buckets) in METRIC_DEFINITIONS.items():
+        kwargs = {"labelnames": labelnames, "registry": registry}
+        if buckets:
+            kwargs["buckets"] = buckets
+        if kind == "gauge":
+            # En modo multiproceso, la suma de los procesos vivos (en curso, en espera)
+            kwargs["multiprocess_mode"] = "livesum"
+        _metrics[name] = _METRIC_CLASSES[kind](name, description, **kwargs)
+
+_create_metrics()
+
+def _get_series(name: str, labels: Optional[Dict[str, str]]):
+    """
+    Devuelve la serie de una métrica aplicando los límites de etiquetas
+
+    Args:
+        name: Nombre de la métrica
+        labels: Diccionario de etiquetas
+
+    Returns:
+        La serie de prometheus_client o None si la métrica no existe
+    """
+    metric = _metrics.get(name)
+    if metric is None:
+        if name not in _unknown_metrics:
+            _unknown_metrics.add(name)
+            logger.warning("Métrica desconocida ignorada: %s", name)
+        return None
+
+    labelnames = METRIC_DEFINITIONS[name][2]
+    if not labelnames:
+        return metric
+
+    labels = labels or {}
+    cache_key = (name,) + tuple(labels.get(labelname, "") for labelname in labelnames)
+    series = _series.get(cache_key)
+    if series is not None:
+        return series
+
+    values = []
+    with _lock:
+        for labelname in labelnames:
+            value = str(labels.get(labelname, ""))
+            seen = _label_values.setdefault((name, labelname), set())
+            if value not in seen:
+                if len(seen) >= MAX_LABEL_VALUES:
+                    value = OVERFLOW_LABEL_VALUE
+                else:
+                    seen.add(value)
+            values.append(value)
+        series = metric.labels(*values)
+        # Solo se guardan en caché las combinaciones admitidas, para que la caché también quede acotada
+        if OVERFLOW_LABEL_VALUE not in values:
+            _series[cache_key] = series
+    return series
 
 def increment_counter(name: str, labels: Optional[Dict[str, str]] = None) -> None:
     """
     Incrementa un contador
-    
+
     Args:
         name: Nombre del contador
         labels: Diccionario de etiquetas
     """
-    labels_key = str(labels) if labels else "default"
-    if name not in counters:
-        counters[name] = {}
-    
-    if labels_key not in counters[name]:
-        counters[name][labels_key] = 0
-    
-    counters[name][labels_key] += 1
-    
-    # Log para debugging
-    logger.debug(f"Counter {name}{labels} = {counters[name][labels_key]}")
+    if _buffer is not None:
+        _buffer.append(("counter", name, 1, labels))
+        return
+
+    series = _get_series(name, labels)
+    if series is not None:
+        series.inc()
 
 def observe_histogram(name: str, value: float, labels: Optional[Dict[str, str]] = None) -> None:
     """
     Registra una observación en un histograma
-    
+
     Args:
         name: Nombre del histograma
         value: Valor a registrar
         labels: Diccionario de etiquetas
     """
-    labels_key = str(labels) if labels else "default"
-    if name not in histograms:
-        histograms[name] = {}
-    
-    if labels_key not in histograms[name]:
-        histograms[name][labels_key] = []
-    
-    histograms[name][labels_key].append(value)
-    
-    # Log para debugging
-    logger.debug(f"Histogram {name}{labels} = {value}")
+    if _buffer is not None:
+        _buffer.append(("histogram", name, value, labels))
+        return
+
+    series = _get_series(name, labels)
+    if series is not None:
+        series.observe(float(value))
 
 def set_gauge(name: str, value: float, labels: Optional[Dict[str, str]] = None) -> None:
     """
     Establece el valor de un gauge
-    
+
     Args:
         name: Nombre del gauge
         value: Valor a establecer
         labels: Diccionario de etiquetas
     """
-    labels_key = str(labels) if labels else "default"
-    if name not in gauges:
-        gauges[name] = {}
-    
-    gauges[name][labels_key] = value
-    
-    # Log para debugging
-    logger.debug(f"Gauge {name}{labels} = {value}")
+    if _buffer is not None:
+        _buffer.append(("gauge", name, value, labels))
+        return
+
+    series = _get_series(name, labels)
+    if series is not None:
+        series.set(float(value))
+
+def start_buffering() -> None:
+    """
+    Acumula las observaciones en lugar de registrarlas
 
-def get_metrics() -> Dict:
+    Se usa en los procesos del pool de extracción, cuyo registro no es
+    visible para el endpoint de métricas del proceso principal.
+    """
+    global _buffer
+    _buffer = []
+
+def drain_buffer() -> List[tuple]:
+    """
+    Devuelve y vacía las observaciones acumuladas
+
+    Returns:
+        Lista de (tipo, nombre, valor, etiquetas)
+    """
+    global _buffer
+    if _buffer is None:
+        return []
+    events, _buffer = _buffer, []
+    return events
+
+def replay(events: List[tuple]) -> None:
+    """
+    Registra en este proceso las observaciones acumuladas en un worker
+
+    Args:
+        events: Lista devuelta por drain_buffer
+    """
+    for kind, name, value, labels in events:
+        if kind == "counter":
+            increment_counter(name, labels)
+        elif kind == "histogram":
+            observe_histogram(name, value, labels)
+        else:
+            set_gauge(name, value, labels)
+
+def _exposition_registry() -> CollectorRegistry:
+    """Registro que se expone: el de este proceso o, en modo multiproceso, el de todos"""
+    if not MULTIPROCESS_DIR:
+        return registry
+    collected = CollectorRegistry()
+    multiprocess.MultiProcessCollector(collected)
+    return collected
+
+def start_metrics_server(port: int) -> None:
+    """
+    Expone las métricas en formato Prometheus en un puerto propio
+
+    Con varios workers de uvicorn solo el primero que arranca abre el
+    puerto; en los demás el puerto ocupado no impide iniciar la aplicación.
+
+    Args:
+        port: Puerto HTTP (METRICS_PORT)
+    """
+    global _server_started
+    if _server_started:
+        return
+    try:
+        start_http_server(port, registry=_exposition_registry())
+    except OSError as e:
+        if MULTIPROCESS_DIR:
+            logger.info("El puerto de métricas %s ya está abierto por otro worker", port)
+        else:
+            logger.warning("No se pudo abrir el puerto de métricas %s (%s); con varios workers "
+                           "defina PROMETHEUS_MULTIPROC_DIR para exponer las de todos", port, e)
+        return
+    _server_started = True
+    logger.info("Métricas expuestas en el puerto %s", port)
+
+def mark_process_dead() -> None:
+    """Descarta los gauges de este proceso del directorio multiproceso (al detener el worker)"""
+    if MULTIPROCESS_DIR:
+        multiprocess.mark_process_dead(os.getpid())
+
+def get_metrics() -> bytes:
     """
     Obtiene todas las métricas recolectadas
-    
+
     Returns:
-        Diccionario con todas las métricas
+        Métricas en formato de exposición de Prometheus
     """
-    return {
-        "counters": counters,
-        "histograms": histograms,
-        "gauges": gauges
-    }
+    return generate_latest(_exposition_registry())
 
 def reset_metrics() -> None:
     """
     Reinicia todas las métricas
     """
-    global counters, histograms, gauges
-    counters = {}
-    histograms = {}
-    gauges = {}
+    _create_metrics()
     logger.debug("Metrics reset")
\ No newline at end of file
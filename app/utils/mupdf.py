@@ -0,0 +1,58 @@
+"""
+Utilidades de PyMuPDF para el proceso de la API
+
+Este módulo no importa PyMuPDF ni PIL al cargarse: el proceso de la API
+solo los necesita al clasificar o generar vistas previas, y con el pool de
+procesos la extracción (PDFProcessor, OCR) nunca se carga en él.
+"""
+import io
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+# Versión del render y OCR de PDFProcessor, parte de la versión de la caché de
+# resultados (se define aquí para calcularla sin importar el pipeline).
+# Incrementar al cambiar el render u OCR
+PDF_PROCESSOR_VERSION = "6"
+
+@lru_cache(maxsize=1)
+def mupdf_executor():
+    """
+    Hilo único para usar PyMuPDF desde el proceso principal
+
+    PyMuPDF no es seguro entre hilos: el clasificador, las vistas previas y
+    la extracción local (EXTRACTION_WORKERS=0) se ejecutan aquí, uno a la
+    vez, fuera del event loop.
+
+    Returns:
+        ThreadPoolExecutor: Executor de un solo hilo
+    """
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix="mupdf")
+
+def render_page_image(page, width=None, image_format="png", quality=80):
+    """
+    Renderiza una página y la codifica como imagen
+
+    La escala se calcula para el ancho pedido, así que una miniatura se
+    rasteriza directamente a su tamaño en lugar de reducir la página completa.
+
+    Args:
+        page (fitz.Page): Página a renderizar
+        width (int, optional): Ancho en píxeles (None = 72 dpi)
+        image_format (str): Formato de salida (png, jpeg o webp)
+        quality (int): Calidad de JPEG/WebP entre 1 y 100
+
+    Returns:
+        bytes: Imagen codificada
+    """
+    import fitz  # PyMuPDF
+    from PIL import Image
+
+    zoom = width / page.rect.width if width else 1.0
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+    if image_format == "png":
+        return pix.tobytes("png")
+
+    image = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+    output = io.BytesIO()
+    image.save(output, format=image_format.upper(), quality=quality)
+    return output.getvalue()
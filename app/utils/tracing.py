@@ -0,0 +1,184 @@
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict
+
+from app.config import settings
+from app.utils.metrics import observe_histogram
+
+# Traza de la solicitud en curso (None fuera de trace())
+_current_trace: ContextVar = ContextVar("current_trace", default=None)
+_enabled = settings.TRACING_ENABLED
+
+def configure(enabled: bool) -> None:
+    """
+    Activa o desactiva la medición de etapas
+
+    Args:
+        enabled: Si False, span() devuelve un objeto vacío y no mide nada
+    """
+    global _enabled
+    _enabled = enabled
+
+def is_enabled() -> bool:
+    """Indica si la medición de etapas está activa"""
+    return _enabled
+
+class Trace:
+    """
+    Tiempos acumulados por etapa durante una solicitud
+
+    Puede recibir spans desde los hilos de OCR (con el contexto copiado),
+    por eso las actualizaciones van con lock.
+    """
+    def __init__(self):
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float) -> None:
+        with self._lock:
+            stage = self.stages.get(name)
+            if stage is None:
+                self.stages[name] = [seconds, 1]
+            else:
+                stage[0] += seconds
+                stage[1] += 1
+
+    def merge(self, timings) -> None:
+        """
+        Agrega tiempos de otra traza (p.ej. los devueltos por un worker)
+
+        Args:
+            timings (dict): Etapa -> StageTiming
+        """
+        with self._lock:
+            for name, timing in timings.items():
+                stage = self.stages.setdefault(name, [0.0, 0])
+                stage[0] += timing.seconds
+                stage[1] += timing.count
+
+    def as_dict(self) -> Dict[str, dict]:
+        """
+        Returns:
+            dict: Etapa -> {"seconds": total, "count": veces}
+        """
+        with self._lock:
+            return {
+                name: {"seconds": round(seconds, 6), "count": count}
+                for name, (seconds, count) in self.stages.items()
+            }
+
+@contextmanager
+def trace():
+    """
+    Abre una traza para la solicitud o tarea actual
+
+    Yields:
+        Trace: Traza que reciben los spans ejecutados dentro del bloque
+    """
+    current = Trace()
+    token = _current_trace.set(current)
+    try:
+        yield current
+    finally:
+        _current_trace.reset(token)
+
+def current_trace():
+    """
+    Returns:
+        Trace: Traza activa en el contexto actual o None
+    """
+    return _current_trace.get()
+
+def start_trace() -> Trace:
+    """
+    Abre una traza para la tarea asyncio actual sin cerrarla
+
+    Cada solicitud corre en su propia tarea con una copia del contexto, así
+    que la traza se descarta sola al terminar la solicitud.
+
+    Returns:
+        Trace: Traza de la solicitud
+    """
+    current = Trace()
+    _current_trace.set(current)
+    return current
+
+class _Span:
+    """Mide una etapa; se usa como context manager o como decorador"""
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        observe_histogram("scraper_stage_seconds", elapsed, {"stage": self.name})
+        current = _current_trace.get()
+        if current is not None:
+            current.add(self.name, elapsed)
+        return False
+
+    def __call__(self, func):
+        name = self.name
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _Span(name):
+                return func(*args, **kwargs)
+        return wrapper
+
+class _NoopSpan:
+    """Span vacío usado cuando la medición está desactivada"""
+    __slots__ = ("name",)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def __call__(self, func):
+        return _Span(self.name)(func)
+
+# Un span vacío por etapa (sin estado), reutilizado mientras la medición está desactivada
+_noop_spans = {}
+
+def span(name: str):
+    """
+    Mide el tiempo de una etapa del pipeline
+
+    Registra la duración en el histograma scraper_stage_seconds y en la traza
+    activa, si la hay. Uso:
+
+        with span("ocr"):
+            ...
+
+        @span("regex")
+        def extract(...):
+            ...
+
+    Args:
+        name: Nombre de la etapa (valor de la etiqueta "stage")
+
+    Returns:
+        Context manager / decorador de la etapa
+    """
+    if not _enabled:
+        noop = _noop_spans.get(name)
+        if noop is None:
+            noop = _noop_spans[name] = _NoopSpan(name)
+        return noop
+    return _Span(name)
\ No newline at end of file
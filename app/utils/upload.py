@@ -0,0 +1,256 @@
+import asyncio
+import hashlib
+import logging
+import mmap
+import os
+import re
+import tempfile
+import zipfile
+from typing import List, Optional
+
+from fastapi import UploadFile
+
+logger = logging.getLogger(__name__)
+
+# Tamaño de los bloques leídos del archivo subido
+CHUNK_SIZE = 64 * 1024
+
+# El encabezado %PDF- puede ir precedido de basura en los primeros 1024 bytes
+PDF_MAGIC = b"%PDF-"
+PDF_MAGIC_WINDOW = 1024
+
+# Archivos ZIP aceptados por la ruta de lotes
+ZIP_CONTENT_TYPES = ("application/zip", "application/x-zip-compressed")
+
+# Objetos de página visibles sin descomprimir (no cuenta los que están en object streams)
+PAGE_OBJECT_PATTERN = re.compile(rb"/Type\s*/Page(?![a-zA-Z])")
+
+class UploadRejectedError(Exception):
+    """Se lanza cuando el archivo subido no cumple los límites de ingesta"""
+    def __init__(self, status_code, message, reason):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+        self.reason = reason
+
+class PDFUpload:
+    """
+    PDF recibido, en memoria o volcado a un archivo temporal
+
+    `source` es lo que se entrega a PyMuPDF: el bytearray leído (sin copias
+    adicionales) o la ruta del archivo temporal para documentos grandes.
+    """
+    def __init__(self, data: Optional[bytearray], path: Optional[str], size: int, sha256: str):
+        self.data = data
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+
+    @property
+    def source(self):
+        """Contenido (bytearray) o ruta del PDF"""
+        return self.path if self.path else self.data
+
+    def cleanup(self):
+        """Elimina el archivo temporal, si existe"""
+        if self.path:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+            self.path = None
+
+async def read_pdf_upload(file: UploadFile, max_size, max_pages, spool_threshold=0, spool_dir=None):
+    """
+    Lee un PDF subido por bloques aplicando los límites de ingesta
+
+    Valida el encabezado %PDF en el primer bloque, corta la lectura en cuanto
+    se supera max_size y calcula el SHA-256 mientras lee. Si spool_threshold
+    es mayor que cero y el archivo lo supera, el resto se escribe en un
+    archivo temporal bajo spool_dir en lugar de mantenerse en memoria.
+    Las escrituras en disco y el conteo de páginas corren fuera del event loop.
+
+    Args:
+        file (UploadFile): Archivo recibido
+        max_size (int): Tamaño máximo en bytes
+        max_pages (int): Número máximo de páginas visibles permitido
+        spool_threshold (int): Tamaño a partir del cual se vuelca a disco (0 = nunca)
+        spool_dir (str): Directorio para archivos temporales
+
+    Returns:
+        PDFUpload: PDF leído
+
+    Raises:
+        UploadRejectedError: Si el archivo no es un PDF o excede los límites
+    """
+    loop = asyncio.get_running_loop()
+    digest = hashlib.sha256()
+    buffer = bytearray()
+    spool = None
+    size = 0
+
+    try:
+        while True:
+            chunk = await file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+
+            if size == 0 and PDF_MAGIC not in chunk[:PDF_MAGIC_WINDOW]:
+                raise UploadRejectedError(400, "El archivo no es un PDF válido.", "invalid_pdf_header")
+
+            size += len(chunk)
+            if size > max_size:
+                raise UploadRejectedError(
+                    413,
+                    f"El archivo excede el tamaño máximo permitido de {max_size} bytes.",
+                    "file_too_large"
+                )
+
+            digest.update(chunk)
+            if spool is None and spool_threshold and size > spool_threshold:
+                spool = await loop.run_in_executor(None, _open_spool, spool_dir)
+                await loop.run_in_executor(None, spool.write, buffer)
+                buffer = None
+
+            if spool is not None:
+                await loop.run_in_executor(None, spool.write, chunk)
+            else:
+                buffer += chunk
+
+        if size == 0:
+            raise UploadRejectedError(400, "El archivo está vacío.", "empty_file")
+
+        if spool is not None:
+            await loop.run_in_executor(None, spool.close)
+            upload = PDFUpload(data=None, path=spool.name, size=size, sha256=digest.hexdigest())
+        else:
+            upload = PDFUpload(data=buffer, path=None, size=size, sha256=digest.hexdigest())
+
+    except BaseException:
+        if spool is not None:
+            spool.close()
+            os.remove(spool.name)
+        raise
+
+    # Recorre todo el archivo (en memoria o mapeado desde disco)
+    await loop.run_in_executor(None, _check_page_count, upload, max_pages)
+    return upload
+
+def _open_spool(spool_dir):
+    """Crea el archivo temporal al que se vuelca una subida grande"""
+    return tempfile.NamedTemporaryFile(dir=spool_dir, prefix="csf-", suffix=".pdf", delete=False)
+
+def is_zip_upload(file: UploadFile) -> bool:
+    """Indica si el archivo subido es un ZIP (por tipo de contenido o extensión)"""
+    return file.content_type in ZIP_CONTENT_TYPES or (file.filename or "").lower().endswith(".zip")
+
+def list_zip_pdfs(fileobj, max_entries, max_size):
+    """
+    Abre un ZIP subido y lista los PDF que contiene
+
+    Solo se leen los encabezados del archivo; cada PDF se descomprime después
+    con read_zip_entry, cuando le toca procesarse.
+
+    Args:
+        fileobj: Archivo binario con el ZIP (p.ej. UploadFile.file)
+        max_entries (int): Número máximo de PDF admitidos
+        max_size (int): Tamaño máximo descomprimido de cada PDF
+
+    Returns:
+        tuple: (zipfile.ZipFile abierto, lista de ZipInfo de los PDF)
+
+    Raises:
+        UploadRejectedError: Si no es un ZIP válido o tiene demasiados PDF
+    """
+    try:
+        archive = zipfile.ZipFile(fileobj)
+    except zipfile.BadZipFile:
+        raise UploadRejectedError(400, "El archivo no es un ZIP válido.", "invalid_zip")
+
+    entries: List[zipfile.ZipInfo] = [
+        info for info in archive.infolist()
+        if not info.is_dir()
+        and info.filename.lower().endswith(".pdf")
+        and not os.path.basename(info.filename).startswith("._")
+    ]
+    if len(entries) > max_entries:
+        archive.close()
+        raise UploadRejectedError(
+            422,
+            f"El ZIP contiene demasiados PDF ({len(entries)}); el máximo es {max_entries}.",
+            "too_many_files"
+        )
+    return archive, entries
+
+def read_zip_entry(archive: zipfile.ZipFile, info: zipfile.ZipInfo, max_size, max_pages) -> PDFUpload:
+    """
+    Descomprime un PDF de un ZIP aplicando los mismos límites que a una subida
+
+    El tamaño se controla sobre los bytes realmente descomprimidos, no solo
+    sobre el declarado en el encabezado del ZIP.
+
+    Args:
+        archive (zipfile.ZipFile): ZIP abierto con list_zip_pdfs
+        info (zipfile.ZipInfo): Entrada del PDF
+        max_size (int): Tamaño máximo en bytes
+        max_pages (int): Número máximo de páginas visibles permitido
+
+    Returns:
+        PDFUpload: PDF leído en memoria
+
+    Raises:
+        UploadRejectedError: Si la entrada no es un PDF o excede los límites
+    """
+    too_large = UploadRejectedError(
+        413,
+        f"El archivo excede el tamaño máximo permitido de {max_size} bytes.",
+        "file_too_large"
+    )
+    if info.file_size > max_size:
+        raise too_large
+
+    digest = hashlib.sha256()
+    buffer = bytearray()
+    with archive.open(info) as entry:
+        while True:
+            chunk = entry.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            if not buffer and PDF_MAGIC not in chunk[:PDF_MAGIC_WINDOW]:
+                raise UploadRejectedError(400, "El archivo no es un PDF válido.", "invalid_pdf_header")
+            if len(buffer) + len(chunk) > max_size:
+                raise too_large
+            digest.update(chunk)
+            buffer += chunk
+
+    if not buffer:
+        raise UploadRejectedError(400, "El archivo está vacío.", "empty_file")
+
+    upload = PDFUpload(data=buffer, path=None, size=len(buffer), sha256=digest.hexdigest())
+    _check_page_count(upload, max_pages)
+    return upload
+
+def _check_page_count(upload: PDFUpload, max_pages):
+    """Rechaza el PDF si tiene más páginas visibles que max_pages"""
+    page_count = _count_page_objects(upload)
+    if page_count > max_pages:
+        upload.cleanup()
+        raise UploadRejectedError(
+            422,
+            f"El documento tiene demasiadas páginas ({page_count}); el máximo es {max_pages}.",
+            "too_many_pages"
+        )
+
+def _count_page_objects(upload: PDFUpload):
+    """
+    Cuenta los objetos /Type /Page visibles en el PDF sin parsearlo
+
+    Es una cota inferior barata para rechazar documentos claramente
+    demasiado largos; PDFProcessor aplica además el límite real de páginas.
+    """
+    if upload.path is None:
+        return len(PAGE_OBJECT_PATTERN.findall(upload.data))
+
+    with open(upload.path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return len(PAGE_OBJECT_PATTERN.findall(mapped))
@@ -0,0 +1,370 @@
+"""
+Genera constancias de situación fiscal sintéticas con PyMuPDF
+
+Cada documento sigue la distribución de la constancia del SAT (la misma de
+SAT_CSF_TEMPLATE) con datos aleatorios pero válidos, y se acompaña de los
+valores esperados para medir la exactitud de la extracción.
+
+Uso:
+    python -m benchmarks.csf_corpus --out /tmp/csf-corpus --docs 3
+"""
+import argparse
+import json
+import os
+import random
+
+import cv2
+import fitz  # PyMuPDF
+import numpy as np
+
+from app.services.csf_template import SAT_CSF_TEMPLATE
+from app.services.validator import rfc_check_digit
+
+PAGE_WIDTH, PAGE_HEIGHT = 612, 792
+
+# Variantes del corpus: cómo se entrega el documento
+#   texto:       PDF generado por el SAT, con capa de texto y el QR incrustado
+#   imagen:      escaneo limpio, sin capa de texto
+#   rotado:      escaneo guardado de lado (/Rotate 90) y ligeramente inclinado
+#   ruido:       escaneo con sombra, motas y menor resolución
+#   multipagina: capa de texto en tres páginas, los regímenes en la segunda
+VARIANTS = ("texto", "imagen", "rotado", "ruido", "multipagina")
+PERSONAS = ("fisica", "moral")
+
+# Campos de CSFData que se comparan con lo esperado. El domicilio no se
+# compara: su formato depende del método (por posición o por patrones).
+ACCURACY_FIELDS = ("rfc", "nombre", "regimen_fiscal", "codigo_postal", "id_cif")
+
+SAT_QR_URL = "https://siat.sat.gob.mx/app/qr/faces/pages/mobile/validadorqr.jsf?D1=10&D2=1&D3={id_cif}_{rfc}"
+
+FIRST_NAMES = ["JUAN CARLOS", "MARIA FERNANDA", "JOSE LUIS", "ANA SOFIA", "MIGUEL ANGEL", "GUADALUPE", "ROBERTO", "LAURA ELENA"]
+LAST_NAMES = ["GOMEZ", "HERNANDEZ", "MARTINEZ", "LOPEZ", "RAMIREZ", "TORRES", "FLORES", "DELGADO", "CASTILLO", "MORALES"]
+COMPANY_WORDS = ["COMERCIALIZADORA", "SERVICIOS", "GRUPO", "DISTRIBUIDORA", "CONSTRUCTORA", "INDUSTRIAS", "TECNOLOGIA"]
+COMPANY_NAMES = ["DEL NORTE", "INTEGRALES", "PACIFICO", "ALFA", "MERIDIANO", "DEL BAJIO", "CENTRAL"]
+REGIMENES = {
+    "fisica": [
+        ("605", "Sueldos y Salarios e Ingresos Asimilados a Salarios"),
+        ("612", "Personas Físicas con Actividades Empresariales y Profesionales"),
+        ("626", "Régimen Simplificado de Confianza"),
+    ],
+    "moral": [
+        ("601", "General de Ley Personas Morales"),
+        ("603", "Personas Morales con Fines no Lucrativos"),
+    ],
+}
+STREETS = [("AVENIDA", "PASEO DE LA REFORMA"), ("CALLE", "MADERO"), ("AVENIDA", "INSURGENTES SUR"), ("CALLE", "HIDALGO")]
+COLONIAS = [("JUAREZ", "CUAUHTEMOC", "CIUDAD DE MEXICO"), ("CENTRO", "MONTERREY", "NUEVO LEON"),
+            ("AMERICANA", "GUADALAJARA", "JALISCO"), ("DEL VALLE", "BENITO JUAREZ", "CIUDAD DE MEXICO")]
+
+def random_rfc(rng, persona):
+    """Genera un RFC con formato y dígito verificador válidos"""
+    letters = "ABCDEFGHIJKLMNOPRSTUVWXYZ"
+    prefix = "".join(rng.choice(letters) for _ in range(4 if persona == "fisica" else 3))
+    date = f"{rng.randint(50, 99):02d}{rng.randint(1, 12):02d}{rng.randint(1, 28):02d}"
+    homoclave = "".join(rng.choice(letters + "123456789") for _ in range(2))
+    base = prefix + date + homoclave
+    return base + rfc_check_digit(base)
+
+class CSFSample:
+    """Constancia sintética y los valores que se esperan de su extracción"""
+    __slots__ = ("name", "variant", "persona", "content", "pages", "expected")
+
+    def __init__(self, name, variant, persona, content, pages, expected):
+        self.name = name
+        self.variant = variant
+        self.persona = persona
+        # Contenido del PDF
+        self.content = content
+        self.pages = pages
+        # Campo de ACCURACY_FIELDS -> valor esperado
+        self.expected = expected
+
+def random_taxpayer(rng, persona):
+    """
+    Genera los datos de un contribuyente
+
+    Args:
+        rng (random.Random): Generador aleatorio
+        persona (str): "fisica" o "moral"
+
+    Returns:
+        dict: Datos del contribuyente (incluye los campos de ACCURACY_FIELDS)
+    """
+    codigo, descripcion = rng.choice(REGIMENES[persona])
+    tipo_vialidad, vialidad = rng.choice(STREETS)
+    colonia, municipio, entidad = rng.choice(COLONIAS)
+    data = {
+        "rfc": random_rfc(rng, persona),
+        "id_cif": "".join(rng.choice("0123456789") for _ in range(11)),
+        "regimen_fiscal": codigo,
+        "regimen_descripcion": descripcion,
+        "codigo_postal": f"{rng.randint(1000, 99999):05d}",
+        "tipo_vialidad": tipo_vialidad,
+        "vialidad": vialidad,
+        "numero_exterior": str(rng.randint(1, 999)),
+        "colonia": colonia,
+        "municipio": municipio,
+        "entidad": entidad,
+    }
+    if persona == "fisica":
+        data["nombres"] = rng.choice(FIRST_NAMES)
+        data["primer_apellido"], data["segundo_apellido"] = rng.sample(LAST_NAMES, 2)
+        data["nombre"] = f"{data['nombres']} {data['primer_apellido']} {data['segundo_apellido']}"
+    else:
+        data["nombre"] = f"{rng.choice(COMPANY_WORDS)} {rng.choice(COMPANY_NAMES)} SA DE CV"
+    return data
+
+def qr_png(text):
+    """Imagen PNG del QR, recortada al símbolo y ampliada a 8 px por módulo"""
+    symbol = cv2.QRCodeEncoder.create().encode(text)
+    ys, xs = np.nonzero(symbol == 0)
+    symbol = symbol[ys.min():ys.max() + 1, xs.min():xs.max() + 1]
+    symbol = cv2.resize(symbol, None, fx=8, fy=8, interpolation=cv2.INTER_NEAREST)
+    return cv2.imencode(".png", symbol)[1].tobytes()
+
+def draw_first_page(page, data, persona, with_regimenes=True):
+    """
+    Dibuja la primera página de la constancia en las posiciones de SAT_CSF_TEMPLATE
+
+    Args:
+        page (fitz.Page): Página carta vacía
+        data (dict): Datos del contribuyente
+        persona (str): "fisica" o "moral"
+        with_regimenes (bool): Incluir la tabla de regímenes al pie
+    """
+    def put(fx, fy, text, size=9):
+        page.insert_text((fx * PAGE_WIDTH, fy * PAGE_HEIGHT), text, fontsize=size)
+
+    put(0.30, 0.07, "CONSTANCIA DE SITUACIÓN FISCAL", 13)
+    put(0.30, 0.10, "CÉDULA DE IDENTIFICACIÓN FISCAL", 11)
+    qr_box = SAT_CSF_TEMPLATE.qr_box
+    page.insert_image(
+        fitz.Rect(qr_box[0] * PAGE_WIDTH, qr_box[1] * PAGE_HEIGHT, qr_box[2] * PAGE_WIDTH, qr_box[3] * PAGE_HEIGHT),
+        stream=qr_png(SAT_QR_URL.format(id_cif=data["id_cif"], rfc=data["rfc"]))
+    )
+    put(0.07, 0.285, data["rfc"], 14)
+    put(0.07, 0.32, f"idCIF: {data['id_cif']}")
+
+    put(0.05, 0.395, "Datos de Identificación del Contribuyente:", 11)
+    if persona == "fisica":
+        lines = [
+            ("RFC:", data["rfc"]),
+            ("CURP:", f"{data['rfc'][:10]}HDFRRN09"),
+            ("Nombre (s):", data["nombres"]),
+            ("Primer Apellido:", data["primer_apellido"]),
+            ("Segundo Apellido:", data["segundo_apellido"]),
+        ]
+    else:
+        lines = [
+            ("RFC:", data["rfc"]),
+            ("Denominación/Razón Social:", data["nombre"]),
+            ("Régimen Capital:", "SOCIEDAD ANONIMA DE CAPITAL VARIABLE"),
+            ("Fecha inicio de operaciones:", "01 DE ENERO DE 2010"),
+        ]
+    for index, (label, value) in enumerate(lines):
+        put(0.06, 0.43 + index * 0.03, label)
+        put(0.30, 0.43 + index * 0.03, value)
+
+    put(0.05, 0.595, "Datos del domicilio registrado", 11)
+    domicilio = [
+        ("Código Postal:", data["codigo_postal"]),
+        ("Tipo de Vialidad:", data["tipo_vialidad"]),
+        ("Nombre de Vialidad:", data["vialidad"]),
+        ("Número Exterior:", data["numero_exterior"]),
+        ("Nombre de la Colonia:", data["colonia"]),
+        ("Nombre del Municipio o Demarcación Territorial:", data["municipio"]),
+        ("Nombre de la Entidad Federativa:", data["entidad"]),
+    ]
+    for index, (label, value) in enumerate(domicilio):
+        # El valor del código postal queda dentro de la región codigo_postal de la plantilla
+        put(0.06, 0.62 + index * 0.025, label)
+        put(0.62 if len(label) > 30 else 0.26, 0.62 + index * 0.025, value)
+
+    if with_regimenes:
+        draw_regimenes(page, data, 0.84)
+
+def draw_regimenes(page, data, top):
+    """Dibuja la tabla de regímenes a partir de la fracción top de la página"""
+    def put(fx, fy, text, size=9):
+        page.insert_text((fx * PAGE_WIDTH, fy * PAGE_HEIGHT), text, fontsize=size)
+
+    put(0.05, top, "Regímenes:", 11)
+    put(0.06, top + 0.03, "Régimen")
+    put(0.70, top + 0.03, "Fecha Inicio")
+    put(0.84, top + 0.03, "Fecha Fin")
+    put(0.06, top + 0.055, f"{data['regimen_fiscal']} {data['regimen_descripcion']}", 8)
+    put(0.70, top + 0.055, "01/01/2010", 8)
+
+def draw_filler_page(page, title, rows):
+    """Página de actividades u obligaciones sin datos que se extraigan"""
+    page.insert_text((0.05 * PAGE_WIDTH, 0.08 * PAGE_HEIGHT), title, fontsize=11)
+    for index in range(rows):
+        page.insert_text(
+            (0.06 * PAGE_WIDTH, (0.12 + index * 0.03) * PAGE_HEIGHT),
+            f"{index + 1} Declaración de proveedores de IVA  Mensual  A más tardar el día 17",
+            fontsize=8
+        )
+
+def build_text_document(data, persona, multipage=False):
+    """
+    Constancia con capa de texto, como la descarga del portal del SAT
+
+    Returns:
+        fitz.Document: Documento generado
+    """
+    document = fitz.open()
+    draw_first_page(document.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT), data, persona, with_regimenes=not multipage)
+    if multipage:
+        page = document.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+        draw_filler_page(page, "Actividades Económicas:", 6)
+        draw_regimenes(page, data, 0.40)
+        draw_filler_page(document.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT), "Obligaciones:", 20)
+    return document
+
+def rasterize(document, dpi=200, skew=0.0, noise=0.0, rotate=0, seed=0):
+    """
+    Convierte un documento en su escaneo: una imagen por página, sin capa de texto
+
+    Args:
+        document (fitz.Document): Documento con capa de texto
+        dpi (int): Resolución del escaneo
+        skew (float): Inclinación en grados
+        noise (float): Fracción de píxeles con motas; además oscurece el papel hacia la derecha
+        rotate (int): Rotación con que se guarda la imagen; la página la compensa con /Rotate
+        seed (int): Semilla del ruido
+
+    Returns:
+        fitz.Document: Documento escaneado
+    """
+    rng = np.random.default_rng(seed)
+    scanned = fitz.open()
+    zoom = dpi / 72
+    for source in document:
+        pix = source.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY, alpha=False)
+        gray = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width)
+        if skew or noise:
+            gray = gray.astype(np.float32)
+            if skew:
+                rotation = cv2.getRotationMatrix2D((pix.width / 2, pix.height / 2), skew, 1.0)
+                gray = cv2.warpAffine(gray, rotation, (pix.width, pix.height), borderValue=255)
+            if noise:
+                gray *= np.linspace(1.0, 0.75, pix.width, dtype=np.float32)[None, :]
+                gray[rng.random(gray.shape) < noise] = 0
+            gray = np.clip(gray, 0, 255).astype(np.uint8)
+        if rotate:
+            # La imagen queda de lado y /Rotate la muestra derecha
+            gray = np.rot90(gray, k=rotate // 90)
+        png = cv2.imencode(".png", np.ascontiguousarray(gray))[1].tobytes()
+
+        if rotate % 180:
+            page = scanned.new_page(width=source.rect.height, height=source.rect.width)
+        else:
+            page = scanned.new_page(width=source.rect.width, height=source.rect.height)
+        page.insert_image(page.rect, stream=png)
+        page.set_rotation(rotate)
+    return scanned
+
+def build_sample(variant, persona, seed):
+    """
+    Genera una constancia de una variante y persona
+
+    Args:
+        variant (str): Una de VARIANTS
+        persona (str): Una de PERSONAS
+        seed (int): Semilla de los datos
+
+    Returns:
+        CSFSample: Documento y valores esperados
+    """
+    rng = random.Random(f"{variant}:{persona}:{seed}")
+    data = random_taxpayer(rng, persona)
+    document = build_text_document(data, persona, multipage=variant == "multipagina")
+
+    if variant == "imagen":
+        document = rasterize(document, dpi=200, seed=seed)
+    elif variant == "rotado":
+        document = rasterize(document, dpi=200, skew=1.5, rotate=90, seed=seed)
+    elif variant == "ruido":
+        document = rasterize(document, dpi=150, noise=0.002, seed=seed)
+
+    content = document.tobytes(garbage=3, deflate=True)
+    pages = document.page_count
+    document.close()
+    return CSFSample(
+        name=f"{variant}-{persona}-{seed:03d}",
+        variant=variant,
+        persona=persona,
+        content=content,
+        pages=pages,
+        expected={field: data[field] for field in ACCURACY_FIELDS}
+    )
+
+def build_corpus(variants=VARIANTS, personas=PERSONAS, docs=1, seed=0):
+    """
+    Genera docs constancias por cada combinación de variante y persona
+
+    Returns:
+        list: CSFSample en orden de variante, persona y semilla
+    """
+    return [
+        build_sample(variant, persona, seed + index)
+        for variant in variants
+        for persona in personas
+        for index in range(docs)
+    ]
+
+def save_corpus(samples, directory):
+    """
+    Guarda los PDF y un manifest.json con la variante, páginas y valores esperados
+
+    Args:
+        samples (list): CSFSample a guardar
+        directory (str): Carpeta de salida (se crea si no existe)
+    """
+    os.makedirs(directory, exist_ok=True)
+    manifest = []
+    for sample in samples:
+        with open(os.path.join(directory, f"{sample.name}.pdf"), "wb") as pdf_file:
+            pdf_file.write(sample.content)
+        manifest.append({
+            "name": sample.name,
+            "variant": sample.variant,
+            "persona": sample.persona,
+            "pages": sample.pages,
+            "expected": sample.expected,
+        })
+    with open(os.path.join(directory, "manifest.json"), "w", encoding="utf-8") as manifest_file:
+        json.dump(manifest, manifest_file, ensure_ascii=False, indent=2)
+
+def load_corpus(directory):
+    """
+    Lee un corpus guardado con save_corpus
+
+    Returns:
+        list: CSFSample del manifest
+    """
+    with open(os.path.join(directory, "manifest.json"), encoding="utf-8") as manifest_file:
+        manifest = json.load(manifest_file)
+    samples = []
+    for entry in manifest:
+        with open(os.path.join(directory, f"{entry['name']}.pdf"), "rb") as pdf_file:
+            content = pdf_file.read()
+        samples.append(CSFSample(entry["name"], entry["variant"], entry["persona"], content, entry["pages"], entry["expected"]))
+    return samples
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--docs", type=int, default=3, help="documentos por variante y persona")
+    parser.add_argument("--variants", default=",".join(VARIANTS))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    variants = [variant.strip() for variant in args.variants.split(",") if variant.strip()]
+    samples = build_corpus(variants, PERSONAS, args.docs, args.seed)
+    save_corpus(samples, args.out)
+    total_size = sum(len(sample.content) for sample in samples)
+    print(f"{len(samples)} documentos en {args.out} ({total_size / 1024:.0f} KB)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Microbenchmark de DataExtractor frente a la implementación anterior
+
+Uso:
+    python -m benchmarks.data_extractor --repeat 200
+"""
+import argparse
+import logging
+import random
+import time
+
+from app.services.data_extractor import DataExtractor
+from benchmarks.legacy_data_extractor import LegacyDataExtractor
+
+TEXT_LAYER_SAMPLE = """CONSTANCIA DE SITUACIÓN FISCAL
+CÉDULA DE IDENTIFICACIÓN FISCAL
+RFC: GODE561231GR8
+Denominación/Razón Social: EMPRESA DEMO SA DE CV
+Régimen Capital: SOCIEDAD ANONIMA DE CAPITAL VARIABLE
+Datos del domicilio registrado
+Código Postal: 06600
+Domicilio Fiscal: AV REFORMA 222 COL JUAREZ CUAUHTEMOC
+Actividades Económicas:
+Regímenes:
+Régimen Fiscal: 601 General de Ley Personas Morales
+"""
+
+def build_ocr_sample(pages, seed=7):
+    """
+    Genera texto con el ruido típico de OCR: muchas líneas sin etiquetas y
+    las etiquetas de la CSF al final, lo que obliga a los patrones genéricos
+    a recorrer todo el texto
+
+    Args:
+        pages (int): Páginas de texto de relleno
+        seed (int): Semilla del generador aleatorio
+
+    Returns:
+        str: Texto de ejemplo
+    """
+    rng = random.Random(seed)
+    words = ["OBLIGACIONES", "declaracion", "anual", "ISR", "IVA", "periodo", "vigente", "SAT", "fecha", "de", "la"]
+    lines = []
+    for _ in range(pages * 60):
+        lines.append(" ".join(rng.choice(words) for _ in range(rng.randint(4, 12))))
+    return "\n".join(lines) + "\nREGÍMENES\n" + "\n".join(lines[:40]) + "\n" + TEXT_LAYER_SAMPLE.lower()
+
+def build_backtracking_sample(repeat):
+    """
+    Genera texto que provoca retroceso en los patrones de sección: muchas
+    etiquetas DOMICILIO sin terminador cercano y REGÍMENES sin códigos
+
+    Args:
+        repeat (int): Número de bloques repetidos
+
+    Returns:
+        str: Texto de ejemplo
+    """
+    block = "DOMICILIO " + "calle sin numero " * 30 + "\n"
+    return "REGÍMENES\n" + block * repeat + "sin codigos de regimen"
+
+def time_extractor(extractor, text, repeat):
+    """
+    Mide el tiempo medio de extract_from_text
+
+    Args:
+        extractor: Instancia con método extract_from_text
+        text (str): Texto de entrada
+        repeat (int): Número de repeticiones
+
+    Returns:
+        tuple: (segundos por llamada, CSFData)
+    """
+    result = extractor.extract_from_text(text)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        extractor.extract_from_text(text)
+    return (time.perf_counter() - start) / repeat, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--ocr-pages", type=int, default=20)
+    args = parser.parse_args()
+
+    # Los logs por patrón no forman parte de lo que se mide
+    logging.disable(logging.CRITICAL)
+
+    samples = {
+        "capa de texto": TEXT_LAYER_SAMPLE,
+        f"OCR {args.ocr_pages} págs": build_ocr_sample(args.ocr_pages),
+        "retroceso": build_backtracking_sample(args.ocr_pages * 10),
+    }
+
+    print(f"{'muestra':<16} {'anterior (ms)':>14} {'actual (ms)':>12} {'mejora':>8} {'iguales':>8}")
+    for name, text in samples.items():
+        legacy_time, legacy_result = time_extractor(LegacyDataExtractor(), text, args.repeat)
+        current_time, current_result = time_extractor(DataExtractor(), text, args.repeat)
+        same = legacy_result.dict() == current_result.dict()
+        print(
+            f"{name:<16} {legacy_time * 1000:>14.3f} {current_time * 1000:>12.3f} "
+            f"{legacy_time / current_time:>7.1f}x {str(same):>8}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""
+Benchmark de extracción sobre un corpus de constancias sintéticas
+
+Ejecuta ExtractionPipeline (configurado con las mismas variables de entorno
+que el servicio) sobre cada documento y reporta por variante: rendimiento,
+percentiles de latencia, tiempo por etapa, memoria máxima y exactitud por
+campo. Los resultados pueden guardarse como línea base y compararse con
+una ejecución posterior.
+
+Uso:
+    python -m benchmarks.extraction --docs 3 --repeat 2 --save-baseline /tmp/base.json
+    OCR_ROI_ENABLED=true python -m benchmarks.extraction --docs 3 --compare /tmp/base.json
+    python -m benchmarks.extraction --corpus /tmp/csf-corpus
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import resource
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmarks.csf_corpus import ACCURACY_FIELDS, PERSONAS, VARIANTS, build_corpus, load_corpus
+
+# Regresión tolerada al comparar con la línea base
+DEFAULT_LATENCY_TOLERANCE = 0.10  # fracción del p95
+DEFAULT_ACCURACY_TOLERANCE = 0.0  # puntos de exactitud
+
+def percentile(values, fraction):
+    """
+    Percentil con interpolación lineal entre los valores ordenados
+
+    Args:
+        values (list): Valores medidos
+        fraction (float): Percentil entre 0 y 1
+
+    Returns:
+        float: Valor del percentil (0.0 si no hay valores)
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+def peak_rss_mb():
+    """Memoria residente máxima del proceso en MB (ru_maxrss está en KB en Linux y en bytes en macOS)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def create_pipeline(early_exit=None):
+    """
+    Pipeline configurado como en el servicio (app.config.settings)
+
+    Args:
+        early_exit (bool, optional): Reemplaza EARLY_EXIT
+
+    Returns:
+        ExtractionPipeline: Pipeline de extracción
+    """
+    from app.api.dependencies import get_data_extractor, get_pdf_processor
+    from app.config import settings
+    from app.services.csf_template import SAT_CSF_TEMPLATE
+    from app.services.extraction_pipeline import ExtractionPipeline
+    from app.services.validator import FieldValidator
+
+    return ExtractionPipeline(
+        get_pdf_processor(),
+        get_data_extractor(),
+        early_exit=settings.EARLY_EXIT if early_exit is None else early_exit,
+        field_validator=FieldValidator() if settings.FIELD_VALIDATION else None,
+        field_template=SAT_CSF_TEMPLATE
+    )
+
+def field_matches(expected, actual):
+    """Compara un campo sin distinguir mayúsculas ni espacios repetidos"""
+    return " ".join(str(expected).upper().split()) == " ".join(str(actual or "").upper().split())
+
+def run_samples(samples, repeat, early_exit=None):
+    """
+    Extrae cada documento repeat veces y acumula tiempos y aciertos
+
+    La primera extracción (sin medir) calienta el motor de OCR y las cachés
+    de PyMuPDF. Se ejecuta en el proceso que llama; para aislar la memoria
+    por variante se usa desde run_variant en un proceso nuevo.
+
+    Args:
+        samples (list): CSFSample de una variante
+        repeat (int): Repeticiones por documento
+        early_exit (bool, optional): Reemplaza EARLY_EXIT
+
+    Returns:
+        dict: Resultados de la variante (ver summarize)
+    """
+    from app.utils import tracing
+
+    logging.disable(logging.CRITICAL)
+    tracing.configure(True)
+    pipeline = create_pipeline(early_exit)
+    pipeline.run(samples[0].content)
+
+    latencies = []
+    stages = defaultdict(float)
+    hits = defaultdict(int)
+    pages = 0
+    for _ in range(repeat):
+        for sample in samples:
+            start = time.perf_counter()
+            result = pipeline.run(sample.content)
+            latencies.append(time.perf_counter() - start)
+            pages += sample.pages
+
+            for name, timing in result.timings.items():
+                stages[name] += timing.seconds
+            data = result.data
+            for field in ACCURACY_FIELDS:
+                if data is not None and field_matches(sample.expected[field], getattr(data, field)):
+                    hits[field] += 1
+
+    runs = len(latencies)
+    return {
+        "documents": runs,
+        "pages": pages,
+        "latencies": latencies,
+        "stages": {name: seconds / runs for name, seconds in stages.items()},
+        "accuracy": {field: hits[field] / runs for field in ACCURACY_FIELDS},
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def run_variant(samples, repeat, early_exit=None, isolate=True):
+    """
+    Mide una variante, en un proceso nuevo si isolate (memoria máxima propia)
+
+    Returns:
+        dict: Resultados de la variante
+    """
+    if not isolate:
+        return run_samples(samples, repeat, early_exit)
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        return pool.submit(run_samples, samples, repeat, early_exit).result()
+
+def summarize(results):
+    """
+    Reduce los resultados de una variante a las cifras que se reportan y guardan
+
+    Returns:
+        dict: Rendimiento, percentiles (ms), etapas (ms por documento), memoria y exactitud
+    """
+    latencies = results["latencies"]
+    total = sum(latencies)
+    return {
+        "documents": results["documents"],
+        "docs_per_s": results["documents"] / total if total else 0.0,
+        "pages_per_s": results["pages"] / total if total else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "max_ms": max(latencies) * 1000,
+        "stages_ms": {name: seconds * 1000 for name, seconds in sorted(results["stages"].items())},
+        "peak_rss_mb": results["peak_rss_mb"],
+        "accuracy": results["accuracy"],
+    }
+
+def current_configuration():
+    """Configuración que afecta la extracción, para identificar la línea base"""
+    from app.config import settings
+
+    names = [
+        "OCR_BACKEND", "TESSERACT_LANG", "OCR_DPI", "OCR_LOW_DPI", "OCR_MIN_CONFIDENCE", "OCR_ROI_ENABLED",
+        "OCR_ENHANCE_STEPS", "OCR_PAGE_WORKERS", "QR_FAST_PATH", "EARLY_EXIT", "LAYOUT_EXTRACTION",
+        "FIELD_VALIDATION", "OCR_REOCR_DPI",
+    ]
+    return {name: getattr(settings, name) for name in names}
+
+def print_report(summaries):
+    """Imprime las tablas de latencia, etapas y exactitud por variante"""
+    print(f"{'variante':<12} {'docs':>5} {'docs/s':>7} {'págs/s':>7} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'RSS MB':>7}")
+    for name, summary in summaries.items():
+        print(f"{name:<12} {summary['documents']:>5} {summary['docs_per_s']:>7.2f} {summary['pages_per_s']:>7.2f} "
+              f"{summary['p50_ms']:>8.1f} {summary['p95_ms']:>8.1f} {summary['p99_ms']:>8.1f} "
+              f"{summary['peak_rss_mb']:>7.0f}")
+
+    stage_names = sorted({stage for summary in summaries.values() for stage in summary["stages_ms"]})
+    print()
+    print(f"{'ms/doc':<12} " + " ".join(f"{stage[:15]:>15}" for stage in stage_names))
+    for name, summary in summaries.items():
+        print(f"{name:<12} " + " ".join(f"{summary['stages_ms'].get(stage, 0.0):>15.1f}" for stage in stage_names))
+
+    print()
+    print(f"{'exactitud':<12} " + " ".join(f"{field:>14}" for field in ACCURACY_FIELDS))
+    for name, summary in summaries.items():
+        print(f"{name:<12} " + " ".join(f"{summary['accuracy'][field]:>14.2f}" for field in ACCURACY_FIELDS))
+
+def compare(summaries, baseline, latency_tolerance, accuracy_tolerance):
+    """
+    Compara con una línea base e imprime las diferencias
+
+    Args:
+        summaries (dict): Variante -> resumen actual
+        baseline (dict): Contenido de un archivo guardado con --save-baseline
+        latency_tolerance (float): Aumento relativo del p95 tolerado
+        accuracy_tolerance (float): Caída de exactitud tolerada por campo
+
+    Returns:
+        list: Descripción de cada regresión encontrada
+    """
+    regressions = []
+    previous_variants = baseline.get("variants", {})
+    changed = {
+        name: (value, baseline.get("configuration", {}).get(name))
+        for name, value in current_configuration().items()
+        if baseline.get("configuration", {}).get(name) != value
+    }
+    if changed:
+        print("configuración distinta a la línea base: "
+              + ", ".join(f"{name}={value} (antes {before})" for name, (value, before) in changed.items()))
+
+    print(f"{'variante':<12} {'p95 antes':>10} {'p95 ahora':>10} {'cambio':>8}  exactitud")
+    for name, summary in summaries.items():
+        previous = previous_variants.get(name)
+        if previous is None:
+            print(f"{name:<12} sin línea base")
+            continue
+        change = (summary["p95_ms"] - previous["p95_ms"]) / previous["p95_ms"] if previous["p95_ms"] else 0.0
+        accuracy_changes = []
+        for field in ACCURACY_FIELDS:
+            delta = summary["accuracy"][field] - previous["accuracy"].get(field, 0.0)
+            if abs(delta) > 1e-9:
+                accuracy_changes.append(f"{field} {delta:+.2f}")
+            if delta < -accuracy_tolerance - 1e-9:
+                regressions.append(f"{name}: exactitud de {field} {delta:+.2f}")
+        if change > latency_tolerance:
+            regressions.append(f"{name}: p95 {change:+.1%}")
+        print(f"{name:<12} {previous['p95_ms']:>10.1f} {summary['p95_ms']:>10.1f} {change:>+8.1%}  "
+              f"{', '.join(accuracy_changes) or 'igual'}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--corpus", default="", help="carpeta de benchmarks.csf_corpus (vacío = generar)")
+    parser.add_argument("--docs", type=int, default=2, help="documentos generados por variante y persona")
+    parser.add_argument("--variants", default=",".join(VARIANTS))
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-early-exit", action="store_true", help="procesar todas las páginas")
+    parser.add_argument("--no-isolate", action="store_true", help="todas las variantes en este proceso")
+    parser.add_argument("--save-baseline", default="")
+    parser.add_argument("--compare", default="")
+    parser.add_argument("--latency-tolerance", type=float, default=DEFAULT_LATENCY_TOLERANCE)
+    parser.add_argument("--accuracy-tolerance", type=float, default=DEFAULT_ACCURACY_TOLERANCE)
+    args = parser.parse_args()
+
+    variants = [variant.strip() for variant in args.variants.split(",") if variant.strip()]
+    if args.corpus:
+        samples = [sample for sample in load_corpus(args.corpus) if sample.variant in variants]
+    else:
+        samples = build_corpus(variants, PERSONAS, args.docs, args.seed)
+
+    by_variant = defaultdict(list)
+    for sample in samples:
+        by_variant[sample.variant].append(sample)
+
+    early_exit = False if args.no_early_exit else None
+    summaries = {}
+    for variant, variant_samples in by_variant.items():
+        results = run_variant(variant_samples, args.repeat, early_exit, isolate=not args.no_isolate)
+        summaries[variant] = summarize(results)
+
+    print(f"configuración: {', '.join(f'{name}={value}' for name, value in current_configuration().items())}")
+    print_report(summaries)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as baseline_file:
+            json.dump({"configuration": current_configuration(), "variants": summaries}, baseline_file, indent=2)
+        print(f"\nlínea base guardada en {args.save_baseline}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+        print()
+        regressions = compare(summaries, baseline, args.latency_tolerance, args.accuracy_tolerance)
+        if regressions:
+            print("\nregresiones:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
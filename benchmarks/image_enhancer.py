@@ -0,0 +1,127 @@
+"""
+Compara los pasos de mejora de imagen: costo propio, píxeles y OCR resultante
+
+Uso:
+    python -m benchmarks.image_enhancer --dpi 300 --skew 1.5 --noise 0.002 --repeat 3
+"""
+import argparse
+import difflib
+import statistics
+import time
+
+import cv2
+import fitz  # PyMuPDF
+import numpy as np
+
+from app.services.image_enhancer import DEFAULT_ENHANCE_STEPS, ENHANCE_STEPS, ImageEnhancer
+from app.services.pdf_processor import create_ocr_backend
+
+SAMPLE_LINES = [
+    "CONSTANCIA DE SITUACION FISCAL",
+    "RFC: GODE561231GR8",
+    "Denominacion/Razon Social: EMPRESA DEMO SA DE CV",
+    "Regimen Fiscal: 601 General de Ley Personas Morales",
+    "Codigo Postal: 06600",
+    "Nombre de Vialidad: PASEO DE LA REFORMA",
+    "Nombre de la Colonia: JUAREZ",
+]
+
+def build_scan(dpi, skew, noise, seed=0):
+    """
+    Simula el escaneo de una página de CSF: texto inclinado, iluminación
+    irregular y puntos de ruido
+
+    Args:
+        dpi (int): Resolución del escaneo
+        skew (float): Inclinación en grados
+        noise (float): Fracción de píxeles con ruido
+        seed (int): Semilla del ruido
+
+    Returns:
+        fitz.Pixmap: Pixmap en escala de grises, como lo entrega el render
+    """
+    document = fitz.open()
+    page = document.new_page()
+    y = 120
+    for line in SAMPLE_LINES:
+        page.insert_text((90, y), line, fontsize=10)
+        y += 22
+    zoom = dpi / 72
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY, alpha=False)
+    gray = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width).astype(np.float32)
+
+    height, width = gray.shape
+    rotation = cv2.getRotationMatrix2D((width / 2, height / 2), skew, 1.0)
+    gray = cv2.warpAffine(gray, rotation, (width, height), borderValue=255)
+    # Sombra: el papel se oscurece hacia la derecha
+    gray *= np.linspace(1.0, 0.7, width, dtype=np.float32)[None, :]
+    rng = np.random.default_rng(seed)
+    speckles = rng.random(gray.shape) < noise
+    gray[speckles] = 0
+
+    samples = np.clip(gray, 0, 255).astype(np.uint8)
+    return fitz.Pixmap(fitz.csGRAY, width, height, samples.tobytes(), False)
+
+def accuracy(text):
+    """Similitud media entre cada línea esperada y la línea reconocida más parecida"""
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    if not lines:
+        return 0.0
+    return statistics.mean(
+        max(difflib.SequenceMatcher(None, expected, line).ratio() for line in lines)
+        for expected in SAMPLE_LINES
+    )
+
+def run_configuration(steps, pix, backend, repeat):
+    """
+    Mide una combinación de pasos
+
+    Returns:
+        tuple: (ms de mejora, megapíxeles resultantes, s de OCR, exactitud)
+    """
+    enhancer = ImageEnhancer(steps=steps)
+    enhance_times, ocr_times = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        image = enhancer.enhance_pixmap(pix)
+        enhance_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        text = backend.image_to_string(image)
+        ocr_times.append(time.perf_counter() - start)
+    return (
+        statistics.median(enhance_times) * 1000,
+        image.width * image.height / 1e6,
+        statistics.median(ocr_times),
+        accuracy(text),
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dpi", type=int, default=300)
+    parser.add_argument("--skew", type=float, default=1.5)
+    parser.add_argument("--noise", type=float, default=0.002)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--backend", default="auto")
+    parser.add_argument("--lang", default="spa")
+    parser.add_argument("--tessdata-path", default="")
+    args = parser.parse_args()
+
+    pix = build_scan(args.dpi, args.skew, args.noise)
+    backend = create_ocr_backend(args.backend, args.lang, args.tessdata_path)
+
+    configurations = [("ninguno", ())]
+    configurations += [(step, (step,)) for step in ENHANCE_STEPS]
+    configurations += [("por defecto", DEFAULT_ENHANCE_STEPS), ("todos", ENHANCE_STEPS)]
+
+    print(f"motor: {backend.name}, {pix.width}x{pix.height} px, inclinación {args.skew}°, ruido {args.noise}")
+    print(f"{'pasos':<14} {'mejora (ms)':>12} {'Mpx':>6} {'OCR (s)':>8} {'exactitud':>10}")
+    try:
+        for name, steps in configurations:
+            enhance_ms, megapixels, ocr_seconds, score = run_configuration(steps, pix, backend, args.repeat)
+            print(f"{name:<14} {enhance_ms:>12.1f} {megapixels:>6.2f} {ocr_seconds:>8.3f} {score:>10.3f}")
+    finally:
+        backend.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,380 @@
+"""
+Prueba de carga de POST /extract-csf para dimensionar workers y pool de extracción
+
+Envía constancias sintéticas (mezcla configurable de capa de texto y
+escaneos) con una concurrencia fija durante un tiempo y reporta
+solicitudes por segundo sostenidas, distribución de latencia, retraso del
+event loop y CPU por solicitud. Cada combinación de --workers,
+--pool-sizes y --concurrency se mide con un servidor nuevo.
+
+Modos:
+    asgi     la app corre en un proceso nuevo y se llama por ASGI (sin red);
+             el retraso del event loop se mide dentro de la app
+    uvicorn  se arranca "uvicorn app.main:app --workers N" en un puerto local;
+             el retraso se aproxima con la latencia de GET /health bajo carga
+    --url    servidor ya en marcha (solo latencia; sin CPU)
+
+Uso:
+    python -m benchmarks.loadtest --mode asgi --pool-sizes 1,2,4 --concurrency 4,8 --duration 20
+    python -m benchmarks.loadtest --mode uvicorn --workers 1,2 --pool-sizes 2 --scan-ratio 0.3
+    python -m benchmarks.loadtest --url http://127.0.0.1:8000 --concurrency 8
+"""
+import argparse
+import asyncio
+import itertools
+import multiprocessing
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import httpx
+
+from benchmarks.csf_corpus import PERSONAS, build_corpus
+from benchmarks.extraction import percentile
+
+# Variantes de csf_corpus que se usan como "texto" y como "escaneo"
+TEXT_VARIANTS = ("texto", "multipagina")
+SCAN_VARIANTS = ("imagen", "ruido")
+# Intervalo (s) con que se mide el retraso del event loop o se consulta /health
+LAG_INTERVAL = 0.05
+# Segundos que se espera a que el servidor uvicorn responda /health
+SERVER_START_TIMEOUT = 60
+# Variables de entorno del servidor: sin caché (los documentos se repiten)
+SERVER_ENVIRONMENT = {"CACHE_ENABLED": "false"}
+
+def process_tree_cpu_seconds(pid):
+    """
+    CPU (usuario + sistema) consumida por un proceso y todos sus descendientes vivos
+
+    Lee /proc, así que solo funciona en Linux.
+
+    Args:
+        pid (int): Proceso raíz
+
+    Returns:
+        float: Segundos de CPU, o None si /proc no está disponible
+    """
+    if not os.path.isdir("/proc"):
+        return None
+    ticks = os.sysconf("SC_CLK_TCK")
+    children = defaultdict(list)
+    cpu = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as stat_file:
+                stat = stat_file.read()
+        except OSError:
+            continue
+        # El nombre del proceso (entre paréntesis) puede contener espacios
+        fields = stat[stat.rfind(")") + 2:].split()
+        children[int(fields[1])].append(int(entry))
+        cpu[int(entry)] = (int(fields[11]) + int(fields[12])) / ticks
+
+    total, pending = 0.0, [pid]
+    while pending:
+        current = pending.pop()
+        total += cpu.get(current, 0.0)
+        pending.extend(children.get(current, ()))
+    return total
+
+def build_documents(docs, seed=0):
+    """
+    Genera los documentos de la mezcla
+
+    Returns:
+        tuple: (PDF con capa de texto, PDF escaneados) como listas de bytes
+    """
+    text = [sample.content for sample in build_corpus(TEXT_VARIANTS, PERSONAS, docs, seed)]
+    scans = [sample.content for sample in build_corpus(SCAN_VARIANTS, PERSONAS, docs, seed)]
+    return text, scans
+
+class LoadResult:
+    """Mediciones de una corrida de carga"""
+    def __init__(self):
+        self.latencies = []
+        self.statuses = Counter()
+        self.lags = []
+        self.elapsed = 0.0
+        self.cpu_seconds = None
+
+    def summary(self):
+        """
+        Cifras de la corrida
+
+        Returns:
+            dict: req/s de respuestas 200, percentiles (ms), códigos, retraso (ms) y CPU por solicitud (ms)
+        """
+        ok = self.statuses.get(200, 0)
+        return {
+            "requests": sum(self.statuses.values()),
+            "rps": ok / self.elapsed if self.elapsed else 0.0,
+            "p50_ms": percentile(self.latencies, 0.50) * 1000,
+            "p90_ms": percentile(self.latencies, 0.90) * 1000,
+            "p99_ms": percentile(self.latencies, 0.99) * 1000,
+            "max_ms": max(self.latencies, default=0.0) * 1000,
+            "statuses": dict(self.statuses),
+            "lag_p99_ms": percentile(self.lags, 0.99) * 1000,
+            "lag_max_ms": max(self.lags, default=0.0) * 1000,
+            "cpu_ms_per_request": self.cpu_seconds / ok * 1000 if self.cpu_seconds is not None and ok else None,
+        }
+
+async def drive_load(client, text_docs, scan_docs, scan_ratio, concurrency, duration, warmup,
+                     lag_probe, cpu_pid=None, seed=0):
+    """
+    Envía solicitudes en lazo cerrado: cada una de las concurrency tareas
+    envía la siguiente en cuanto recibe la respuesta anterior
+
+    Args:
+        client (httpx.AsyncClient): Cliente apuntando a la app
+        text_docs (list): PDF con capa de texto
+        scan_docs (list): PDF escaneados
+        scan_ratio (float): Fracción de solicitudes con escaneo
+        concurrency (int): Solicitudes simultáneas
+        duration (float): Segundos medidos
+        warmup (float): Segundos previos sin medir (arranque de OCR, cachés)
+        lag_probe (coroutine function): Devuelve el retraso de una muestra en segundos
+        cpu_pid (int, optional): Proceso cuya CPU (con descendientes) se mide
+        seed (int): Semilla de la mezcla
+
+    Returns:
+        LoadResult: Mediciones dentro de la ventana medida
+    """
+    result = LoadResult()
+    rng = random.Random(seed)
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    measure_from = started + warmup
+    stop_at = measure_from + duration
+
+    async def send():
+        while loop.time() < stop_at:
+            content = rng.choice(scan_docs if rng.random() < scan_ratio else text_docs)
+            start = loop.time()
+            try:
+                response = await client.post(
+                    "/extract-csf", files={"file": ("constancia.pdf", content, "application/pdf")}
+                )
+                status = response.status_code
+            except httpx.HTTPError:
+                status = "error"
+            end = loop.time()
+            # Se cuentan las respuestas recibidas dentro de la ventana medida
+            if measure_from <= end <= stop_at:
+                result.latencies.append(end - start)
+                result.statuses[status] += 1
+            if status == 429:
+                # Respetar Retry-After sería medir el cliente; una pausa corta basta
+                await asyncio.sleep(0.1)
+
+    async def probe():
+        while loop.time() < stop_at:
+            lag = await lag_probe()
+            if loop.time() >= measure_from:
+                result.lags.append(lag)
+
+    tasks = [asyncio.create_task(send()) for _ in range(concurrency)]
+    tasks.append(asyncio.create_task(probe()))
+
+    await asyncio.sleep(max(measure_from - loop.time(), 0))
+    cpu_start = process_tree_cpu_seconds(cpu_pid) if cpu_pid else None
+    await asyncio.sleep(max(stop_at - loop.time(), 0))
+    cpu_end = process_tree_cpu_seconds(cpu_pid) if cpu_pid else None
+    await asyncio.gather(*tasks)
+
+    result.elapsed = duration
+    if cpu_start is not None and cpu_end is not None:
+        result.cpu_seconds = cpu_end - cpu_start
+    return result
+
+async def _sleep_lag():
+    """Retraso del event loop: cuánto se pasa un sleep de LAG_INTERVAL"""
+    start = time.perf_counter()
+    await asyncio.sleep(LAG_INTERVAL)
+    return max(time.perf_counter() - start - LAG_INTERVAL, 0.0)
+
+def _health_lag(client):
+    """Sonda de retraso para servidores externos: latencia de GET /health"""
+    async def probe():
+        await asyncio.sleep(LAG_INTERVAL)
+        start = time.perf_counter()
+        try:
+            await client.get("/health")
+        except httpx.HTTPError:
+            pass
+        return time.perf_counter() - start
+    return probe
+
+async def _run_asgi(text_docs, scan_docs, options):
+    """Corre la app por ASGI en este proceso (que debe ser nuevo: la configuración se lee al importar)"""
+    # Los logs de la app (y de los procesos del pool, que heredan la salida)
+    # se descartan para no mezclarlos con el reporte
+    os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    from app.main import app
+
+    await app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=None) as client:
+            return await drive_load(
+                client, text_docs, scan_docs, lag_probe=_sleep_lag, cpu_pid=os.getpid(), **options
+            )
+    finally:
+        await app.router.shutdown()
+
+def run_asgi(text_docs, scan_docs, options):
+    """Punto de entrada del proceso de una corrida ASGI"""
+    return asyncio.run(_run_asgi(text_docs, scan_docs, options)).summary()
+
+def measure_asgi(environment, text_docs, scan_docs, options):
+    """
+    Mide una configuración en modo ASGI en un proceso nuevo
+
+    Args:
+        environment (dict): Variables de entorno de la configuración
+
+    Returns:
+        dict: Resumen de la corrida
+    """
+    previous = {name: os.environ.get(name) for name in environment}
+    os.environ.update(environment)
+    try:
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            return pool.submit(run_asgi, text_docs, scan_docs, options).result()
+    finally:
+        for name, value in previous.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+async def _wait_ready(client, server):
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"uvicorn terminó con código {server.returncode}")
+        try:
+            if (await client.get("/ready")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("uvicorn no respondió /ready a tiempo")
+
+async def _drive_remote(base_url, text_docs, scan_docs, options, server=None):
+    limits = httpx.Limits(max_connections=options["concurrency"] + 1)
+    async with httpx.AsyncClient(base_url=base_url, timeout=None, limits=limits) as client:
+        if server is not None:
+            await _wait_ready(client, server)
+        return await drive_load(
+            client, text_docs, scan_docs, lag_probe=_health_lag(client),
+            cpu_pid=server.pid if server is not None else None, **options
+        )
+
+def measure_uvicorn(environment, workers, text_docs, scan_docs, options):
+    """
+    Arranca uvicorn con la configuración, lo mide y lo detiene
+
+    Args:
+        environment (dict): Variables de entorno del servidor
+        workers (int): Procesos de uvicorn
+
+    Returns:
+        dict: Resumen de la corrida
+    """
+    port = _free_port()
+    command = [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+               "--workers", str(workers), "--log-level", "warning"]
+    with tempfile.TemporaryFile() as errors, tempfile.TemporaryDirectory() as metrics_dir:
+        # Métricas de todos los workers de uvicorn en un directorio propio de la corrida
+        environment = dict(environment, METRICS_PORT=str(_free_port()), PROMETHEUS_MULTIPROC_DIR=metrics_dir)
+        server = subprocess.Popen(command, env={**os.environ, **environment}, stdout=subprocess.DEVNULL, stderr=errors)
+        try:
+            result = asyncio.run(_drive_remote(f"http://127.0.0.1:{port}", text_docs, scan_docs, options, server))
+        except RuntimeError:
+            errors.seek(0)
+            sys.stderr.write(errors.read().decode(errors="replace")[-2000:])
+            raise
+        finally:
+            server.terminate()
+            try:
+                server.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                server.kill()
+    return result.summary()
+
+def print_row(label, summary):
+    statuses = ",".join(f"{status}:{count}" for status, count in sorted(summary["statuses"].items(), key=str))
+    cpu = f"{summary['cpu_ms_per_request']:.0f}" if summary["cpu_ms_per_request"] is not None else "-"
+    print(f"{label:<24} {summary['rps']:>7.2f} {summary['p50_ms']:>8.0f} {summary['p90_ms']:>8.0f} "
+          f"{summary['p99_ms']:>8.0f} {summary['max_ms']:>8.0f} {summary['lag_p99_ms']:>10.1f} "
+          f"{summary['lag_max_ms']:>10.1f} {cpu:>8}  {statuses}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--mode", choices=("asgi", "uvicorn"), default="asgi")
+    parser.add_argument("--url", default="", help="servidor ya en marcha (ignora --mode, --workers y --pool-sizes)")
+    parser.add_argument("--workers", default="1", help="procesos de uvicorn, separados por coma (modo uvicorn)")
+    parser.add_argument("--pool-sizes", default="", help="EXTRACTION_WORKERS, separados por coma (vacío = configuración actual)")
+    parser.add_argument("--concurrency", default="4", help="solicitudes simultáneas, separadas por coma")
+    parser.add_argument("--scan-ratio", type=float, default=0.2, help="fracción de documentos escaneados")
+    parser.add_argument("--duration", type=float, default=20.0, help="segundos medidos por combinación")
+    parser.add_argument("--warmup", type=float, default=5.0, help="segundos sin medir al inicio")
+    parser.add_argument("--docs", type=int, default=2, help="documentos generados por variante y persona")
+    parser.add_argument("--cache", action="store_true", help="dejar activa la caché de resultados")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    def integers(value):
+        return [int(item) for item in value.split(",") if item.strip()]
+
+    text_docs, scan_docs = build_documents(args.docs, args.seed)
+    environment = dict(SERVER_ENVIRONMENT)
+    if args.cache:
+        del environment["CACHE_ENABLED"]
+
+    lag_label = "lag" if args.mode == "asgi" and not args.url else "health"
+    print(f"documentos: {len(text_docs)} con texto, {len(scan_docs)} escaneados; escaneos {args.scan_ratio:.0%}; "
+          f"{args.duration:.0f} s por combinación")
+    print(f"{'configuración':<24} {'req/s':>7} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'máx ms':>8} "
+          f"{lag_label + ' p99':>10} {lag_label + ' máx':>10} {'CPU ms':>8}  códigos")
+
+    if args.url:
+        for concurrency in integers(args.concurrency):
+            options = dict(scan_ratio=args.scan_ratio, concurrency=concurrency, duration=args.duration,
+                           warmup=args.warmup, seed=args.seed)
+            result = asyncio.run(_drive_remote(args.url.rstrip("/"), text_docs, scan_docs, options))
+            print_row(f"c={concurrency}", result.summary())
+        return
+
+    workers = integers(args.workers) if args.mode == "uvicorn" else [1]
+    pool_sizes = integers(args.pool_sizes) or [None]
+    for worker_count, pool_size, concurrency in itertools.product(workers, pool_sizes, integers(args.concurrency)):
+        run_environment = dict(environment)
+        if pool_size is not None:
+            run_environment["EXTRACTION_WORKERS"] = str(pool_size)
+        options = dict(scan_ratio=args.scan_ratio, concurrency=concurrency, duration=args.duration,
+                       warmup=args.warmup, seed=args.seed)
+        if args.mode == "asgi":
+            summary = measure_asgi(run_environment, text_docs, scan_docs, options)
+            label = f"pool={'cfg' if pool_size is None else pool_size} c={concurrency}"
+        else:
+            summary = measure_uvicorn(run_environment, worker_count, text_docs, scan_docs, options)
+            label = f"w={worker_count} pool={'cfg' if pool_size is None else pool_size} c={concurrency}"
+        print_row(label, summary)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Compara el tiempo de OCR de los motores pytesseract y tesserocr
+
+Uso:
+    python -m benchmarks.ocr_backends --pages 5 --repeat 3
+"""
+import argparse
+import statistics
+import time
+
+import fitz  # PyMuPDF
+
+from app.services.pdf_processor import PDFProcessor, PytesseractBackend, TesserocrBackend
+
+SAMPLE_LINES = [
+    "CONSTANCIA DE SITUACIÓN FISCAL",
+    "RFC: GODE561231GR8",
+    "Denominación/Razón Social: EMPRESA DEMO SA DE CV",
+    "Régimen Fiscal: 601 General de Ley Personas Morales",
+    "Código Postal: 06600",
+]
+
+def build_page_images(pages):
+    """
+    Genera imágenes de página listas para OCR a partir de un PDF sintético
+
+    Args:
+        pages (int): Número de páginas a generar
+
+    Returns:
+        list: Imágenes PIL preparadas por PDFProcessor
+    """
+    document = fitz.open()
+    for _ in range(pages):
+        page = document.new_page()
+        y = 72
+        for line in SAMPLE_LINES:
+            page.insert_text((72, y), line, fontsize=11)
+            y += 20
+
+    processor = PDFProcessor(ocr_backend="pytesseract")
+    images = [processor._render_page_for_ocr(page) for page in document]
+    document.close()
+    return images
+
+def run_backend(backend, images, repeat):
+    """
+    Mide el tiempo por página de un motor de OCR
+
+    Args:
+        backend (OCRBackend): Motor a medir
+        images (list): Imágenes de página
+        repeat (int): Número de repeticiones
+
+    Returns:
+        list: Segundos por página de cada imagen procesada
+    """
+    timings = []
+    for _ in range(repeat):
+        for image in images:
+            start = time.perf_counter()
+            backend.image_to_string(image)
+            timings.append(time.perf_counter() - start)
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--lang", default="spa")
+    parser.add_argument("--tessdata-path", default="")
+    args = parser.parse_args()
+
+    images = build_page_images(args.pages)
+
+    backends = [PytesseractBackend(lang=args.lang)]
+    try:
+        backends.append(TesserocrBackend(lang=args.lang, tessdata_path=args.tessdata_path))
+    except Exception as e:
+        print(f"tesserocr no disponible: {e}")
+
+    print(f"{'motor':<12} {'páginas':>8} {'media (s)':>10} {'p50 (s)':>9} {'máx (s)':>9}")
+    for backend in backends:
+        try:
+            timings = run_backend(backend, images, args.repeat)
+        except Exception as e:
+            print(f"{backend.name:<12} error: {e}")
+            continue
+        finally:
+            backend.close()
+        print(
+            f"{backend.name:<12} {len(timings):>8} {statistics.mean(timings):>10.3f} "
+            f"{statistics.median(timings):>9.3f} {max(timings):>9.3f}"
+        )
+
+if __name__ == "__main__":
+    main()
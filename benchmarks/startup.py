@@ -0,0 +1,140 @@
+"""
+Tiempo de importación y de arranque del servicio
+
+Mide, en intérpretes nuevos, cuánto tarda en importarse cada módulo (con
+los 10 submódulos más caros según -X importtime) y, con uvicorn en un
+puerto local, cuánto tarda el servidor en responder /live y /ready y la
+latencia de la primera solicitud de un escaneo, con y sin calentamiento
+de los workers (WARMUP_ENABLED).
+
+Uso:
+    python -m benchmarks.startup
+    python -m benchmarks.startup --modules app.main,app.services.job_store --runs 5 --no-server
+    python -m benchmarks.startup --pool-size 2
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.extraction import percentile
+from benchmarks.loadtest import SERVER_ENVIRONMENT, SERVER_START_TIMEOUT, _free_port
+
+DEFAULT_MODULES = ("app.main", "app.api.dependencies", "app.services.result_cache", "app.services.job_store", "app.config")
+
+def import_profile(module):
+    """
+    Importa un módulo en un intérprete nuevo con -X importtime
+
+    Args:
+        module (str): Módulo a importar
+
+    Returns:
+        tuple: (ms totales, lista de (ms acumulados, submódulo) de los más caros)
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=True
+    )
+    entries = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            entries.append((int(cumulative) / 1000, name.strip()))
+    total = next((ms for ms, name in reversed(entries) if name == module), 0.0)
+    top = sorted((entry for entry in entries if entry[1] != module), reverse=True)[:10]
+    return total, top
+
+def measure_imports(modules, runs):
+    """Imprime la mediana del tiempo de importación de cada módulo y sus submódulos más caros"""
+    print(f"{'módulo':<32} {'ms (mediana)':>12}")
+    for module in modules:
+        profiles = [import_profile(module) for _ in range(runs)]
+        totals = [total for total, _ in profiles]
+        print(f"{module:<32} {percentile(totals, 0.5):>12.0f}")
+        for ms, name in profiles[-1][1]:
+            print(f"    {name:<40} {ms:>8.0f}")
+
+def _wait_for(client, path, server, start):
+    """Espera a que path responda 200 y devuelve los segundos desde start"""
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"uvicorn terminó con código {server.returncode}")
+        try:
+            if client.get(path).status_code == 200:
+                return time.monotonic() - start
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.05)
+    raise RuntimeError(f"uvicorn no respondió {path} a tiempo")
+
+def measure_server(environment, scan_pdf):
+    """
+    Arranca uvicorn, mide /live, /ready y la primera solicitud, y lo detiene
+
+    Args:
+        environment (dict): Variables de entorno del servidor
+        scan_pdf (bytes): PDF escaneado para la primera solicitud
+
+    Returns:
+        dict: Segundos hasta /live y /ready y ms de la primera solicitud
+    """
+    port = _free_port()
+    command = [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+               "--log-level", "warning"]
+    with tempfile.TemporaryFile() as errors, httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=None) as client:
+        start = time.monotonic()
+        server = subprocess.Popen(command, env={**os.environ, **environment}, stdout=subprocess.DEVNULL, stderr=errors)
+        try:
+            live = _wait_for(client, "/live", server, start)
+            ready = _wait_for(client, "/ready", server, start)
+            request_start = time.perf_counter()
+            response = client.post("/extract-csf", files={"file": ("scan.pdf", scan_pdf, "application/pdf")})
+            first = (time.perf_counter() - request_start) * 1000
+            response.raise_for_status()
+        except (RuntimeError, httpx.HTTPError):
+            errors.seek(0)
+            sys.stderr.write(errors.read().decode(errors="replace")[-2000:])
+            raise
+        finally:
+            server.terminate()
+            try:
+                server.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                server.kill()
+    return {"live_s": live, "ready_s": ready, "first_request_ms": first}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--modules", default=",".join(DEFAULT_MODULES))
+    parser.add_argument("--runs", type=int, default=3, help="importaciones por módulo")
+    parser.add_argument("--no-server", action="store_true", help="solo medir importaciones")
+    parser.add_argument("--pool-size", default="", help="EXTRACTION_WORKERS del servidor (vacío = configuración actual)")
+    args = parser.parse_args()
+
+    measure_imports([module.strip() for module in args.modules.split(",") if module.strip()], args.runs)
+    if args.no_server:
+        return
+
+    from benchmarks.csf_corpus import build_sample
+
+    scan_pdf = build_sample("imagen", "fisica", 0).content
+    print()
+    print(f"{'arranque':<12} {'/live s':>8} {'/ready s':>9} {'1ª solicitud ms':>16}")
+    for warmup in (False, True):
+        environment = dict(SERVER_ENVIRONMENT, WARMUP_ENABLED=str(warmup).lower())
+        if args.pool_size:
+            environment["EXTRACTION_WORKERS"] = args.pool_size
+        result = measure_server(environment, scan_pdf)
+        label = "warmup" if warmup else "sin warmup"
+        print(f"{label:<12} {result['live_s']:>8.2f} {result['ready_s']:>9.2f} {result['first_request_ms']:>16.0f}")
+
+if __name__ == "__main__":
+    main()
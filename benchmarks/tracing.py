@@ -0,0 +1,89 @@
+"""
+Costo de la medición por etapas del pipeline de extracción
+
+Uso:
+    python -m benchmarks.tracing --pages 5 --repeat 50
+"""
+import argparse
+import logging
+import time
+
+import fitz
+
+from app.services.data_extractor import DataExtractor
+from app.services.extraction_pipeline import ExtractionPipeline
+from app.services.layout_extractor import LayoutExtractor
+from app.services.pdf_processor import PDFProcessor
+from app.utils import tracing
+
+def build_pdf(pages):
+    """
+    Genera un PDF con capa de texto y los datos de la CSF en la última página
+
+    Args:
+        pages (int): Número de páginas
+
+    Returns:
+        bytes: Contenido del PDF
+    """
+    document = fitz.open()
+    for _ in range(pages - 1):
+        document.new_page().insert_text((72, 72), "OBLIGACIONES " * 10, fontsize=9)
+    page = document.new_page()
+    lines = ["RFC: GODE561231GR8", "Denominación/Razón Social: EMPRESA DEMO SA DE CV",
+             "Régimen Fiscal: 601 General de Ley Personas Morales", "Código Postal: 06600"]
+    for index, line in enumerate(lines):
+        page.insert_text((72, 72 + index * 18), line, fontsize=9)
+    return document.tobytes()
+
+def time_pipeline(pipeline, pdf_content, repeat):
+    """
+    Mide el tiempo medio de ExtractionPipeline.run
+
+    Returns:
+        tuple: (segundos por llamada, spans por llamada)
+    """
+    result = pipeline.run(pdf_content)
+    spans = sum(timing.count for timing in result.timings.values())
+    start = time.perf_counter()
+    for _ in range(repeat):
+        pipeline.run(pdf_content)
+    return (time.perf_counter() - start) / repeat, spans
+
+def time_noop_span(repeat):
+    """Mide el costo de un span con la medición desactivada"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        with tracing.span("noop"):
+            pass
+    return (time.perf_counter() - start) / repeat
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+
+    pdf_content = build_pdf(args.pages)
+    pipeline = ExtractionPipeline(
+        PDFProcessor(ocr_backend="pytesseract"),
+        DataExtractor(layout_extractor=LayoutExtractor()),
+        early_exit=False
+    )
+
+    tracing.configure(True)
+    enabled_time, spans = time_pipeline(pipeline, pdf_content, args.repeat)
+    tracing.configure(False)
+    disabled_time, _ = time_pipeline(pipeline, pdf_content, args.repeat)
+    noop_time = time_noop_span(100000)
+
+    print(f"pipeline con medición:    {enabled_time * 1000:.3f} ms ({spans} spans)")
+    print(f"pipeline sin medición:    {disabled_time * 1000:.3f} ms")
+    print(f"span desactivado:         {noop_time * 1e9:.0f} ns")
+    print(f"sobrecosto desactivado:   {spans * noop_time / disabled_time * 100:.3f} %")
+    print(f"sobrecosto activado:      {(enabled_time - disabled_time) / disabled_time * 100:.2f} %")
+
+if __name__ == "__main__":
+    main()
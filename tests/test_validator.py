@@ -0,0 +1,116 @@
+"""
+Reglas y correcciones de FieldValidator
+
+Los RFC válidos son los de las constancias de prueba del SAT y los
+genéricos; las corrupciones simulan las confusiones típicas del OCR.
+"""
+import pytest
+
+from app.models.response_models import CSFData
+from app.services.validator import CORRECTED, INVALID, VALID, FieldValidator, rfc_check_digit
+
+@pytest.fixture
+def validator():
+    return FieldValidator()
+
+@pytest.mark.parametrize("rfc", [
+    "GODE561231GR8",   # persona física
+    "CACX7605101P8",
+    "MISC491214B86",
+    "EKU9003173C9",    # persona moral
+    "IIA040805DZ4",
+    "URE180429TM6",
+    "GODE560229GRA",   # 29 de febrero en año bisiesto
+])
+def test_rfc_valido(validator, rfc):
+    assert rfc_check_digit(rfc[:-1]) == rfc[-1]
+    check = validator.check("rfc", rfc)
+    assert (check.status, check.value) == (VALID, rfc)
+
+@pytest.mark.parametrize("rfc", ["XAXX010101000", "XEXX010101000"])
+def test_rfc_generico_valido(validator, rfc):
+    check = validator.check("rfc", rfc)
+    assert (check.status, check.value) == (VALID, rfc)
+
+@pytest.mark.parametrize("corrupted, expected", [
+    ("G0DE561231GR8", "GODE561231GR8"),   # 0 por O en las letras
+    ("GODE56123lGR8", "GODE561231GR8"),   # l por 1 en la fecha
+    ("GODES61231GR8", "GODE561231GR8"),   # S por 5 en la fecha
+    ("GODE561231GRB", "GODE561231GR8"),   # B por 8 en el dígito verificador
+    ("EKU9OO3173C9", "EKU9003173C9"),     # O por 0 en la fecha de una persona moral
+    ("CACX76O51OIP8", "CACX7605101P8"),   # O/0 e I/1 mezclados
+    ("MISC49I2I4B86", "MISC491214B86"),   # I por 1
+    ("HEGJ820506MS6", "HEGJ820506M56"),   # S por 5 en la homoclave
+    ("gode-561231-gr8", "GODE561231GR8"), # minúsculas y separadores
+])
+def test_rfc_corregido(validator, corrupted, expected):
+    check = validator.check("rfc", corrupted)
+    assert (check.status, check.value) == (CORRECTED, expected)
+
+@pytest.mark.parametrize("rfc, reason", [
+    ("GODE561231GR", "formato"),
+    ("GODE560230GR8", "fecha"),
+    ("GODE570229GR2", "fecha"),           # 29 de febrero en año no bisiesto
+    ("GODE561231GR9", "digito_verificador"),
+    ("EKU900317SC9", "digito_verificador"),  # S no se confunde con 3
+])
+def test_rfc_invalido(validator, rfc, reason):
+    check = validator.check("rfc", rfc)
+    assert (check.status, check.value, check.reason) == (INVALID, rfc, reason)
+
+def test_sin_correccion_no_modifica(validator):
+    check = validator.check("rfc", "G0DE561231GR8", correct=False)
+    assert (check.status, check.value, check.reason) == (INVALID, "G0DE561231GR8", "formato")
+
+@pytest.mark.parametrize("regimen, rfc, status, reason", [
+    ("612", "GODE561231GR8", VALID, None),
+    ("601", "EKU9003173C9", VALID, None),
+    ("626", "EKU9003173C9", VALID, None),     # aplica a ambos tipos de persona
+    ("626", "GODE561231GR8", VALID, None),
+    ("601", "GODE561231GR8", INVALID, "tipo_persona"),
+    ("605", "EKU9003173C9", INVALID, "tipo_persona"),
+    ("999", "", INVALID, "catalogo"),
+])
+def test_regimen_fiscal(validator, regimen, rfc, status, reason):
+    check = validator.check("regimen_fiscal", regimen, rfc=rfc)
+    assert (check.status, check.reason) == (status, reason)
+
+def test_regimen_corregido_desde_el_texto(validator):
+    text = "Regímenes: Régimen de Sueldos y Salarios e Ingresos Asimilados a Salarios 605"
+    check = validator.check("regimen_fiscal", "601", text=text, rfc="GODE561231GR8")
+    assert (check.status, check.value) == (CORRECTED, "605")
+
+@pytest.mark.parametrize("codigo_postal, status, value, reason", [
+    ("06600", VALID, "06600", None),
+    ("O66OO", CORRECTED, "06600", None),
+    ("1234S", CORRECTED, "12345", None),
+    ("00999", INVALID, "00999", "rango"),
+    ("0660", INVALID, "0660", "formato"),
+])
+def test_codigo_postal(validator, codigo_postal, status, value, reason):
+    check = validator.check("codigo_postal", codigo_postal)
+    assert (check.status, check.value, check.reason) == (status, value, reason)
+
+def test_codigo_postal_corregido_desde_el_texto(validator):
+    check = validator.check("codigo_postal", "0660", text="Código Postal: 06600 Tipo de Vialidad: CALLE")
+    assert (check.status, check.value) == (CORRECTED, "06600")
+
+@pytest.mark.parametrize("id_cif, status, value", [
+    ("19020251234", VALID, "19020251234"),
+    ("1902025123l", CORRECTED, "19020251231"),
+    ("123", INVALID, "123"),
+])
+def test_id_cif(validator, id_cif, status, value):
+    check = validator.check("id_cif", id_cif)
+    assert (check.status, check.value) == (status, value)
+
+def test_validate_usa_el_rfc_corregido(validator):
+    # El régimen se valida contra el tipo de persona del RFC ya corregido
+    data = CSFData(rfc="G0DE561231GR8", regimen_fiscal="612", codigo_postal="O66OO", id_cif="19020251234")
+    checks = validator.validate(data)
+    assert {field: (check.status, check.value) for field, check in checks.items()} == {
+        "rfc": (CORRECTED, "GODE561231GR8"),
+        "regimen_fiscal": (VALID, "612"),
+        "codigo_postal": (CORRECTED, "06600"),
+        "id_cif": (VALID, "19020251234"),
+    }